@@ -7,6 +7,7 @@ import os
 import shutil
 import subprocess
 import sys
+import time
 import uuid
 import zipfile
 
@@ -330,6 +331,89 @@ if MODE in ("demo", "readonly", "full"):
         else:
             return dict(ticket=None)
 
+    def profiles_folder(app_name):
+        """Where an app's profiler keeps its reports and switch.json"""
+        return os.path.join(FOLDER, app_name, "databases", "profiles")
+
+    def read_json(path):
+        with open(path) as stream:
+            return json.load(stream)
+
+    def app_profiler(app_name):
+        """The app's profiler module (apps/<app_name>/profiler.py), None if it has none"""
+        return sys.modules.get(f"apps.{app_name}.profiler")
+
+    @action("profiles")
+    @session_secured
+    def profiles():
+        """Returns the most recent profiler reports of all apps and their switches"""
+        reports, switches = [], {}
+        if MODE != "demo":
+            for app_name in sorted(os.listdir(FOLDER)):
+                folder = profiles_folder(app_name)
+                if not os.path.isdir(folder):
+                    continue
+                for name in os.listdir(folder):
+                    if not name.endswith(".json"):
+                        continue
+                    data = safely(lambda: read_json(os.path.join(folder, name)))
+                    if not data:
+                        continue
+                    if name == "switch.json":
+                        if data.get("until", 0) > time.time():
+                            switches[app_name] = data
+                        continue
+                    data.pop("text", None)
+                    data["top"] = data.get("top", [])[:1]
+                    data["app_name"] = app_name
+                    reports.append(data)
+        reports.sort(key=lambda report: report.get("timestamp", ""), reverse=True)
+        return {"payload": reports[:100], "switches": switches}
+
+    @action("profiler/<app_name>", method="POST")
+    @session_secured
+    def profiler_switch(app_name):
+        """Switches an app's profiler on (actions, percent, mode, minutes) or off"""
+        if MODE == "demo":
+            raise HTTP(403)
+        profiler = app_profiler(app_name) if app_name in os.listdir(FOLDER) else None
+        if not profiler:
+            abort(404)
+        form = request.json or {}
+        if not form.get("enabled"):
+            profiler.disable()
+            return {"status": "success"}
+        actions = form.get("actions") or []
+        if isinstance(actions, str):
+            actions = [a.strip() for a in actions.split(",") if a.strip()]
+        switch = profiler.enable(
+            actions,
+            percent=float(form.get("percent") or 0),
+            mode=form.get("mode") if form.get("mode") in profiler.MODES else "sample",
+            minutes=float(form.get("minutes") or 30),
+        )
+        return {"status": "success", "switch": switch}
+
+    @action("clear_profiles")
+    @session_secured
+    def clear_profiles():
+        if MODE != "demo":
+            for app_name in os.listdir(FOLDER):
+                folder = profiles_folder(app_name)
+                if os.path.isdir(folder):
+                    for name in os.listdir(folder):
+                        if name.endswith(".json") and name != "switch.json":
+                            safely(lambda: os.unlink(os.path.join(folder, name)))
+
+    @action("profile/<app_name>/<report_uuid>")
+    @action.uses("profile.html")
+    @session_secured
+    def profile_report(app_name, report_uuid):
+        if MODE != "demo" and report_uuid.isalnum() and app_name in os.listdir(FOLDER):
+            path = os.path.join(profiles_folder(app_name), report_uuid + ".json")
+            return dict(report=safely(lambda: read_json(path)), app_name=app_name)
+        return dict(report=None, app_name=app_name)
+
     @action("rest/<path:path>", method=["GET", "POST", "PUT", "DELETE"])
     @session_secured
     def api(path):
@@ -29,6 +29,9 @@ let init = (app) => {
         selected_file_link: null,
         files: {},
         tickets:[],
+        profiles:[],
+        profiler_switches:{},
+        profiler: {app_name:'', actions:'', percent:0, mode:'sample', minutes:30},
         modal: null
     };
     app.select_app = (appobj) => {
@@ -211,6 +214,25 @@ let init = (app) => {
         app.vue.tickets = [];
         Q.get('../clear').then(r=>app.reload_tickets());
     };
+    app.reload_profiles = () => {
+        Q.get('../profiles').then(r=>{
+                var data = r.json();
+                app.vue.profiles = data.payload || [];
+                app.vue.profiler_switches = data.switches || {};
+            });
+    };
+    app.clear_profiles = () => {
+        app.vue.profiles = [];
+        Q.get('../clear_profiles').then(r=>app.reload_profiles());
+    };
+    app.switch_profiler = (enabled) => {
+        var form = app.vue.profiler;
+        if (!form.app_name) return;
+        Q.post('../profiler/'+form.app_name, {
+                enabled: enabled, actions: form.actions, percent: form.percent,
+                mode: form.mode, minutes: form.minutes
+            }).then(r=>app.reload_profiles());
+    };
     app.login = () => {
         Q.post('../login', {'password': app.vue.password})
 	    
@@ -243,6 +265,9 @@ let init = (app) => {
         upload_new_file: app.upload_new_file,
         reload_tickets: app.reload_tickets,
         clear_tickets: app.clear_tickets,
+        reload_profiles: app.reload_profiles,
+        clear_profiles: app.clear_profiles,
+        switch_profiler: app.switch_profiler,
         modal_dismiss: app.modal_dismiss,
         handle_upload_file: app.handle_upload_file,
         login: app.login,
@@ -264,6 +289,7 @@ let init = (app) => {
         app.reload_apps();
         app.reload_routes();
         app.reload_tickets();
+        app.reload_profiles();
         app.reload_files();
         setTimeout(()=>{app.vue.loading=false;}, 1000);
     };    
@@ -7,6 +7,23 @@ assert py4web.check_compatible("0.1.20190709.1")
 from . import controllers
 # by importing db you expose it to the _dashboard/dbadmin
 from .models import db
+# apply pending schema steps (indexes, raw DDL) once, see migrations.py
+from . import settings
+from .migrations import ensure_schema
+
+if settings.DB_AUTO_APPLY_SCHEMA_STEPS:
+    ensure_schema()
+# fingerprint and precompress static CSS/JS, see assets.py
+from .assets import build_assets
+from .common import logger
+from .config import ASSET_CONFIG
+
+if ASSET_CONFIG["build_on_startup"]:
+    try:
+        build_assets()
+    except OSError as e:
+        # templates fall back to the plain static/ URLs
+        logger.error(f"Static asset build failed: {e}")
 # import the scheduler
 from .tasks import scheduler
 
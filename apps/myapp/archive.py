@@ -0,0 +1,105 @@
+"""
+Hot/cold partitioning of contracts
+
+Signed contracts older than ARCHIVE_CONFIG['retention_days'] are moved, in
+batches, from db.contrato (hot, used by every day-to-day query) into
+db.contrato_arquivo (cold, same shape and same ids). Reads that need the
+full history go through db.contrato_historico (a UNION ALL view) or through
+the helpers below. Run manually with:
+
+    py4web call apps myapp.archive.archive_signed_contracts
+"""
+
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from .common import db, logger
+from .config import ARCHIVE_CONFIG
+from .constants import CONTRACT_STATUS
+
+ARCHIVED_FIELDS = (
+    'id', 'funcionario', 'arquivo', 'status', 'data_geracao', 'arquivo_assinado',
+    'data_assinatura', 'created_on', 'updated_on'
+)
+
+
+def archive_signed_contracts(retention_days: Optional[int] = None,
+                             batch_size: Optional[int] = None,
+                             max_batches: Optional[int] = None) -> int:
+    """
+    Move signed contracts past the retention age into contrato_arquivo
+
+    Each batch is copied and deleted in its own transaction, so the write
+    lock is held briefly and an interrupted run can simply be restarted.
+
+    Args:
+        retention_days: Override ARCHIVE_CONFIG['retention_days']
+        batch_size: Override ARCHIVE_CONFIG['batch_size']
+        max_batches: Stop after this many batches (None = until done)
+
+    Returns:
+        Number of contracts archived
+    """
+    retention_days = retention_days if retention_days is not None else ARCHIVE_CONFIG['retention_days']
+    batch_size = batch_size or ARCHIVE_CONFIG['batch_size']
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    query = (
+        (db.contrato.status == CONTRACT_STATUS['ASSINADO'])
+        & (db.contrato.data_assinatura < cutoff)
+    )
+    fields = [db.contrato[name] for name in ARCHIVED_FIELDS]
+
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = db(query).select(*fields, orderby=db.contrato.id, limitby=(0, batch_size))
+        if not rows:
+            break
+        now = datetime.now()
+        try:
+            db.contrato_arquivo.bulk_insert(
+                [dict(row.as_dict(), arquivado_em=now) for row in rows]
+            )
+            db(db.contrato.id.belongs([row.id for row in rows])).delete()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f'Error archiving contracts batch starting at ID {rows.first().id}: {e}')
+            raise
+        archived += len(rows)
+        batches += 1
+    logger.info(f'Archived {archived} signed contracts older than {retention_days} days')
+    return archived
+
+
+def contratos_do_funcionario(funcionario_id: int, historico: bool = False):
+    """
+    Contracts of an employee, newest first
+
+    Args:
+        funcionario_id: Employee id
+        historico: Include archived contracts (reads the unified view)
+
+    Returns:
+        Rows of db.contrato or db.contrato_historico
+    """
+    table = db.contrato_historico if historico else db.contrato
+    return db(table.funcionario == funcionario_id).select(orderby=~table.data_geracao)
+
+
+def find_contract_by_file(filename: str) -> Tuple[Optional[object], Optional[str]]:
+    """
+    Find the contract that owns an uploaded file, hot table first
+
+    Args:
+        filename: Stored file name (arquivo or arquivo_assinado)
+
+    Returns:
+        (row, field_name) or (None, None)
+    """
+    for table in (db.contrato, db.contrato_arquivo):
+        for field_name in ('arquivo', 'arquivo_assinado'):
+            row = db(table[field_name] == filename).select(limitby=(0, 1)).first()
+            if row:
+                return row, field_name
+    return None, None
@@ -0,0 +1,164 @@
+"""
+Fingerprinted, precompressed static assets
+
+build_assets() copies every CSS/JS file of static/ to ASSET_CONFIG['folder']
+under a content-hashed name (css/main.css -> css/main.3f2a9c1d0b7e.css),
+writes .gz and, when the optional brotli package is installed, .br variants
+next to each copy, and records the mapping in manifest.json. Templates link
+files with asset_url('css/main.css'); the assets/ action serves the variant
+matching Accept-Encoding with immutable cache headers. Files that are not in
+the manifest fall back to the plain static/ URL.
+
+Runs at startup (ASSET_CONFIG['build_on_startup']) or manually with:
+
+    py4web call apps myapp.assets.build_assets
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+from typing import Dict, Optional
+
+from py4web import URL
+from py4web.core import Fixture
+
+from . import settings
+from .config import ASSET_CONFIG
+
+MANIFEST = 'manifest.json'
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_manifest = {'mtime': None, 'files': {}}
+
+
+def brotli_available() -> bool:
+    """Check if the optional brotli dependency is installed"""
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix='.part_')
+    with os.fdopen(fd, 'wb') as stream:
+        stream.write(data)
+    os.replace(tmp, path)
+
+
+def _fingerprinted(name: str, data: bytes) -> str:
+    base, ext = os.path.splitext(name)
+    return '%s.%s%s' % (base, hashlib.sha256(data).hexdigest()[:12], ext)
+
+
+def build_assets(source: Optional[str] = None, target: Optional[str] = None) -> Dict[str, str]:
+    """
+    Fingerprint and precompress the CSS/JS files of static/
+
+    Outputs are content-addressed, so running it again (from any worker)
+    only writes what changed and old names stay valid for cached pages.
+
+    Args:
+        source: Folder with the original files (default settings.STATIC_FOLDER)
+        target: Output folder (default ASSET_CONFIG['folder'])
+
+    Returns:
+        Manifest mapping original paths to fingerprinted paths
+    """
+    source = source or settings.STATIC_FOLDER
+    target = target or ASSET_CONFIG['folder']
+    use_brotli = brotli_available()
+    manifest = {}
+    for root, _, filenames in os.walk(source):
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1] not in ASSET_CONFIG['extensions']:
+                continue
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, source).replace(os.sep, '/')
+            with open(path, 'rb') as stream:
+                data = stream.read()
+            hashed = _fingerprinted(name, data)
+            manifest[name] = hashed
+            output = os.path.join(target, hashed)
+            if os.path.exists(output):
+                continue
+            _write_atomic(output + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if use_brotli:
+                import brotli
+
+                _write_atomic(output + '.br', brotli.compress(data, quality=11))
+            _write_atomic(output, data)
+    _write_atomic(
+        os.path.join(target, MANIFEST),
+        json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8')
+    )
+    return manifest
+
+
+def manifest_path() -> str:
+    return os.path.join(ASSET_CONFIG['folder'], MANIFEST)
+
+
+def load_manifest() -> Dict[str, str]:
+    """The current manifest, reloaded when the file changes"""
+    path = manifest_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if mtime != _manifest['mtime']:
+        with open(path, 'rb') as stream:
+            _manifest['files'] = json.loads(stream.read())
+        _manifest['mtime'] = mtime
+    return _manifest['files']
+
+
+def asset_url(name: str) -> str:
+    """URL of a static file, fingerprinted when it was built"""
+    hashed = load_manifest().get(name)
+    if hashed:
+        return URL('assets', hashed)
+    return URL('static', name)
+
+
+def asset_response(name: str, accept_encoding: str):
+    """
+    Pick the file variant to send for a fingerprinted asset
+
+    Args:
+        name: Fingerprinted path as found in the manifest values
+        accept_encoding: Request Accept-Encoding header
+
+    Returns:
+        (path, headers), or (None, None) if the asset does not exist
+    """
+    folder = os.path.abspath(ASSET_CONFIG['folder'])
+    path = os.path.abspath(os.path.join(folder, name))
+    if not path.startswith(folder + os.sep) or name.endswith(MANIFEST) or not os.path.isfile(path):
+        return None, None
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    headers = {
+        'Content-Type': content_type + ('; charset=utf-8' if content_type.startswith('text/') else ''),
+        'Cache-Control': ASSET_CONFIG['cache_control'],
+        'Vary': 'Accept-Encoding',
+    }
+    accepted = {part.split(';')[0].strip() for part in (accept_encoding or '').split(',')}
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(path + suffix):
+            headers['Content-Encoding'] = encoding
+            return path + suffix, headers
+    return path, headers
+
+
+class AssetHelpers(Fixture):
+    """Injects asset_url into the templates of the actions that use it"""
+
+    def on_request(self, context):
+        context['template_inject']['asset_url'] = asset_url
@@ -0,0 +1,12 @@
+"""
+Benchmarks for the RH Contract application
+
+Run from the folder that contains apps/, for example:
+
+    python -m apps.myapp.benchmarks.cache_backends
+
+sqlite_pragmas.py only needs settings.py and runs as a file, without
+loading the app:
+
+    python apps/myapp/benchmarks/sqlite_pragmas.py
+"""
@@ -0,0 +1,94 @@
+"""
+Benchmark of the cache backends selectable with settings.CACHE_TYPE
+
+Starts worker processes that read keys through cache.get(key, loader), the
+way RowCache and ResponseCache do, with a loader that costs --load-ms (a
+stand-in for the database query). Each backend is run on its own:
+"memory" gives every worker a private cache, "sqlite" shares one file.
+Reports throughput, hit rate and how many times the loader ran in total.
+
+    python -m apps.myapp.benchmarks.cache_backends --workers 8 --keys 2000 --seconds 5
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from ..caching import make_cache
+
+
+def _worker(cache_type, filename, keys, load_ms, deadline, results):
+    cache = make_cache(cache_type, size=keys * 2, expiration=3600,
+                       namespace="bench", filename=filename)
+    loads = [0]
+
+    def loader(key):
+        def load():
+            loads[0] += 1
+            time.sleep(load_ms / 1000.0)
+            return {"id": key, "nome": "Funcionario %s" % key, "salario": 1000.0 + key}
+        return load
+
+    rnd = random.Random(os.getpid())
+    ops = 0
+    while time.time() < deadline:
+        key = rnd.randrange(keys)
+        cache.get(("row", "funcionario", key), loader(key))
+        ops += 1
+    stats = cache.stats()
+    results.put((ops, stats["hits"], stats["misses"], loads[0]))
+
+
+def run(cache_type, workers, keys, load_ms, seconds):
+    """Run one round and return a dict with throughput and hit counts"""
+    folder = tempfile.mkdtemp(prefix="bench_cache_")
+    filename = os.path.join(folder, "cache.sqlite")
+    if cache_type == "sqlite":
+        # create the file once, before the workers race to do it
+        make_cache(cache_type, size=keys * 2, expiration=3600,
+                   namespace="bench", filename=filename)
+    results = multiprocessing.Queue()
+    deadline = time.time() + seconds
+    procs = [
+        multiprocessing.Process(
+            target=_worker,
+            args=(cache_type, filename, keys, load_ms, deadline, results),
+        )
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    ops = hits = misses = loads = 0
+    for _ in procs:
+        o, h, m, l = results.get()
+        ops, hits, misses, loads = ops + o, hits + h, misses + m, loads + l
+    for proc in procs:
+        proc.join()
+    return {
+        "ops_per_s": ops / seconds,
+        "hit_rate": hits / float(hits + misses) if hits + misses else 0.0,
+        "loads": loads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--keys", type=int, default=2000)
+    parser.add_argument("--load-ms", type=float, default=2.0)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    for cache_type in ("memory", "sqlite"):
+        stats = run(cache_type, args.workers, args.keys, args.load_ms, args.seconds)
+        print(
+            "%-7s ops/s=%10.1f hit_rate=%6.3f loader_calls=%d"
+            % (cache_type, stats["ops_per_s"], stats["hit_rate"], stats["loads"])
+        )
+
+
+if __name__ == "__main__":
+    main()
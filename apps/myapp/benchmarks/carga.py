@@ -0,0 +1,282 @@
+"""
+Load test of a running server with realistic mixes of actions
+
+Client processes log in as the dataset.py load test user and, for
+--seconds, pick actions by the weights of --scenario: search
+(buscar_funcionario), listing (listar_funcionarios, filtered by state),
+employee page (funcionario/<id>/contratos), contract generation
+(gerar_contrato, needs wkhtmltopdf on the server) and signed upload
+(upload_contrato_assinado, each pending contract of the manifest is signed
+once, then uploads stop). Each client keeps one keep-alive connection and
+waits --think-ms between requests. Reports throughput, errors, 503s (render
+queue full) and latency percentiles per action; --warmup seconds are not
+counted.
+
+    python -m apps.myapp.benchmarks.dataset --employees 5000 --contracts 3
+    python -m apps.myapp.benchmarks.carga --url http://127.0.0.1:8000 --scenario admissao --clients 16
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import time
+import urllib.parse
+import uuid
+
+APP_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST = os.path.join(APP_FOLDER, "databases", "carga.json")
+
+# action -> weight; the mixes we see on a normal day and during an admission wave
+SCENARIOS = {
+    "consulta": {"buscar": 50, "listar": 20, "detalhe": 30},
+    "admissao": {"buscar": 25, "listar": 10, "detalhe": 25, "gerar": 25, "upload": 15},
+    "assinaturas": {"buscar": 20, "detalhe": 30, "upload": 50},
+    "geracao": {"detalhe": 20, "gerar": 80},
+}
+
+PLACEHOLDER_PDF = (
+    b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+)
+CONTRACT_TYPES = ("contrato_entrada", "termo_uso", "sindicato")
+
+
+class Client:
+    """One keep-alive connection with the session cookies of a logged-in user"""
+
+    def __init__(self, url, app):
+        parts = urllib.parse.urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = "/" + app
+        self.cookies = {}
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Returns (status, body); reconnects once on a dropped connection"""
+        headers = dict(headers or {})
+        if self.cookies:
+            headers["Cookie"] = "; ".join("%s=%s" % item for item in self.cookies.items())
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, self.prefix + path, body=body, headers=headers)
+                resp = self.conn.getresponse()
+                data = resp.read()
+                break
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+        for name, value in resp.getheaders():
+            if name.lower() == "set-cookie":
+                key, _, rest = value.partition("=")
+                self.cookies[key.strip()] = rest.split(";", 1)[0]
+        return resp.status, data
+
+    def login(self, username, password):
+        status, data = self.request(
+            "POST", "/auth/api/login", json.dumps({"email": username, "password": password}),
+            {"Content-Type": "application/json"},
+        )
+        if status != 200:
+            raise RuntimeError("login failed (%s): %s" % (status, data[:200]))
+
+
+def _multipart(field, filename, content):
+    boundary = uuid.uuid4().hex
+    body = (
+        ("--%s\r\nContent-Disposition: form-data; name=\"%s\"; filename=\"%s\"\r\n"
+         "Content-Type: application/pdf\r\n\r\n" % (boundary, field, filename)).encode()
+        + content + ("\r\n--%s--\r\n" % boundary).encode()
+    )
+    return body, {"Content-Type": "multipart/form-data; boundary=%s" % boundary}
+
+
+def _run_action(client, rng, action, manifest, pending):
+    """Send one request; returns (status, ok) or None when the action has nothing left to do"""
+    if action == "buscar":
+        term = rng.choice(manifest["termos"])[:rng.randint(3, 6)]
+        status, _ = client.request("GET", "/buscar_funcionario?q=" + urllib.parse.quote(term))
+        return status, status == 200
+    if action == "listar":
+        status, _ = client.request("GET", "/listar_funcionarios?estado=" + rng.choice(manifest["estados"]))
+        return status, status == 200
+    if action == "detalhe":
+        status, _ = client.request("GET", "/funcionario/%d/contratos" % rng.choice(manifest["funcionarios"]))
+        return status, status == 200
+    if action == "gerar":
+        body = urllib.parse.urlencode({
+            "id_funcionario": rng.choice(manifest["funcionarios"]),
+            "tipo_contrato": rng.choice(CONTRACT_TYPES),
+        })
+        status, data = client.request("POST", "/gerar_contrato", body,
+                                      {"Content-Type": "application/x-www-form-urlencoded"})
+        # failures redirect to index with a flash message
+        return status, status == 200 and data.startswith(b"%PDF")
+    if action == "upload":
+        if not pending:
+            return None
+        contrato_id = pending.pop()
+        body, headers = _multipart("arquivo_assinado", "contrato_%d.pdf" % contrato_id, PLACEHOLDER_PDF)
+        status, data = client.request("POST", "/upload_contrato_assinado/%d" % contrato_id, body, headers)
+        try:
+            success = json.loads(data).get("success")
+        except ValueError:
+            success = False
+        return status, status == 200 and bool(success)
+    raise ValueError("unknown action %s" % action)
+
+
+def _client(number, options, manifest, pending, results):
+    try:
+        results.put((_drive(number, options, manifest, pending), None))
+    except Exception as e:
+        # the parent waits for one result per client, failed or not
+        results.put(({}, "client %d: %s" % (number, e)))
+
+
+def _drive(number, options, manifest, pending):
+    rng = random.Random(options["seed"] + number)
+    weights = dict(SCENARIOS[options["scenario"]])
+    client = Client(options["url"], options["app"])
+    client.login(options["username"], options["password"])
+    stats = {}
+    measure_from = options["start"] + options["warmup"]
+    while time.time() < options["deadline"]:
+        action = rng.choices(list(weights), list(weights.values()))[0]
+        started = time.time()
+        try:
+            outcome = _run_action(client, rng, action, manifest, pending)
+        except (OSError, http.client.HTTPException):
+            outcome = (0, False)
+        if outcome is None:
+            # nothing left to upload: the mix goes on without it
+            del weights[action]
+            if not weights:
+                break
+            continue
+        elapsed = time.time() - started
+        if started >= measure_from:
+            status, ok = outcome
+            entry = stats.setdefault(action, {"latencies": [], "errors": 0, "busy": 0})
+            entry["latencies"].append(elapsed)
+            if status == 503:
+                entry["busy"] += 1
+            elif not ok:
+                entry["errors"] += 1
+        if options["think"]:
+            time.sleep(rng.uniform(0.5, 1.5) * options["think"])
+    return stats
+
+
+def _percentile(latencies, p):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+
+def run(url, scenario, clients, seconds, warmup=2.0, think_ms=0, app="myapp", username=None,
+        password=None, manifest_path=MANIFEST, seed=1):
+    """
+    Load the server and return per-action statistics
+
+    Returns:
+        {action: {requests, requests_per_s, errors, busy, p50_ms, p95_ms,
+        p99_ms, max_ms}} plus a "total" entry
+    """
+    with open(manifest_path) as stream:
+        manifest = json.load(stream)
+    pendentes = list(manifest["pendentes"])
+    random.Random(seed).shuffle(pendentes)
+    start = time.time()
+    options = {
+        "url": url, "app": app, "scenario": scenario, "seed": seed,
+        "username": username or manifest["usuario"],
+        "password": password or manifest["senha"],
+        "start": start, "warmup": warmup, "deadline": start + warmup + seconds,
+        "think": think_ms / 1000.0,
+    }
+    results = multiprocessing.Queue()
+    procs = [
+        # every client signs its own share of the pending contracts
+        multiprocessing.Process(target=_client, args=(n, options, manifest, pendentes[n::clients], results))
+        for n in range(clients)
+    ]
+    for proc in procs:
+        proc.start()
+    merged, failures = {}, []
+    for _ in procs:
+        stats, failure = results.get()
+        if failure:
+            failures.append(failure)
+        for action, entry in stats.items():
+            target = merged.setdefault(action, {"latencies": [], "errors": 0, "busy": 0})
+            target["latencies"].extend(entry["latencies"])
+            target["errors"] += entry["errors"]
+            target["busy"] += entry["busy"]
+    for proc in procs:
+        proc.join()
+    if failures and not merged:
+        raise RuntimeError("; ".join(failures))
+    for failure in failures:
+        print("warning: %s" % failure)
+
+    merged["total"] = {
+        "latencies": [lat for entry in merged.values() for lat in entry["latencies"]],
+        "errors": sum(entry["errors"] for entry in merged.values()),
+        "busy": sum(entry["busy"] for entry in merged.values()),
+    }
+    report = {}
+    for action, entry in merged.items():
+        latencies = sorted(entry["latencies"])
+        report[action] = {
+            "requests": len(latencies),
+            "requests_per_s": len(latencies) / seconds,
+            "errors": entry["errors"],
+            "busy": entry["busy"],
+            "p50_ms": _percentile(latencies, 0.50),
+            "p95_ms": _percentile(latencies, 0.95),
+            "p99_ms": _percentile(latencies, 0.99),
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--app", default="myapp")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="consulta")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between requests of a client")
+    parser.add_argument("--username", default=None)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--manifest", default=MANIFEST)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args.url, args.scenario, args.clients, args.seconds, args.warmup, args.think_ms,
+                 args.app, args.username, args.password, args.manifest, args.seed)
+    print("scenario=%s clients=%d seconds=%s" % (args.scenario, args.clients, args.seconds))
+    print("%-8s %8s %8s %7s %5s %9s %9s %9s %9s" % (
+        "action", "requests", "req/s", "errors", "503", "p50 ms", "p95 ms", "p99 ms", "max ms"))
+    for action in sorted(report, key=lambda name: (name == "total", name)):
+        stats = report[action]
+        print("%-8s %8d %8.1f %7d %5d %9.1f %9.1f %9.1f %9.1f" % (
+            action, stats["requests"], stats["requests_per_s"], stats["errors"], stats["busy"],
+            stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], stats["max_ms"]))
+    if args.json:
+        with open(args.json, "w") as stream:
+            json.dump({"scenario": args.scenario, "clients": args.clients, "report": report}, stream, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Synthetic HR dataset for load tests
+
+Fills db.funcionario with realistic Brazilian records (CPF with valid check
+digits, CEP in the range of the employee's state, states from
+BRAZILIAN_STATES, the state capital as city) and gives every employee
+--contracts contracts, a share of them signed, each with a placeholder PDF
+in the upload folder (hard links to one small PDF). Summaries are rebuilt
+once at the end, and a load test user is created.
+
+Synthetic employees have an RG starting with "SINT-" and are removed with
+--clear, together with the load test user. The user's password comes from
+--password or CARGA_PASSWORD, otherwise a random one is generated; it is
+only written to MANIFEST, with the ids the load test needs:
+
+    python -m apps.myapp.benchmarks.dataset --employees 5000 --contracts 3
+    python -m apps.myapp.benchmarks.carga --scenario admissao
+
+Run it against a scratch copy of the database, not production: it refuses
+to add data to a database with real employees unless --allow-existing is
+given.
+"""
+
+import argparse
+import json
+import os
+import random
+import secrets
+import time
+from datetime import date, datetime, timedelta
+
+from pydal.validators import CRYPT
+
+from .. import settings
+from ..common import db
+from ..constants import BRAZILIAN_STATES, CONTRACT_STATUS, CONTRACT_TYPES, GENDER_OPTIONS, MARITAL_STATUS
+from ..summaries import on_contract_insert, rebuild_summaries
+from ..utils import ensure_directory_exists, sanitize_filename
+from .carga import PLACEHOLDER_PDF
+
+MANIFEST = os.path.join(settings.DB_FOLDER, "carga.json")
+RG_PREFIX = "SINT-"
+PLACEHOLDER_NAME = ".carga_placeholder.pdf"
+LOAD_TEST_USER = "carga"
+
+FIRST_NAMES = [
+    "Ana", "Maria", "Juliana", "Fernanda", "Patrícia", "Aline", "Camila", "Bruna", "Letícia", "Larissa",
+    "Beatriz", "Mariana", "Gabriela", "Vanessa", "Luana", "José", "João", "Antônio", "Francisco", "Carlos",
+    "Paulo", "Pedro", "Lucas", "Luiz", "Marcos", "Gabriel", "Rafael", "Daniel", "Marcelo", "Bruno",
+    "Eduardo", "Felipe", "Rodrigo", "Gustavo", "Thiago", "Matheus", "Diego", "Vinícius", "Leonardo", "André",
+]
+SURNAMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+    "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes", "Vieira", "Barbosa",
+    "Rocha", "Dias", "Nascimento", "Andrade", "Moreira", "Nunes", "Marques", "Machado", "Mendes", "Freitas",
+]
+STREETS = [
+    "Rua das Flores", "Avenida Brasil", "Rua XV de Novembro", "Rua Sete de Setembro", "Avenida Getúlio Vargas",
+    "Rua Tiradentes", "Rua São José", "Avenida Paulista", "Rua Dom Pedro II", "Rua Santos Dumont",
+    "Rua Barão do Rio Branco", "Avenida Independência", "Rua da Paz", "Rua Marechal Deodoro", "Rua Rui Barbosa",
+]
+NEIGHBORHOODS = [
+    "Centro", "Jardim América", "Vila Nova", "Boa Vista", "Santa Cruz", "São José", "Jardim Primavera",
+    "Bela Vista", "Vila Maria", "Industrial", "Liberdade", "Cidade Nova", "Alto da Boa Vista", "Santo Antônio",
+]
+POSITIONS = [
+    "Auxiliar Administrativo", "Assistente de RH", "Analista de RH", "Operador de Produção", "Vendedor",
+    "Recepcionista", "Motorista", "Técnico de Manutenção", "Analista Financeiro", "Auxiliar de Limpeza",
+    "Estoquista", "Supervisor de Produção", "Desenvolvedor", "Contador", "Atendente",
+]
+# state -> (capital, first CEP prefix, last CEP prefix)
+STATES = {
+    'AC': ('Rio Branco', 69900, 69999), 'AL': ('Maceió', 57000, 57999), 'AP': ('Macapá', 68900, 68999),
+    'AM': ('Manaus', 69000, 69299), 'BA': ('Salvador', 40000, 48999), 'CE': ('Fortaleza', 60000, 63999),
+    'DF': ('Brasília', 70000, 72799), 'ES': ('Vitória', 29000, 29999), 'GO': ('Goiânia', 72800, 76799),
+    'MA': ('São Luís', 65000, 65999), 'MT': ('Cuiabá', 78000, 78899), 'MS': ('Campo Grande', 79000, 79999),
+    'MG': ('Belo Horizonte', 30000, 39999), 'PA': ('Belém', 66000, 68899), 'PB': ('João Pessoa', 58000, 58999),
+    'PR': ('Curitiba', 80000, 87999), 'PE': ('Recife', 50000, 56999), 'PI': ('Teresina', 64000, 64999),
+    'RJ': ('Rio de Janeiro', 20000, 28999), 'RN': ('Natal', 59000, 59999), 'RS': ('Porto Alegre', 90000, 99999),
+    'RO': ('Porto Velho', 76800, 76999), 'RR': ('Boa Vista', 69300, 69399), 'SC': ('Florianópolis', 88000, 89999),
+    'SP': ('São Paulo', 1000, 19999), 'SE': ('Aracaju', 49000, 49999), 'TO': ('Palmas', 77000, 77999),
+}
+# population share of the states, roughly: most employees in the southeast
+STATE_WEIGHTS = {'SP': 22, 'MG': 10, 'RJ': 8, 'BA': 7, 'PR': 6, 'RS': 5, 'PE': 4, 'CE': 4, 'PA': 4, 'SC': 4, 'GO': 3}
+
+
+def cpf(rng: random.Random) -> str:
+    """A CPF with valid check digits, formatted 000.000.000-00"""
+    while True:
+        digits = [rng.randint(0, 9) for _ in range(9)]
+        if len(set(digits)) > 1:
+            break
+    for length in (9, 10):
+        total = sum(d * (length + 1 - i) for i, d in enumerate(digits[:length]))
+        rest = total % 11
+        digits.append(0 if rest < 2 else 11 - rest)
+    text = ''.join(map(str, digits))
+    return '%s.%s.%s-%s' % (text[:3], text[3:6], text[6:9], text[9:])
+
+
+def cep(rng: random.Random, estado: str) -> str:
+    """A CEP (00000-000) in the range of the state"""
+    _, first, last = STATES[estado]
+    return '%05d-%03d' % (rng.randint(first, last), rng.randint(0, 999))
+
+
+def employee(rng: random.Random, number: int, cpfs: set) -> dict:
+    """One synthetic db.funcionario row"""
+    estado = rng.choices(BRAZILIAN_STATES, [STATE_WEIGHTS.get(s, 1) for s in BRAZILIAN_STATES])[0]
+    while True:
+        value = cpf(rng)
+        if value not in cpfs:
+            cpfs.add(value)
+            break
+    today = date.today()
+    nascimento = today - timedelta(days=rng.randint(18 * 365, 62 * 365))
+    idade = today.year - nascimento.year - ((today.month, today.day) < (nascimento.month, nascimento.day))
+    entrada = today - timedelta(days=rng.randint(0, min(10 * 365, (idade - 16) * 365)))
+    return dict(
+        nome='%s %s %s' % (rng.choice(FIRST_NAMES), rng.choice(SURNAMES), rng.choice(SURNAMES)),
+        cpf=value,
+        rg='%s%08d' % (RG_PREFIX, number),
+        idade=idade,
+        estado_civil=rng.choice(MARITAL_STATUS),
+        sexo=rng.choice(GENDER_OPTIONS),
+        data_nascimento=nascimento,
+        rua='%s, %d' % (rng.choice(STREETS), rng.randint(1, 3000)),
+        bairro=rng.choice(NEIGHBORHOODS),
+        cidade=STATES[estado][0],
+        cep=cep(rng, estado),
+        estado=estado,
+        data_entrada=entrada,
+        cargo=rng.choice(POSITIONS),
+        salario=round(rng.uniform(1412, 15000), 2),
+    )
+
+
+def _placeholder(nome: str, source: str) -> None:
+    path = os.path.join(settings.UPLOAD_FOLDER, nome)
+    try:
+        os.link(source, path)
+    except OSError:
+        # no hard links on this file system
+        with open(path, 'wb') as stream:
+            stream.write(PLACEHOLDER_PDF)
+
+
+def real_employees() -> int:
+    """Employees not created by this script"""
+    return db(~db.funcionario.rg.startswith(RG_PREFIX)).count()
+
+
+def generate(employees: int = 1000, contracts: int = 3, signed: float = 0.5, seed: int = 1,
+             batch_size: int = 500, password: str = None) -> dict:
+    """
+    Insert synthetic employees and contracts, then write MANIFEST
+
+    Args:
+        employees: Employees to create
+        contracts: Contracts per employee (contract types in turn)
+        signed: Share of the contracts already signed
+        seed: Random seed (same seed, same names and documents)
+        batch_size: Rows per bulk insert and commit
+        password: Of the load test user (default: random)
+
+    Returns:
+        Counts of what was created
+    """
+    rng = random.Random(seed)
+    ensure_directory_exists(settings.UPLOAD_FOLDER)
+    source = os.path.join(settings.UPLOAD_FOLDER, PLACEHOLDER_NAME)
+    with open(source, 'wb') as stream:
+        stream.write(PLACEHOLDER_PDF)
+
+    cpfs = {row.cpf for row in db(db.funcionario).select(db.funcionario.cpf)}
+    first = db(db.funcionario.rg.startswith(RG_PREFIX)).count()
+    tipos = list(CONTRACT_TYPES.values())
+    used_names = set()
+    created = {'funcionarios': 0, 'contratos': 0, 'assinados': 0}
+    started = time.time()
+    # the summaries are rebuilt once at the end, not per contract
+    db.contrato._after_insert.remove(on_contract_insert)
+    try:
+        for start in range(0, employees, batch_size):
+            rows = [employee(rng, first + n, cpfs) for n in range(start, min(employees, start + batch_size))]
+            ids = db.funcionario.bulk_insert(rows)
+            contratos = []
+            for funcionario_id, row in zip(ids, rows):
+                nome_limpo = sanitize_filename(row['nome'])
+                for n in range(contracts):
+                    tipo = tipos[n % len(tipos)]
+                    gerado = datetime.now() - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86400))
+                    # gerar_contrato's naming: type, employee name, timestamp
+                    while True:
+                        nome = '%s_%s_%s.pdf' % (tipo, nome_limpo, gerado.strftime('%Y%m%d%H%M%S'))
+                        if nome not in used_names:
+                            used_names.add(nome)
+                            break
+                        gerado += timedelta(seconds=1)
+                    _placeholder(nome, source)
+                    contrato = dict(funcionario=funcionario_id, arquivo=nome, data_geracao=gerado,
+                                    status=CONTRACT_STATUS['AGUARDANDO_ASSINATURA'])
+                    if rng.random() < signed:
+                        assinatura = gerado + timedelta(days=rng.randint(0, 10))
+                        contrato.update(
+                            status=CONTRACT_STATUS['ASSINADO'],
+                            data_assinatura=assinatura,
+                            arquivo_assinado='%s_assinado_%s_%s.pdf' % (
+                                tipo, funcionario_id, gerado.strftime('%Y%m%d%H%M%S')),
+                        )
+                        _placeholder(contrato['arquivo_assinado'], source)
+                        created['assinados'] += 1
+                    contratos.append(contrato)
+            db.contrato.bulk_insert(contratos)
+            db.commit()
+            created['funcionarios'] += len(rows)
+            created['contratos'] += len(contratos)
+            print('%d/%d employees' % (created['funcionarios'], employees))
+    finally:
+        db.contrato._after_insert.append(on_contract_insert)
+    rebuild_summaries()
+    manifest = write_manifest(_ensure_user(password))
+    created['segundos'] = round(time.time() - started, 1)
+    created['pendentes'] = len(manifest['pendentes'])
+    return created
+
+
+def _ensure_user(password=None) -> str:
+    """Create the load test user, or give it a new password; returns the password"""
+    password = password or secrets.token_urlsafe(18)
+    db.auth_user.update_or_insert(
+        db.auth_user.username == LOAD_TEST_USER,
+        username=LOAD_TEST_USER,
+        email='%s@example.com' % LOAD_TEST_USER,
+        first_name='Teste',
+        last_name='de Carga',
+        password=str(CRYPT()(password)[0]),
+    )
+    db.commit()
+    return password
+
+
+def write_manifest(password) -> dict:
+    """Ids of the synthetic employees and of their pending contracts, for carga.py"""
+    synthetic = db.funcionario.rg.startswith(RG_PREFIX)
+    funcionarios = [row.id for row in db(synthetic).select(db.funcionario.id, orderby=db.funcionario.id)]
+    pendentes = [
+        row.id for row in db(
+            (db.contrato.funcionario == db.funcionario.id) & synthetic
+            & (db.contrato.status == CONTRACT_STATUS['AGUARDANDO_ASSINATURA'])
+        ).select(db.contrato.id, orderby=db.contrato.id)
+    ]
+    db.rollback()
+    manifest = {
+        'usuario': LOAD_TEST_USER,
+        # the runner logs in with it; the file is readable by its owner only
+        'senha': password,
+        'funcionarios': funcionarios,
+        'pendentes': pendentes,
+        # search terms that match: first names and surnames in use
+        'termos': FIRST_NAMES + SURNAMES,
+        'estados': sorted(STATE_WEIGHTS),
+    }
+    fd = os.open(MANIFEST, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as stream:
+        json.dump(manifest, stream)
+    return manifest
+
+
+def clear() -> dict:
+    """Remove the synthetic employees, their contracts and files, and the load test user"""
+    synthetic = db(db.funcionario.rg.startswith(RG_PREFIX))
+    ids = [row.id for row in synthetic.select(db.funcionario.id)]
+    removed = {'funcionarios': len(ids), 'contratos': 0}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        for table in (db.contrato, db.contrato_arquivo):
+            rows = db(table.funcionario.belongs(chunk)).select(table.arquivo, table.arquivo_assinado)
+            for row in rows:
+                for nome in (row.arquivo, row.arquivo_assinado):
+                    if nome:
+                        try:
+                            os.unlink(os.path.join(settings.UPLOAD_FOLDER, nome))
+                        except FileNotFoundError:
+                            pass
+            removed['contratos'] += db(table.funcionario.belongs(chunk)).delete()
+        db(db.funcionario_resumo.funcionario.belongs(chunk)).delete()
+        db(db.funcionario.id.belongs(chunk)).delete()
+        db.commit()
+    db(db.auth_user.username == LOAD_TEST_USER).delete()
+    db.commit()
+    for path in (MANIFEST, os.path.join(settings.UPLOAD_FOLDER, PLACEHOLDER_NAME)):
+        if os.path.exists(path):
+            os.unlink(path)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--contracts", type=int, default=3, help="contracts per employee")
+    parser.add_argument("--signed", type=float, default=0.5, help="share of signed contracts")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--password", default=os.environ.get("CARGA_PASSWORD"),
+                        help="password of the load test user (default: $CARGA_PASSWORD or random)")
+    parser.add_argument("--allow-existing", action="store_true",
+                        help="add to a database that already has real employees (a copy, never production)")
+    parser.add_argument("--clear", action="store_true", help="remove the synthetic data and exit")
+    args = parser.parse_args()
+
+    if args.clear:
+        print(clear())
+        return
+    existing = real_employees()
+    if existing and not args.allow_existing:
+        parser.exit(1, "%s has %d real employees; run against a scratch copy, or pass --allow-existing\n"
+                    % (settings.DB_FOLDER, existing))
+    print(generate(args.employees, args.contracts, args.signed, args.seed, password=args.password))
+    print("manifest: %s" % MANIFEST)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark of the single-process server against the preforking one
+
+Starts the apps with "py4web run apps" (default server, one process) and
+then with "gunicorn -c gunicorn.conf.py" (apps preloaded in the master,
+--workers forked workers), drives each with --clients keep-alive client
+processes requesting --path for --seconds, and reports requests/s, latency
+percentiles and the memory of every server process: RSS, and PSS which
+splits the copy-on-write pages shared by the workers among them (Linux).
+
+    python -m apps.myapp.benchmarks.preforking --workers 4 --clients 16 --seconds 10
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def _wait_for_port(port, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited with status %s" % process.returncode)
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not listen on port %s" % port)
+
+
+def _client(port, path, deadline, results):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies = []
+    errors = 0
+    while time.time() < deadline:
+        started = time.time()
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 500:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append(time.time() - started)
+    results.put((latencies, errors))
+
+
+def _descendants(pid):
+    """pid and every process below it (reads /proc)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open("/proc/%s/stat" % entry) as stream:
+                    ppid = int(stream.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    found, todo = [], [pid]
+    while todo:
+        current = todo.pop()
+        found.append(current)
+        todo.extend(children.get(current, []))
+    return found
+
+
+def _memory_kb(pid):
+    """(rss, pss) in KiB of one process"""
+    values = {}
+    for name in ("status", "smaps_rollup"):
+        try:
+            with open("/proc/%s/%s" % (pid, name)) as stream:
+                for line in stream:
+                    key, _, rest = line.partition(":")
+                    if key in ("VmRSS", "Pss"):
+                        values[key] = int(rest.split()[0])
+        except OSError:
+            pass
+    return values.get("VmRSS", 0), values.get("Pss", 0)
+
+
+def run(mode, workers, clients, path, seconds, port):
+    """Start one server mode, load it and return throughput/latency/memory"""
+    if mode == "single":
+        command = [sys.executable, "-m", "py4web", "run", "apps",
+                   "--host", "127.0.0.1", "--port", str(port), "--password_file", "password.txt"]
+    else:
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                   "--bind", "127.0.0.1:%d" % port, "--workers", str(workers)]
+    server = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        _wait_for_port(port, server)
+        # warm up every worker before measuring
+        _load(port, path, clients, 1.0)
+        latencies, errors = _load(port, path, clients, seconds)
+        memory = [(pid,) + _memory_kb(pid) for pid in _descendants(server.pid)]
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait(timeout=30)
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {
+        "requests_per_s": len(latencies) / seconds,
+        "errors": errors,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        # gunicorn's entry is the master, python -m py4web has no wrapper
+        "memory": [m for m in memory if m[1]],
+    }
+
+
+def _load(port, path, clients, seconds):
+    results = multiprocessing.Queue()
+    deadline = time.time() + seconds
+    procs = [multiprocessing.Process(target=_client, args=(port, path, deadline, results))
+             for _ in range(clients)]
+    for proc in procs:
+        proc.start()
+    latencies, errors = [], 0
+    for _ in procs:
+        lat, err = results.get()
+        latencies.extend(lat)
+        errors += err
+    for proc in procs:
+        proc.join()
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--path", default="/myapp/buscar_funcionario?q=a")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for mode in ("single", "prefork"):
+        stats = run(mode, args.workers, args.clients, args.path, args.seconds, args.port)
+        print(
+            "%-7s req/s=%8.1f p50=%7.1fms p95=%7.1fms p99=%7.1fms errors=%d"
+            % (mode, stats["requests_per_s"], stats["p50_ms"], stats["p95_ms"],
+               stats["p99_ms"], stats["errors"])
+        )
+        for pid, rss, pss in stats["memory"]:
+            print("        pid=%-7d rss=%7.1fMB pss=%7.1fMB" % (pid, rss / 1024.0, pss / 1024.0))
+        total_pss = sum(m[2] for m in stats["memory"])
+        print("        total pss=%.1fMB" % (total_pss / 1024.0))
+
+
+if __name__ == "__main__":
+    main()
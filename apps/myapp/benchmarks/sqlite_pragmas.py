@@ -0,0 +1,173 @@
+"""
+Concurrency benchmark for settings.DB_SQLITE_PRAGMAS
+
+Runs reader processes (contract listings) against writer processes (contract
+inserts and status updates) on a scratch SQLite database, once with SQLite
+defaults and once with the tuning profile, and reports throughput and
+"database is locked" errors for each.
+
+    python apps/myapp/benchmarks/sqlite_pragmas.py --readers 4 --writers 2 --seconds 5
+
+Run as a file: only settings.py is loaded, importing the apps.myapp package
+(python -m) would load the whole app, its database and asset build.
+"""
+
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+APP_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_settings():
+    spec = importlib.util.spec_from_file_location("myapp_settings", os.path.join(APP_FOLDER, "settings.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+settings = _load_settings()
+
+SCHEMA = [
+    "CREATE TABLE funcionario (id INTEGER PRIMARY KEY, nome TEXT, cpf TEXT);",
+    "CREATE TABLE contrato (id INTEGER PRIMARY KEY, funcionario INTEGER, arquivo TEXT,"
+    " status TEXT, data_geracao TIMESTAMP);",
+    "CREATE INDEX idx_contrato_funcionario ON contrato(funcionario);",
+]
+
+
+def _connect(path, pragmas):
+    # same driver defaults as pydal's sqlite adapter; journal_mode is a
+    # property of the database file and was already set by _setup
+    conn = sqlite3.connect(path)
+    pragmas = {k: v for k, v in pragmas.items() if k != "journal_mode"}
+    for statement in settings.sqlite_pragma_statements(pragmas):
+        conn.execute(statement)
+    return conn
+
+
+def _setup(path, pragmas, employees):
+    conn = sqlite3.connect(path)
+    if "journal_mode" in pragmas:
+        conn.execute("PRAGMA journal_mode=%s;" % pragmas["journal_mode"])
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.executemany(
+        "INSERT INTO funcionario (id, nome, cpf) VALUES (?, ?, ?);",
+        [(i, "Funcionario %s" % i, "%011d" % i) for i in range(1, employees + 1)],
+    )
+    conn.executemany(
+        "INSERT INTO contrato (funcionario, arquivo, status, data_geracao)"
+        " VALUES (?, ?, 'assinado', CURRENT_TIMESTAMP);",
+        [(i % employees + 1, "c_%s.pdf" % i) for i in range(employees * 5)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _reader(path, pragmas, employees, deadline, results):
+    ops = errors = 0
+    i = 0
+    conn = _connect(path, pragmas)
+    while time.time() < deadline:
+        i += 1
+        try:
+            conn.execute(
+                "SELECT * FROM contrato WHERE funcionario = ? ORDER BY data_geracao DESC;",
+                (i % employees + 1,),
+            ).fetchall()
+            ops += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put(("read", ops, errors))
+
+
+def _writer(path, pragmas, employees, deadline, results):
+    ops = errors = 0
+    i = 0
+    conn = _connect(path, pragmas)
+    while time.time() < deadline:
+        i += 1
+        try:
+            conn.execute(
+                "INSERT INTO contrato (funcionario, arquivo, status, data_geracao)"
+                " VALUES (?, ?, 'aguardando assinatura', CURRENT_TIMESTAMP);",
+                (i % employees + 1, "bench_%s.pdf" % i),
+            )
+            conn.execute(
+                "UPDATE contrato SET status = 'assinado' WHERE id = last_insert_rowid();"
+            )
+            conn.commit()
+            ops += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+            errors += 1
+    results.put(("write", ops, errors))
+
+
+def run(pragmas, readers, writers, seconds, employees):
+    """Run one round and return a dict with throughput and error counts"""
+    folder = tempfile.mkdtemp(prefix="bench_sqlite_")
+    path = os.path.join(folder, "bench.db")
+    _setup(path, pragmas, employees)
+    results = multiprocessing.Queue()
+    deadline = time.time() + seconds
+    procs = [
+        multiprocessing.Process(
+            target=_reader, args=(path, pragmas, employees, deadline, results)
+        )
+        for _ in range(readers)
+    ] + [
+        multiprocessing.Process(
+            target=_writer, args=(path, pragmas, employees, deadline, results)
+        )
+        for _ in range(writers)
+    ]
+    for proc in procs:
+        proc.start()
+    totals = {"read": [0, 0], "write": [0, 0]}
+    for _ in procs:
+        kind, ops, errors = results.get()
+        totals[kind][0] += ops
+        totals[kind][1] += errors
+    for proc in procs:
+        proc.join()
+    return {
+        "reads_per_s": totals["read"][0] / seconds,
+        "writes_per_s": totals["write"][0] / seconds,
+        "read_errors": totals["read"][1],
+        "write_errors": totals["write"][1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--employees", type=int, default=1000)
+    args = parser.parse_args()
+
+    for label, pragmas in (
+        ("defaults", {}),
+        ("DB_SQLITE_PRAGMAS", settings.DB_SQLITE_PRAGMAS),
+    ):
+        stats = run(pragmas, args.readers, args.writers, args.seconds, args.employees)
+        print(
+            "%-18s reads/s=%9.1f writes/s=%8.1f read_errors=%d write_errors=%d"
+            % (
+                label,
+                stats["reads_per_s"],
+                stats["writes_per_s"],
+                stats["read_errors"],
+                stats["write_errors"],
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Bulk employee import from CSV or JSON
+
+All rows are validated in one pass with the same rules as db.funcionario
+(VALIDATION_PATTERNS, VALIDATION_RANGES, FIELD_LENGTHS), CPF uniqueness is
+checked with set-based queries, and valid rows are inserted in batched
+transactions. The caller gets a per-row error report.
+"""
+
+import csv
+import io
+import json
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Tuple
+
+from .common import db, logger
+from .config import IMPORT_CONFIG
+from .constants import (
+    BRAZILIAN_STATES, DATE_FORMATS, FIELD_LENGTHS, GENDER_OPTIONS, MARITAL_STATUS,
+    VALIDATION_PATTERNS, VALIDATION_RANGES
+)
+
+# Compiled once, reused for every row
+CPF_RE = re.compile(VALIDATION_PATTERNS['CPF'])
+CEP_RE = re.compile(VALIDATION_PATTERNS['CEP'])
+
+REQUIRED_FIELDS = ('nome', 'cpf', 'rg', 'cidade', 'estado')
+
+MAX_LENGTHS = {
+    'nome': FIELD_LENGTHS['NOME_MAX'],
+    'rg': FIELD_LENGTHS['RG_MAX'],
+    'rua': FIELD_LENGTHS['RUA_MAX'],
+    'bairro': FIELD_LENGTHS['BAIRRO_MAX'],
+    'cidade': FIELD_LENGTHS['CIDADE_MAX'],
+    'cargo': FIELD_LENGTHS['CARGO_MAX'],
+}
+
+ALLOWED_VALUES = {
+    'estado': frozenset(BRAZILIAN_STATES),
+    'estado_civil': frozenset(MARITAL_STATUS),
+    'sexo': frozenset(GENDER_OPTIONS),
+}
+
+DATE_FIELDS = ('data_nascimento', 'data_entrada')
+
+IMPORT_FIELDS = (
+    'nome', 'cpf', 'rg', 'idade', 'estado_civil', 'sexo', 'data_nascimento',
+    'rua', 'bairro', 'cidade', 'cep', 'estado', 'data_entrada', 'cargo', 'salario'
+)
+
+
+def parse_rows(content: bytes, formato: str) -> List[Dict[str, Any]]:
+    """
+    Decode an uploaded CSV or JSON file into a list of dictionaries
+
+    Args:
+        content: Raw file content
+        formato: 'csv' or 'json'
+
+    Returns:
+        List of rows (dictionaries keyed by field name)
+    """
+    text = content.decode('utf-8-sig')
+    if formato == 'json':
+        data = json.loads(text)
+        if not isinstance(data, list):
+            raise ValueError('JSON deve conter uma lista de funcionários')
+        return data
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;')
+    except csv.Error:
+        dialect = csv.excel
+    return list(csv.DictReader(io.StringIO(text), dialect=dialect))
+
+
+def _parse_date(value: str):
+    for fmt in (DATE_FORMATS['DATABASE'], DATE_FORMATS['DISPLAY']):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _clean_row(raw: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Normalize and validate one row, returning (values, errors)"""
+    row = {}
+    for name in IMPORT_FIELDS:
+        value = raw.get(name)
+        value = str(value).strip() if value is not None else ''
+        row[name] = value or None
+    errors = []
+
+    for name in REQUIRED_FIELDS:
+        if not row[name]:
+            errors.append(f'{name}: obrigatório')
+
+    for name, maxsize in MAX_LENGTHS.items():
+        if row[name] and len(row[name]) > maxsize:
+            errors.append(f'{name}: máximo de {maxsize} caracteres')
+
+    if row['cpf'] and not CPF_RE.match(row['cpf']):
+        errors.append('cpf: formato deve ser 000.000.000-00')
+    if row['cep'] and not CEP_RE.match(row['cep']):
+        errors.append('cep: formato deve ser 00000-000')
+
+    if row['estado']:
+        row['estado'] = row['estado'].upper()
+    for name, allowed in ALLOWED_VALUES.items():
+        if row[name] and row[name] not in allowed:
+            errors.append(f'{name}: valor inválido ({row[name]})')
+
+    if row['idade']:
+        try:
+            row['idade'] = int(row['idade'])
+            # same bounds as IS_INT_IN_RANGE (upper bound excluded)
+            if not VALIDATION_RANGES['AGE_MIN'] <= row['idade'] < VALIDATION_RANGES['AGE_MAX']:
+                raise ValueError
+        except ValueError:
+            errors.append(f'idade: deve estar entre {VALIDATION_RANGES["AGE_MIN"]} e {VALIDATION_RANGES["AGE_MAX"]}')
+
+    if row['salario']:
+        try:
+            row['salario'] = Decimal(row['salario'].replace(',', '.'))
+            if not VALIDATION_RANGES['SALARY_MIN'] <= row['salario'] <= Decimal(str(VALIDATION_RANGES['SALARY_MAX'])):
+                raise InvalidOperation
+        except InvalidOperation:
+            errors.append('salario: valor inválido')
+
+    for name in DATE_FIELDS:
+        if row[name]:
+            parsed = _parse_date(row[name])
+            if parsed is None:
+                errors.append(f'{name}: data inválida')
+            row[name] = parsed
+
+    return row, errors
+
+
+def _existing_cpfs(cpfs: Iterable[str]) -> set:
+    """CPFs already registered, checked with one IN query per chunk"""
+    cpfs = list(cpfs)
+    existing = set()
+    chunk = IMPORT_CONFIG['lookup_chunk_size']
+    for start in range(0, len(cpfs), chunk):
+        rows = db(db.funcionario.cpf.belongs(cpfs[start:start + chunk])).select(db.funcionario.cpf)
+        existing.update(row.cpf for row in rows)
+    return existing
+
+
+def validate_rows(raw_rows: List[Dict[str, Any]],
+                  first_line: int = 2) -> Tuple[List[Tuple[int, dict]], List[dict]]:
+    """
+    Validate all rows in one pass
+
+    Args:
+        raw_rows: Rows as returned by parse_rows
+        first_line: Number reported for the first row (2 for CSV, after the
+            header; 1 for JSON lists)
+
+    Returns:
+        (valid, errors): valid is a list of (line, values), errors a list of
+        {'linha': n, 'erros': [...]} for rejected rows
+    """
+    cleaned = []
+    errors = []
+    seen_cpfs = {}
+    for line, raw in enumerate(raw_rows, start=first_line):
+        if not isinstance(raw, dict):
+            errors.append({'linha': line, 'erros': ['linha inválida']})
+            continue
+        row, row_errors = _clean_row(raw)
+        cpf = row['cpf']
+        if cpf and not row_errors:
+            if cpf in seen_cpfs:
+                row_errors.append(f'cpf: duplicado no arquivo (linha {seen_cpfs[cpf]})')
+            else:
+                seen_cpfs[cpf] = line
+        if row_errors:
+            errors.append({'linha': line, 'erros': row_errors})
+        else:
+            cleaned.append((line, row))
+
+    existing = _existing_cpfs(seen_cpfs)
+    valid = []
+    for line, row in cleaned:
+        if row['cpf'] in existing:
+            errors.append({'linha': line, 'erros': ['cpf: já cadastrado']})
+        else:
+            valid.append((line, row))
+    errors.sort(key=lambda e: e['linha'])
+    return valid, errors
+
+
+def import_rows(raw_rows: List[Dict[str, Any]], dry_run: bool = False,
+                first_line: int = 2) -> Dict[str, Any]:
+    """
+    Validate and insert employees in batched transactions
+
+    Args:
+        raw_rows: Rows as returned by parse_rows
+        dry_run: Only validate, do not insert
+        first_line: See validate_rows
+
+    Returns:
+        Report with totals and per-row errors
+    """
+    valid, errors = validate_rows(raw_rows, first_line)
+    inserted = 0
+    if not dry_run:
+        batch_size = IMPORT_CONFIG['batch_size']
+        for start in range(0, len(valid), batch_size):
+            batch = valid[start:start + batch_size]
+            try:
+                db.funcionario.bulk_insert([row for _, row in batch])
+                db.commit()
+                inserted += len(batch)
+            except Exception as e:
+                db.rollback()
+                logger.error(f'Bulk import batch starting at line {batch[0][0]} failed: {e}')
+                errors.extend({'linha': line, 'erros': [f'erro ao gravar: {e}']} for line, _ in batch)
+    logger.info(f'Bulk import - rows: {len(raw_rows)}, valid: {len(valid)}, inserted: {inserted}, errors: {len(errors)}')
+    return {
+        'total': len(raw_rows),
+        'validos': len(valid),
+        'inseridos': inserted,
+        'com_erro': len(errors),
+        'erros': errors,
+    }
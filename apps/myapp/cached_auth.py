@@ -0,0 +1,52 @@
+"""
+Cached user and group lookups for authenticated requests
+
+CachedAuth resolves the logged-in user through a RowCache on auth_user
+instead of reading the table on every request; profile, password and
+email changes are writes to auth_user and invalidate the cached row.
+CachedTags caches Tags.get per record, keyed by the write version of the
+tag table, so adding or removing a group is visible immediately.
+"""
+
+from pydal.tools.tags import Tags
+
+from py4web.utils.auth import Auth
+
+
+class CachedAuth(Auth):
+    """Auth whose get_user() reads auth_user through user_cache (a RowCache)"""
+
+    user_cache = None
+
+    def get_user(self, safe=True):
+        # safe=False returns the full record (password included) for the
+        # auth forms that update it, so it always comes from the database
+        if self.user_cache is None or not safe or not self.db:
+            return super().get_user(safe)
+        if not self.session.is_valid() or not self.user_id:
+            return {}
+        user = self.user_cache.load(self.user_id)
+        if not user:
+            return {}
+        return {
+            f.name: user[f.name]
+            for f in self.db.auth_user
+            if f.readable or f.name == "id"
+        }
+
+
+class CachedTags(Tags):
+    """Tags with get() cached until the tag table is written"""
+
+    def __init__(self, table, name="default", tag_table=None, store=None,
+                 table_versions=None, expiration=None):
+        super().__init__(table, name, tag_table)
+        self.store = store
+        self.table_versions = table_versions
+        self.expiration = expiration
+        table_versions.attach(self.tag_table)
+
+    def get(self, record_id):
+        tablename = self.tag_table._tablename
+        key = ("tags", tablename, int(record_id), self.table_versions.current([tablename]))
+        return self.store.get(key, lambda: Tags.get(self, record_id), self.expiration)
@@ -0,0 +1,497 @@
+"""
+Caches for the RH Contract application
+
+MemoryCache is a thread-safe in-process store bounded by size (LRU) and by
+age (TTL) that counts hits, misses and evictions. SQLiteCache has the same
+interface but keeps entries in a SQLite file shared by every worker process
+on the host (settings.CACHE_TYPE = "sqlite"). RowCache builds on it to
+give read-through access to rows of one table, invalidated by the table's
+update/delete callbacks and again once the request has committed.
+TableVersions keeps a write counter per table, bumped the same way, so
+derived entries (see response_cache.py) can be keyed by the data they read.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from py4web.core import Fixture
+from pydal.objects import Row
+
+MISSING = object()
+
+
+class MemoryCache:
+    """
+    TTL + LRU cache
+
+        cache = MemoryCache(size=1000, expiration=300)
+        value = cache.get(key, lambda: compute(), 60)  # read-through
+        cache.set(key, value)
+        cache.delete(key)
+    """
+
+    def __init__(self, size: int = 1000, expiration: float = 300):
+        self.size = size
+        self.expiration = expiration
+        self.lock = threading.Lock()
+        self.data = OrderedDict()  # key -> (expires_at, value)
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def _lookup(self, key, now):
+        """Return the stored value or MISSING; caller must hold the lock"""
+        item = self.data.get(key)
+        if item is None:
+            return MISSING
+        if item[0] < now:
+            del self.data[key]
+            self.expirations += 1
+            return MISSING
+        self.data.move_to_end(key)
+        return item[1]
+
+    def get(self, key, callback: Optional[Callable[[], Any]] = None,
+            expiration: Optional[float] = None, default=None):
+        """
+        Return the cached value for key
+
+        Args:
+            key: Cache key
+            callback: If given and the key is missing or expired, its result
+                is stored and returned (read-through)
+            expiration: Seconds to keep a value computed by callback
+            default: Returned on miss when there is no callback
+
+        Returns:
+            Cached or computed value
+        """
+        with self.lock:
+            value = self._lookup(key, time.time())
+            if value is not MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+        if callback is None:
+            return default
+        value = callback()
+        self.set(key, value, expiration)
+        return value
+
+    def set(self, key, value, expiration: Optional[float] = None) -> None:
+        """Store a value for expiration seconds (default: the cache TTL)"""
+        expires_at = time.time() + (self.expiration if expiration is None else expiration)
+        with self.lock:
+            self.data[key] = (expires_at, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.size:
+                self.data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key) -> None:
+        """Remove a key if present"""
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every key"""
+        with self.lock:
+            self.data.clear()
+
+    def incr(self, key, start: int = 0) -> int:
+        """
+        Atomically increment a counter that never expires
+
+        A missing counter starts from start, so callers that must never see
+        a value repeat after eviction pass a fresh start (e.g. a timestamp).
+        """
+        with self.lock:
+            value = self._lookup(key, time.time())
+            value = (start if value is MISSING else value) + 1
+            self.data[key] = (float('inf'), value)
+            self.data.move_to_end(key)
+            return value
+
+    def memoize(self, expiration: Optional[float] = None):
+        """Decorator caching a function's result by its positional arguments"""
+        def decorator(func):
+            def wrapper(*args):
+                key = (func.__module__, func.__name__) + args
+                return self.get(key, lambda: func(*args), expiration)
+            return wrapper
+        return decorator
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and hit rate since start"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'memory',
+                'size': len(self.data),
+                'max_size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+class SQLiteCache:
+    """
+    Cache shared by all processes on a host, stored in one SQLite file
+
+    Same interface as MemoryCache. Values are pickled; every operation is a
+    single statement or an IMMEDIATE transaction, so get/set/incr are atomic
+    across processes. When the namespace holds more than size entries the
+    ones closest to expiry are evicted. Several namespaces (one per logical
+    cache) can share the file.
+    """
+
+    # expires value of entries that never expire (counters)
+    NEVER = 1e18
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS cache_entry ("
+        " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB, expires REAL,"
+        " PRIMARY KEY (namespace, key));",
+        "CREATE INDEX IF NOT EXISTS idx_cache_entry_expires"
+        " ON cache_entry(namespace, expires);",
+    )
+
+    def __init__(self, filename: str, size: int = 1000, expiration: float = 300,
+                 namespace: str = 'default', timeout: float = 5):
+        self.filename = filename
+        self.size = size
+        self.expiration = expiration
+        self.namespace = namespace
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        # the file may be created by any worker; creation is idempotent
+        conn = self._connection()
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self):
+        """One connection per thread and process (connections do not survive fork)"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            folder = os.path.dirname(self.filename)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.filename, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL;')
+            conn.execute('PRAGMA synchronous=NORMAL;')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def _key(self, key) -> str:
+        return repr(key)
+
+    def _count(self, hit: bool) -> None:
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, callback: Optional[Callable[[], Any]] = None,
+            expiration: Optional[float] = None, default=None):
+        """See MemoryCache.get"""
+        row = self._connection().execute(
+            'SELECT value FROM cache_entry WHERE namespace=? AND key=? AND expires>=?;',
+            (self.namespace, self._key(key), time.time())
+        ).fetchone()
+        self._count(row is not None)
+        if row is not None:
+            return pickle.loads(row[0])
+        if callback is None:
+            return default
+        value = callback()
+        self.set(key, value, expiration)
+        return value
+
+    def set(self, key, value, expiration: Optional[float] = None) -> None:
+        """Store a value for expiration seconds (default: the cache TTL)"""
+        now = time.time()
+        expires_at = now + (self.expiration if expiration is None else expiration)
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entry (namespace, key, value, expires) VALUES (?, ?, ?, ?);',
+            (self.namespace, self._key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at)
+        )
+        self._evict(conn, now)
+
+    def _evict(self, conn, now) -> None:
+        # cheap check first; the full trim only runs when over the bound
+        count = conn.execute(
+            'SELECT COUNT(*) FROM cache_entry WHERE namespace=?;', (self.namespace,)
+        ).fetchone()[0]
+        if count <= self.size:
+            return
+        conn.execute(
+            'DELETE FROM cache_entry WHERE namespace=? AND expires<?;', (self.namespace, now)
+        )
+        cursor = conn.execute(
+            'DELETE FROM cache_entry WHERE namespace=? AND key IN ('
+            ' SELECT key FROM cache_entry WHERE namespace=? ORDER BY expires LIMIT'
+            ' MAX(0, (SELECT COUNT(*) FROM cache_entry WHERE namespace=?) - ?));',
+            (self.namespace, self.namespace, self.namespace, self.size)
+        )
+        with self.lock:
+            self.evictions += max(cursor.rowcount, 0)
+
+    def delete(self, key) -> None:
+        """Remove a key if present"""
+        self._connection().execute(
+            'DELETE FROM cache_entry WHERE namespace=? AND key=?;', (self.namespace, self._key(key))
+        )
+
+    def clear(self) -> None:
+        """Remove every key of this namespace"""
+        self._connection().execute('DELETE FROM cache_entry WHERE namespace=?;', (self.namespace,))
+
+    def incr(self, key, start: int = 0) -> int:
+        """See MemoryCache.incr"""
+        conn = self._connection()
+        k = self._key(key)
+        conn.execute('BEGIN IMMEDIATE;')
+        try:
+            row = conn.execute(
+                'SELECT value FROM cache_entry WHERE namespace=? AND key=? AND expires>=?;',
+                (self.namespace, k, time.time())
+            ).fetchone()
+            value = (start if row is None else pickle.loads(row[0])) + 1
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entry (namespace, key, value, expires) VALUES (?, ?, ?, ?);',
+                (self.namespace, k, pickle.dumps(value), self.NEVER)
+            )
+            conn.execute('COMMIT;')
+        except Exception:
+            conn.execute('ROLLBACK;')
+            raise
+        return value
+
+    memoize = MemoryCache.memoize
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of this process and the shared entry count"""
+        size = self._connection().execute(
+            'SELECT COUNT(*) FROM cache_entry WHERE namespace=?;', (self.namespace,)
+        ).fetchone()[0]
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'sqlite',
+                'size': size,
+                'max_size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def make_cache(cache_type: str, size: int, expiration: float,
+               namespace: str = 'default', filename: Optional[str] = None):
+    """
+    Build the cache backend selected by settings.CACHE_TYPE
+
+    Args:
+        cache_type: "memory" (per process) or "sqlite" (shared by the workers)
+        size: Maximum number of entries
+        expiration: Default TTL in seconds
+        namespace: Logical cache name within the shared file
+        filename: SQLite file (required for "sqlite")
+
+    Returns:
+        MemoryCache or SQLiteCache
+    """
+    if cache_type == 'memory':
+        return MemoryCache(size=size, expiration=expiration)
+    if cache_type == 'sqlite':
+        return SQLiteCache(filename, size=size, expiration=expiration, namespace=namespace)
+    raise ValueError('Unknown CACHE_TYPE: %s' % cache_type)
+
+
+class RowCache(Fixture):
+    """
+    Read-through cache of the rows of one table, keyed by id
+
+        funcionario_cache = RowCache(db, 'funcionario', MemoryCache(5000, 60))
+        funcionario_cache.attach()  # once the table is defined
+        funcionario = funcionario_cache.load(id)  # Row or None
+
+    Cached rows are plain copies (no update_record); update through db.
+    fields restricts the cached columns, e.g. to leave out secrets. Missing
+    ids are not cached, so rows inserted later are found right away.
+
+    Writes are invalidated by the table callbacks, before the transaction
+    commits; a concurrent reader may still load and cache the old committed
+    row in between. The cache is therefore also a fixture of db that
+    invalidates the ids written by the request again after db has
+    committed. Code writing outside actions should call invalidate() after
+    its db.commit().
+    """
+
+    def __init__(self, db, tablename: str, store, fields=None):
+        self.db = db
+        self.tablename = tablename
+        self.store = store
+        self.fields = fields
+        self.prefix = 'row:%s:' % tablename
+        # registered before any action is declared; prerequisites run their
+        # on_success after db's, i.e. after the commit
+        db.__prerequisites__ = list(getattr(db, '__prerequisites__', ())) + [self]
+
+    def load(self, id) -> Optional[Row]:
+        """Return the row with this id, from the cache or from the database"""
+        try:
+            id = int(id)
+        except (TypeError, ValueError):
+            return None
+
+        def fetch():
+            table = self.db[self.tablename]
+            if self.fields:
+                row = self.db(table._id == id).select(
+                    *[table[name] for name in self.fields], limitby=(0, 1)
+                ).first()
+            else:
+                row = table(id)
+            return row.as_dict() if row else None
+
+        key = self.prefix + str(id)
+        values = self.store.get(key)
+        if values is None:
+            values = fetch()
+            # a miss is not stored: the id may be inserted before it expires
+            if values is not None:
+                self.store.set(key, values)
+        return Row(values) if values else None
+
+    def invalidate(self, *ids) -> None:
+        """Drop the cached rows with these ids"""
+        for id in ids:
+            self.store.delete(self.prefix + str(id))
+
+    def attach(self) -> None:
+        """Register the table callbacks that invalidate changed rows"""
+        table = self.db[self.tablename]
+
+        def collect(dbset, fields=None):
+            # ids are read before the write, the Set may not match afterwards
+            dbset._row_cache_ids = [row.id for row in dbset.select(table._id)]
+            return False
+
+        def invalidate(dbset, fields=None):
+            ids = getattr(dbset, '_row_cache_ids', ())
+            self.invalidate(*ids)
+            if self.is_valid():
+                self.local.written.update(ids)
+
+        table._before_update.append(collect)
+        table._after_update.append(invalidate)
+        table._before_delete.append(collect)
+        table._after_delete.append(invalidate)
+
+    def on_request(self, context):
+        Fixture.local_initialize(self)
+        self.local.written = set()
+
+    def on_success(self, context):
+        self.invalidate(*self.local.written)
+
+    def on_error(self, context):
+        # rolled back: a load after the write may have cached the uncommitted row
+        self.invalidate(*self.local.written)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate metrics of the underlying store"""
+        return self.store.stats()
+
+
+class TableVersions(Fixture):
+    """
+    Write counters per table, bumped by insert/update/delete callbacks
+
+        table_versions = TableVersions(cache)
+        table_versions.attach(db.funcionario)
+        key = (path, table_versions.current(['funcionario']))
+
+    Any write changes the version, so keys built with it stop matching and
+    the old entries age out of the LRU instead of being served stale.
+
+    The callbacks run before the transaction commits, and a concurrent
+    request may still read the old rows and cache them under the new
+    version. Like RowCache, the first attach() makes this a fixture of the
+    table's db that bumps the tables written by the request again after db
+    has committed. Code writing outside actions should call bump() after
+    its db.commit().
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.dbs = []
+
+    def _key(self, tablename):
+        return 'version:%s' % tablename
+
+    def bump(self, tablename: str) -> int:
+        """Record a write to tablename"""
+        # start from the clock so a counter lost to eviction never repeats
+        return self.store.incr(self._key(tablename), start=time.time_ns())
+
+    def current(self, tablenames) -> tuple:
+        """Current versions of tablenames, in order"""
+        versions = []
+        for tablename in tablenames:
+            version = self.store.get(self._key(tablename))
+            if version is None:
+                version = self.bump(tablename)
+            versions.append(version)
+        return tuple(versions)
+
+    def _written(self, tablename):
+        self.bump(tablename)
+        if self.is_valid():
+            self.local.written.add(tablename)
+
+    def attach(self, *tables) -> None:
+        """
+        Bump the version of each table after every insert, update or delete,
+        and again once the request has committed
+
+        Attach before the actions are declared: the fixture is registered
+        with the tables' db here.
+        """
+        for table in tables:
+            tablename = table._tablename
+            db = table._db
+            if not any(known is db for known in self.dbs):
+                # prerequisites run their on_success after db's, i.e. after the commit
+                db.__prerequisites__ = list(getattr(db, '__prerequisites__', ())) + [self]
+                self.dbs.append(db)
+            table._after_insert.append(lambda fields, id, t=tablename: self._written(t))
+            table._after_update.append(lambda dbset, fields, t=tablename: self._written(t))
+            table._after_delete.append(lambda dbset, t=tablename: self._written(t))
+
+    def on_request(self, context):
+        Fixture.local_initialize(self)
+        self.local.written = set()
+
+    def on_success(self, context):
+        for tablename in self.local.written:
+            self.bump(tablename)
+
+    def on_error(self, context):
+        # rolled back: entries cached after the write hold uncommitted rows
+        for tablename in self.local.written:
+            self.bump(tablename)
@@ -6,38 +6,137 @@ import os
 import sys
 
 from pydal.tools.scheduler import Scheduler
-from pydal.tools.tags import Tags
 
-from py4web import DAL, Cache, Field, Flash, Session, Translator, action
-from py4web.server_adapters.logging_utils import make_logger
-from py4web.utils.auth import Auth
+from py4web import DAL, Field, Flash, Session, Translator, action
 from py4web.utils.downloader import downloader
 from py4web.utils.factories import ActionFactory
 from py4web.utils.mailer import Mailer
 
 from . import settings
+from .assets import AssetHelpers, manifest_path
+from .cached_auth import CachedAuth, CachedTags
+from .caching import RowCache, TableVersions, make_cache
+from .config import (
+    AUTH_CACHE_CONFIG,
+    CACHE_CONFIG,
+    METRICS_CONFIG,
+    PAGE_CACHE_CONFIG,
+    PROFILER_CONFIG,
+    RENDER_CONFIG,
+    ROW_CACHE_CONFIG,
+    SQL_STATS_CONFIG,
+)
+from .identity_map import IdentityMap
+from .logging_setup import make_logger
+from .metrics import Metrics, RequestMetrics
+from .page_cache import PageCache, deploy_stamp
+from .profiler import Profiler
+from .render_limiter import RenderSlots
+from .response_cache import ResponseCache
+from .sql_stats import RecordingTimingHandler, SQLStats
 
 # #######################################################
 # implement custom loggers form settings.LOGGERS
 # #######################################################
-logger = make_logger("py4web:" + settings.APP_NAME, settings.LOGGERS)
+logger = make_logger(
+    "py4web:" + settings.APP_NAME,
+    settings.LOGGERS,
+    use_queue=settings.LOG_QUEUE,
+    queue_size=settings.LOG_QUEUE_SIZE,
+    sampling=settings.LOG_SAMPLING,
+)
 
 # #######################################################
 # connect to db
 # #######################################################
+def apply_sqlite_pragmas(adapter):
+    """after_connection hook: tune every new SQLite connection"""
+    for statement in settings.sqlite_pragma_statements(settings.DB_SQLITE_PRAGMAS):
+        adapter.execute(statement)
+
+
 db = DAL(
     settings.DB_URI,
     folder=settings.DB_FOLDER,
     pool_size=settings.DB_POOL_SIZE,
     migrate=settings.DB_MIGRATE,
     fake_migrate=settings.DB_FAKE_MIGRATE,
+    after_connection=(
+        apply_sqlite_pragmas if settings.DB_URI.startswith("sqlite") else None
+    ),
 )
 
 # #######################################################
 # define global objects that may or may not be used by the actions
 # #######################################################
-cache = Cache(size=1000)
+# TTL + LRU, same get(key, callback, expiration) interface as py4web.Cache;
+# settings.CACHE_TYPE = "sqlite" shares the entries between worker processes
+cache = make_cache(
+    settings.CACHE_TYPE,
+    size=CACHE_CONFIG["size"],
+    expiration=CACHE_CONFIG["timeout"],
+    namespace="default",
+    filename=settings.CACHE_SQLITE_FILE,
+)
+# per-table write counters, bumped by callbacks attached in models.py
+table_versions = TableVersions(cache)
 T = Translator(settings.T_FOLDER)
+# read-through employee rows by id (TTL + LRU), invalidated in models.py
+funcionario_cache = RowCache(
+    db,
+    "funcionario",
+    make_cache(
+        settings.CACHE_TYPE,
+        size=ROW_CACHE_CONFIG["funcionario"]["size"],
+        expiration=ROW_CACHE_CONFIG["funcionario"]["timeout"],
+        namespace="funcionario",
+        filename=settings.CACHE_SQLITE_FILE,
+    ),
+)
+load_funcionario = funcionario_cache.load
+# asset_url() in templates (fingerprinted static files, see assets.py)
+assets = AssetHelpers()
+# host-wide limit on concurrent PDF renders, see render_limiter.py
+render_slots = RenderSlots(
+    RENDER_CONFIG["folder"],
+    max_concurrent=RENDER_CONFIG["max_concurrent"],
+    max_queue=RENDER_CONFIG["max_queue"],
+    max_wait=RENDER_CONFIG["max_wait"],
+    retry_after=RENDER_CONFIG["retry_after"],
+)
+# request-scoped row loader, see identity_map.py
+identity_map = IdentityMap(db, loaders={"funcionario": load_funcionario})
+
+# Prometheus metrics of all workers, served by /metrics (see metrics.py)
+metrics = Metrics(METRICS_CONFIG["folder"], flush_interval=METRICS_CONFIG["flush_interval"])
+metrics.declare("db_query_duration_seconds", "histogram", "SQL statement time")
+metrics.declare("pdf_render_seconds", "histogram", "wkhtmltopdf render time")
+metrics.declare("pdf_render_failures_total", "counter", "Failed wkhtmltopdf renders")
+metrics.declare("upload_bytes_total", "counter", "Bytes of uploaded files by kind")
+metrics.declare("upload_duration_seconds", "histogram", "Upload validation and storage time by kind")
+request_metrics = RequestMetrics(metrics)
+if METRICS_CONFIG["enabled"]:
+    request_metrics.attach_to(db)
+    RecordingTimingHandler.observers.append(
+        lambda sql, elapsed: metrics.observe("db_query_duration_seconds", elapsed)
+    )
+
+# profiles the actions switched on from _dashboard (see profiler.py)
+profiler = Profiler()
+if PROFILER_CONFIG["enabled"]:
+    profiler.attach_to(db)
+
+# per-request SQL count/time (Server-Timing header, N+1 warnings)
+sql_stats = SQLStats(
+    db,
+    logger,
+    max_queries=SQL_STATS_CONFIG["max_queries"],
+    max_time_ms=SQL_STATS_CONFIG["max_time_ms"],
+    repeat_threshold=SQL_STATS_CONFIG["repeat_threshold"],
+    log_statements=SQL_STATS_CONFIG["log_statements"],
+)
+if SQL_STATS_CONFIG["enabled_globally"]:
+    sql_stats.enable_globally()
 
 # #######################################################
 # pick the session type that suits you best
@@ -74,7 +173,7 @@ elif settings.SESSION_TYPE == "database":
 # #######################################################
 # Instantiate the object and actions that handle auth
 # #######################################################
-auth = Auth(session, db, define_tables=False)
+auth = CachedAuth(session, db, define_tables=False)
 auth.use_username = True
 auth.param.registration_requires_confirmation = settings.VERIFY_EMAIL
 auth.param.registration_requires_approval = settings.REQUIRES_APPROVAL
@@ -87,8 +186,100 @@ auth.param.default_login_enabled = settings.DEFAULT_LOGIN_ENABLED
 auth.define_tables()
 auth.fix_actions()
 
+# logged-in user read through a short-TTL row cache (see cached_auth.py);
+# profile/password changes are auth_user writes and invalidate it
+auth.user_cache = RowCache(
+    db,
+    "auth_user",
+    make_cache(
+        settings.CACHE_TYPE,
+        size=AUTH_CACHE_CONFIG["size"],
+        expiration=AUTH_CACHE_CONFIG["timeout"],
+        namespace="auth_user",
+        filename=settings.CACHE_SQLITE_FILE,
+    ),
+    # never keep password hashes or tokens in the cache
+    fields=[f.name for f in db.auth_user if f.readable or f.name == "id"],
+)
+auth.user_cache.attach()
+# cached pages show the user's name/email, see cached_page below
+table_versions.attach(db.auth_user)
+
 flash = auth.flash
 
+# cached JSON responses of actions reading only db.funcionario
+funcionario_responses = ResponseCache(
+    cache,
+    table_versions,
+    ["funcionario"],
+    auth,
+    expiration=CACHE_CONFIG["timeout"],
+    enabled=CACHE_CONFIG["enabled"],
+)
+
+# per-user cached HTML of pages that depend only on user and language,
+# use before the template: @action.uses(cached_page("index.html"), "index.html", auth.user)
+page_caches = []
+
+
+def cached_page(template):
+    """Returns a PageCache fixture for template (see page_cache.py)"""
+    fixture = PageCache(
+        cache,
+        auth,
+        template,
+        os.path.join(settings.APP_FOLDER, "templates"),
+        table_versions=table_versions,
+        # pages link fingerprinted assets, rebuilt assets change the manifest
+        dependencies=[manifest_path()],
+        stamp=deploy_stamp(settings.APP_FOLDER),
+        expiration=PAGE_CACHE_CONFIG["timeout"],
+        cache_control=PAGE_CACHE_CONFIG["cache_control"],
+        enabled=PAGE_CACHE_CONFIG["enabled"],
+    )
+    page_caches.append(fixture)
+    return fixture
+
+
+metrics.declare("cache_hits_total", "counter", "Cache hits by cache")
+metrics.declare("cache_misses_total", "counter", "Cache misses by cache")
+metrics.declare("cache_evictions_total", "counter", "LRU evictions by cache")
+metrics.declare("render_running", "gauge", "PDF renders running")
+metrics.declare("render_queue_depth", "gauge", "Requests waiting for a render slot")
+metrics.declare("render_started_total", "counter", "PDF renders admitted")
+metrics.declare("render_rejected_total", "counter", "Renders refused with 503 by reason")
+metrics.declare("render_wait_seconds_total", "counter", "Time spent waiting for a render slot")
+
+
+def cache_samples():
+    """Metrics collector: stats() of the caches and of render_slots"""
+    stores = [
+        ("default", cache.stats()),
+        ("funcionario", funcionario_cache.stats()),
+        ("auth_user", auth.user_cache.stats()),
+        ("respostas", funcionario_responses.stats()),
+    ] + [("pagina:%s" % os.path.basename(page.paths[0]), page.stats()) for page in page_caches]
+    samples = []
+    for name, stats in stores:
+        labels = {"cache": name}
+        samples.append(("cache_hits_total", labels, stats["hits"] + stats.get("not_modified", 0)))
+        samples.append(("cache_misses_total", labels, stats["misses"]))
+        if "evictions" in stats:
+            samples.append(("cache_evictions_total", labels, stats["evictions"]))
+    render = render_slots.stats()
+    samples += [
+        ("render_running", {}, render["running"]),
+        ("render_queue_depth", {}, render["queue_depth"]),
+        ("render_started_total", {}, render["started"]),
+        ("render_rejected_total", {"reason": "fila_cheia"}, render["rejected_full"]),
+        ("render_rejected_total", {"reason": "timeout"}, render["rejected_timeout"]),
+        ("render_wait_seconds_total", {}, render["wait_seconds_total"]),
+    ]
+    return samples
+
+
+metrics.collectors.append(cache_samples)
+
 # #######################################################
 # Configure email sender for auth
 # #######################################################
@@ -105,7 +296,13 @@ if settings.SMTP_SERVER:
 # Create a table to tag users as group members
 # #######################################################
 if auth.db:
-    groups = Tags(db.auth_user, "groups")
+    groups = CachedTags(
+        db.auth_user,
+        "groups",
+        store=cache,
+        table_versions=table_versions,
+        expiration=AUTH_CACHE_CONFIG["timeout"],
+    )
 
 # #######################################################
 # Enable optional auth plugin
@@ -224,7 +421,7 @@ else:
 # #######################################################
 # Enable authentication
 # #######################################################
-auth.enable(uses=(session, T, db), env=dict(T=T))
+auth.enable(uses=(session, T, db, assets), env=dict(T=T))
 
 # #######################################################
 # Define convenience decorators
@@ -233,5 +430,5 @@ auth.enable(uses=(session, T, db), env=dict(T=T))
 # If you need to provide extra fixtures for a specific controller
 # add them like this: @authenticated(uses=[extra_fixture])
 # #######################################################
-unauthenticated = ActionFactory(db, session, T, flash, auth)
-authenticated = ActionFactory(db, session, T, flash, auth.user)
+unauthenticated = ActionFactory(db, session, T, flash, auth, assets)
+authenticated = ActionFactory(db, session, T, flash, auth.user, assets)
@@ -46,8 +46,9 @@ SEARCH_CONFIG = {
 
 # Configurações de cache
 CACHE_CONFIG = {
-    'enabled': True,
-    'timeout': 300  # 5 minutos
+    'enabled': True,  # cache de respostas JSON (response_cache.py)
+    'timeout': 300,  # 5 minutos
+    'size': 1000  # entradas mantidas por processo (LRU)
 }
 
 # Configurações de logging
@@ -55,4 +56,146 @@ LOGGING_CONFIG = {
     'level': 'INFO',
     'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     'file': 'app.log'
-} 
\ No newline at end of file
+} 
+
+# Configurações de exportação
+EXPORT_CONFIG = {
+    'formats': ['csv', 'xlsx'],
+    'csv_delimiter': ';',
+    'chunk_size': 64 * 1024,  # 64KB por bloco enviado
+    'job_timeout': 3600,  # exportações agendadas
+    'folder': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exports')
+}
+
+# Configurações de importação em massa
+IMPORT_CONFIG = {
+    'allowed_extensions': ['.csv', '.json'],
+    'max_file_size': 20 * 1024 * 1024,  # 20MB
+    'max_rows': 50000,
+    'batch_size': 1000,  # linhas por transação
+    'lookup_chunk_size': 500  # CPFs por consulta IN
+}
+
+# Importação em massa de contratos assinados (ZIP ou diretório)
+INGEST_CONFIG = {
+    'max_zip_size': 200 * 1024 * 1024,  # 200MB enviados
+    'max_uncompressed_size': 1024 * 1024 * 1024,  # 1GB descompactado
+    'max_files': 2000,
+    'workers': 4,  # threads validando e gravando arquivos
+    'batch_size': 200,  # contratos atualizados por transação
+    'lookup_chunk_size': 500,  # nomes/ids por consulta IN
+    'import_folder': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'importacao')
+}
+
+# Rotinas de manutenção agendadas (maintenance.py, registradas em tasks.py)
+MAINTENANCE_CONFIG = {
+    # HTML temporário de rendering.generate_pdf_from_template (prefixo/pasta conhecidos)
+    'temp_folder': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases', 'render_tmp'),
+    'temp_prefix': 'contrato_render_',
+    'temp_max_age': 3600,  # segundos; mais antigos que isso são sobras de falhas
+    # uploads sem contrato (contrato/contrato_arquivo) vão para a quarentena
+    'orphan_grace': 24 * 3600,  # segundos; protege gravações em andamento
+    'orphan_folder': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'orfaos'),
+    'orphan_retention_days': 30,  # depois disso, apagados da quarentena
+    'vacuum_pages': 1000,  # páginas liberadas por PRAGMA incremental_vacuum
+    'lock_folder': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases', 'maintenance'),
+    # período (segundos) e timeout de cada rotina no scheduler
+    'jobs': {
+        'limpar_html_temporario': {'period': 3600, 'timeout': 300},
+        'limpar_uploads_orfaos': {'period': 24 * 3600, 'timeout': 1800},
+        'otimizar_banco': {'period': 24 * 3600, 'timeout': 1800},
+        'atualizar_resumos': {'period': 6 * 3600, 'timeout': 1800},
+    }
+}
+
+# Métricas Prometheus (/metrics), agregadas entre os workers
+METRICS_CONFIG = {
+    'enabled': True,
+    'folder': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases', 'metrics'),
+    'flush_interval': 5,  # segundos entre gravações do snapshot de cada worker
+    # endereço da conexão (REMOTE_ADDR, não X-Forwarded-For); atrás do proxy é
+    # sempre o do proxy, por isso o token é obrigatório
+    'allowed_ips': ['127.0.0.1', '::1'],
+    # "Authorization: Bearer <token>"; sem token configurado /metrics responde 403
+    'token': os.environ.get('METRICS_TOKEN'),
+}
+
+# Profiler sob demanda (profiler.py); ligado/desligado pelo _dashboard
+PROFILER_CONFIG = {
+    'enabled': True,  # instala o fixture; sem o arquivo de controle nada é medido
+    # relatórios e switch.json (o _dashboard procura em <app>/databases/profiles)
+    'folder': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases', 'profiles'),
+    'max_reports': 200,  # os mais antigos são apagados
+    'top': 30,  # funções no resumo de cada relatório
+    'sample_interval': 0.005,  # segundos entre amostras da pilha (modo 'sample')
+    'check_interval': 1.0,  # segundos entre leituras do switch.json
+}
+
+# Reemissão em massa de contratos pendentes (reissue.py)
+REISSUE_CONFIG = {
+    'workers': 2,  # processos renderizando; abaixo de RENDER_CONFIG['max_concurrent']
+    'nice': 10,  # prioridade menor que a das requisições interativas
+    'pause': 0.5,  # segundos de pausa de cada processo entre renderizações
+    'chunk_size': 50,  # contratos pendentes lidos por vez (um checkpoint por lote)
+    'checkpoint': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases', 'reissue_checkpoint.json')
+}
+
+# Configurações de arquivamento de contratos assinados
+ARCHIVE_CONFIG = {
+    'retention_days': 365,  # assinados há mais tempo vão para contrato_arquivo
+    'batch_size': 500  # contratos movidos por transação
+}
+
+# Instrumentação de SQL por requisição (fixture sql_stats em common.py)
+SQL_STATS_CONFIG = {
+    'enabled_globally': False,  # True = todas as actions que usam db
+    'max_queries': 30,  # loga requisições com mais consultas que isso
+    'max_time_ms': 500,  # ou com mais tempo de banco que isso
+    'repeat_threshold': 5,  # mesma consulta (literais ignorados) = provável N+1
+    'log_statements': 10  # consultas mais lentas incluídas no log
+}
+
+# Cache de linhas lidas por id (TTL + LRU), ver caching.py
+ROW_CACHE_CONFIG = {
+    'funcionario': {
+        'size': 5000,  # linhas mantidas por processo
+        'timeout': 60  # segundos; updates/deletes invalidam antes disso
+    }
+}
+
+# Cache do usuário autenticado e dos grupos (cached_auth.py)
+AUTH_CACHE_CONFIG = {
+    'size': 1000,  # usuários mantidos por processo
+    'timeout': 60  # segundos; alterações em auth_user invalidam antes disso
+}
+
+# Cache de páginas HTML por usuário (page_cache.py)
+PAGE_CACHE_CONFIG = {
+    'enabled': True,
+    'timeout': 600,  # segundos; mudança de template/deploy invalida antes
+    'cache_control': 'private, no-cache'  # navegador revalida com ETag
+}
+
+# Arquivos estáticos com hash no nome e pré-comprimidos (assets.py)
+ASSET_CONFIG = {
+    'build_on_startup': True,
+    'extensions': ['.css', '.js'],
+    'folder': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static_build'),
+    'cache_control': 'public, max-age=31536000, immutable'  # 1 ano
+}
+
+# Limite de gerações de PDF simultâneas no servidor (render_limiter.py)
+RENDER_CONFIG = {
+    'max_concurrent': 4,  # processos wkhtmltopdf ao mesmo tempo
+    'max_queue': 16,  # requisições aguardando vaga; além disso, 503 imediato
+    'max_wait': 10,  # segundos aguardando vaga antes do 503
+    'retry_after': 5,  # segundos sugeridos no header Retry-After
+    'folder': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases', 'render_slots')
+}
+
+# Deduplicação de gerações de contrato (duplo clique, reenvio do formulário)
+GENERATION_CONFIG = {
+    'dedup_window': 30,  # segundos em que um contrato idêntico é reaproveitado
+    'lock_timeout': 60,  # segundos aguardando outra geração idêntica
+    'lock_buckets': 64  # arquivos de lock (em RENDER_CONFIG['folder'])
+}
@@ -63,7 +63,9 @@ MESSAGES = {
     'CONTRACT_SIGNED_SUCCESS': 'Contrato assinado com sucesso!',
     'REQUIRED_FIELDS': 'ID do funcionário e tipo de contrato são obrigatórios',
     'PROCESSING_ERROR': 'Erro ao processar a requisição',
-    'FILE_PROCESSING_ERROR': 'Erro ao processar arquivo'
+    'FILE_PROCESSING_ERROR': 'Erro ao processar arquivo',
+    'RENDER_BUSY': 'Muitos contratos sendo gerados no momento, tente novamente em instantes',
+    'IDEMPOTENCY_CONFLICT': 'Chave de idempotência já usada para outro contrato'
 }
 
 # Validation patterns
@@ -110,5 +112,28 @@ DATABASE_INDEXES = [
     'CREATE INDEX IF NOT EXISTS idx_funcionario_cpf ON funcionario(cpf);',
     'CREATE INDEX IF NOT EXISTS idx_contrato_funcionario ON contrato(funcionario);',
     'CREATE INDEX IF NOT EXISTS idx_contrato_status ON contrato(status);',
-    'CREATE INDEX IF NOT EXISTS idx_contrato_data_geracao ON contrato(data_geracao);'
-] 
\ No newline at end of file
+    'CREATE INDEX IF NOT EXISTS idx_contrato_data_geracao ON contrato(data_geracao);',
+    'CREATE INDEX IF NOT EXISTS idx_contrato_funcionario_data_geracao ON contrato(funcionario, data_geracao);'
+]
+
+# Archive (cold partition) indexes and unified history view
+ARCHIVE_SCHEMA = [
+    'CREATE INDEX IF NOT EXISTS idx_contrato_arquivo_funcionario ON contrato_arquivo(funcionario);',
+    'CREATE INDEX IF NOT EXISTS idx_contrato_arquivo_arquivo ON contrato_arquivo(arquivo);',
+    'CREATE INDEX IF NOT EXISTS idx_contrato_arquivo_arquivo_assinado ON contrato_arquivo(arquivo_assinado);',
+    'CREATE INDEX IF NOT EXISTS idx_contrato_status_data_assinatura ON contrato(status, data_assinatura);',
+    '''CREATE VIEW IF NOT EXISTS contrato_historico AS
+        SELECT id, funcionario, arquivo, status, data_geracao, arquivo_assinado,
+               data_assinatura, created_on, updated_on, NULL AS arquivado_em
+        FROM contrato
+        UNION ALL
+        SELECT id, funcionario, arquivo, status, data_geracao, arquivo_assinado,
+               data_assinatura, created_on, updated_on, arquivado_em
+        FROM contrato_arquivo;'''
+]
+
+# Contract generation deduplication (idempotency key and render version)
+GENERATION_SCHEMA = [
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_contrato_chave_idempotencia ON contrato(chave_idempotencia);',
+    'CREATE INDEX IF NOT EXISTS idx_contrato_versao_render ON contrato(versao_render, data_geracao);'
+]
@@ -4,4 +4,5 @@ Controllers package for the RH Contract application
 
 from .funcionarios import *
 from .contratos import *
-from .uploads import * 
\ No newline at end of file
+from .uploads import *
+from .exportacao import * 
\ No newline at end of file
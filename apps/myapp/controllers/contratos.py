@@ -5,24 +5,53 @@ Controllers for contract management
 import json
 import os
 import tempfile
-from datetime import datetime
-from py4web import URL, action, redirect, request, response
+import time
+import zipfile
+from datetime import datetime, timedelta
+from py4web import HTTP, URL, action, redirect, request, response
 from py4web.utils.form import Form, FormStyleBootstrap4
-import pdfkit
+import portalocker
 
-from ..common import T, auth, authenticated, cache, db, flash, logger, session
-from ..config import PDF_CONFIG, EMPRESA_CONFIG, UPLOAD_CONFIG
+from ..common import T, assets, auth, authenticated, cache, db, flash, identity_map, load_funcionario, metrics, render_slots, session
+from ..common import logger as app_logger
+from ..config import GENERATION_CONFIG, INGEST_CONFIG, RENDER_CONFIG, UPLOAD_CONFIG
 from ..constants import (
-    CONTRACT_TYPES, CONTRACT_STATUS, DEFAULT_VALUES, MESSAGES,
+    CONTRACT_TYPES, CONTRACT_STATUS, MESSAGES,
     DATE_FORMATS, ALLOWED_FILE_EXTENSIONS
 )
+from ..render_limiter import RenderBusy
+from ..rendering import (
+    EMPRESA_VERSION, generate_pdf_from_template, get_template_path, prepare_contract_data,
+    render_contract_html, render_version, template_version
+)
+from ..signed_ingest import directory_entries, ingest, resolve_import_folder, zip_entries
+from ..single_flight import SingleFlight
 from .. import settings
 from ..utils import (
-    sanitize_filename, format_currency, format_date, build_address,
+    sanitize_filename, format_date,
     get_contract_type_from_filename, validate_file_extension,
     validate_file_size, create_unique_filename, ensure_directory_exists
 )
 
+# sampled/filtered apart from the other controllers (settings.LOG_SAMPLING)
+logger = app_logger.getChild('contratos')
+
+# concurrent identical gerar_contrato requests of this process, see _generate_contract
+generation_flight = SingleFlight()
+metrics.declare('generation_executed_total', 'counter', 'Contract generations executed')
+metrics.declare('generation_coalesced_total', 'counter', 'Identical generations served by another one')
+
+
+def _generation_samples():
+    stats = generation_flight.stats()
+    return [
+        ('generation_executed_total', {}, stats['executed']),
+        ('generation_coalesced_total', {}, stats['coalesced']),
+    ]
+
+
+metrics.collectors.append(_generation_samples)
+
 
 @action("gerar_contrato", method=['POST'])
 @action.uses(db, auth, session, flash)
@@ -34,39 +63,38 @@ def gerar_contrato():
     
     id_funcionario = request.forms.get('id_funcionario')
     tipo_contrato = request.forms.get('tipo_contrato')
+    # optional: a repeated POST with the same key returns the original contract
+    chave = (request.forms.get('chave_idempotencia') or request.headers.get('Idempotency-Key') or '').strip() or None
     
-    logger.info(f'Starting contract generation - ID: {id_funcionario}, Type: {tipo_contrato}')
+    logger.info('Starting contract generation - ID: %s, Type: %s', id_funcionario, tipo_contrato)
     
     try:
         id_funcionario = int(id_funcionario)
         
-        # Use select().first() for better performance
+        # from the database, not the row cache: the contract must carry the
+        # employee data as committed, not a copy up to its TTL old
         funcionario = db.funcionario(id_funcionario)
         
         if not funcionario:
-            logger.error(f'Employee not found with ID: {id_funcionario}')
+            logger.error('Employee not found with ID: %s', id_funcionario)
             flash.set(MESSAGES['EMPLOYEE_NOT_FOUND'])
             redirect(URL('index'))
         
-        logger.info(f'Employee found - ID: {funcionario.id}, Name: {funcionario.nome}')
+        logger.info('Employee found - ID: %s, Name: %s', funcionario.id, funcionario.nome)
         
         # Prepare data for template using centralized configurations
-        dados = _prepare_contract_data(funcionario)
+        dados = prepare_contract_data(funcionario)
         
         # Get template path
-        template_path = _get_template_path(tipo_contrato)
+        template_path = get_template_path(tipo_contrato)
         
         if not os.path.exists(template_path):
-            logger.error(f'Template not found: {template_path}')
+            logger.error('Template not found: %s', template_path)
             flash.set(MESSAGES['TEMPLATE_NOT_FOUND'])
             redirect(URL('index'))
         
-        # Generate PDF
-        pdf = _generate_pdf_from_template(template_path, dados)
-        
-        # Save file and register contract
-        nome_arquivo = _save_contract_file(pdf, funcionario, tipo_contrato)
-        _register_contract(funcionario.id, nome_arquivo)
+        # Identical concurrent requests share one render, see _generate_contract
+        nome_arquivo, pdf = _generate_contract(funcionario, tipo_contrato, template_path, dados, chave)
         
         # Configure headers for download
         response.headers['Content-Type'] = 'application/pdf'
@@ -74,29 +102,72 @@ def gerar_contrato():
         
         return pdf
         
+    except IdempotencyConflict:
+        logger.warning('Idempotency key reused for another contract - Key: %s', chave)
+        raise HTTP(409, MESSAGES['IDEMPOTENCY_CONFLICT'])
+    except RenderBusy as e:
+        logger.warning('Render rejected - ID: %s, Reason: %s', id_funcionario, e)
+        raise HTTP(503, MESSAGES['RENDER_BUSY'], {'Retry-After': str(e.retry_after)})
     except ValueError:
-        logger.error(f'Invalid ID: {id_funcionario}')
+        logger.error('Invalid ID: %s', id_funcionario)
         flash.set(MESSAGES['INVALID_EMPLOYEE_ID'])
         redirect(URL('index'))
     except Exception as e:
-        logger.error(f'Unexpected error: {str(e)}')
+        logger.error('Unexpected error: %s', e)
         flash.set(MESSAGES['PROCESSING_ERROR'])
         redirect(URL('index'))
 
 
+@action('contrato/preview')
+@action.uses(db, auth.user)
+def preview_contrato():
+    """Filled-in contract HTML, without generating a PDF or registering a contract"""
+    tipo_contrato = request.query.get('tipo_contrato')
+    try:
+        id_funcionario = int(request.query.get('id_funcionario'))
+    except (TypeError, ValueError):
+        raise HTTP(400, MESSAGES['INVALID_EMPLOYEE_ID'])
+    
+    # only known types, the name is used to build a file path
+    if tipo_contrato not in CONTRACT_TYPES.values():
+        raise HTTP(404, MESSAGES['TEMPLATE_NOT_FOUND'])
+    
+    funcionario = load_funcionario(id_funcionario)
+    if not funcionario:
+        raise HTTP(404, MESSAGES['EMPLOYEE_NOT_FOUND'])
+    
+    template_path = get_template_path(tipo_contrato)
+    if not os.path.exists(template_path):
+        raise HTTP(404, MESSAGES['TEMPLATE_NOT_FOUND'])
+    
+    # employee version, template version and the date printed in the contract
+    key = (
+        'contrato_preview', funcionario.id, tipo_contrato, str(funcionario.updated_on),
+        template_version(template_path), EMPRESA_VERSION,
+        format_date(datetime.now(), DATE_FORMATS['DISPLAY'])
+    )
+    html = cache.get(key, lambda: render_contract_html(template_path, prepare_contract_data(funcionario)))
+    response.headers['Content-Type'] = 'text/html; charset=utf-8'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    # the page is served from the app origin: no scripts, only the inlined CSS
+    response.headers['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'"
+    return html
+
+
 @action('assinar_contrato/<contrato_id:int>', method=['GET', 'POST'])
-@action.uses(db, auth.user, 'assinar_contrato.html')
+@action.uses(db, auth.user, identity_map, assets, 'assinar_contrato.html')
 def assinar_contrato(contrato_id=None):
     """Contract signing form"""
-    contrato = db.contrato(contrato_id)
+    # Contract and employee come from a single joined query
+    contrato, funcionario = identity_map.contrato_com_funcionario(contrato_id)
     if not contrato:
         redirect(URL('funcionarios'))
     
-    # Use model field for upload
+    # Only the upload field: a form over the whole table would also render
+    # the funcionario select, whose IS_IN_DB lists every employee
     form = Form(
-        db.contrato,
+        [db.contrato.arquivo_assinado],
         record=contrato,
-        fields=['arquivo_assinado'],
         deletable=False,
         formstyle=FormStyleBootstrap4
     )
@@ -112,23 +183,23 @@ def assinar_contrato(contrato_id=None):
         flash.set(MESSAGES['CONTRACT_SIGNED_SUCCESS'])
         redirect(URL('funcionario', contrato.funcionario, 'contratos'))
     
-    return dict(form=form, contrato=contrato, funcionario=db.funcionario(contrato.funcionario))
+    return dict(form=form, contrato=contrato, funcionario=funcionario)
 
 
 @action('upload_contrato_assinado/<contrato_id:int>', method=['POST'])
 @action.uses(db, auth.user)
 def upload_contrato_assinado(contrato_id=None):
     """Upload signed contract via AJAX"""
-    logger.info(f'Starting upload for contract ID: {contrato_id}')
+    logger.info('Starting upload for contract ID: %s', contrato_id)
     
     try:
         contrato = db.contrato(contrato_id)
         if not contrato:
-            logger.error(f'Contract not found with ID: {contrato_id}')
+            logger.error('Contract not found with ID: %s', contrato_id)
             response.headers['Content-Type'] = 'application/json'
             return json.dumps(dict(success=False, message=MESSAGES['CONTRACT_NOT_FOUND']))
         
-        logger.info(f'Contract found - ID: {contrato.id}, Status: {contrato.status}')
+        logger.info('Contract found - ID: %s, Status: %s', contrato.id, contrato.status)
         
         # Check if file was sent
         if 'arquivo_assinado' not in request.files:
@@ -142,8 +213,9 @@ def upload_contrato_assinado(contrato_id=None):
             response.headers['Content-Type'] = 'application/json'
             return json.dumps(dict(success=False, message=MESSAGES['INVALID_FILE']))
         
-        logger.info(f'File received - Name: {arquivo.filename}')
+        logger.info('File received - Name: %s', arquivo.filename)
         
+        started = time.time()
         # Validate file
         if not _validate_uploaded_file(arquivo):
             response.headers['Content-Type'] = 'application/json'
@@ -151,6 +223,8 @@ def upload_contrato_assinado(contrato_id=None):
         
         # Save file
         nome_arquivo_assinado = _save_signed_contract_file(arquivo, contrato)
+        metrics.inc('upload_bytes_total', os.path.getsize(os.path.join(settings.UPLOAD_FOLDER, nome_arquivo_assinado)), kind='assinado')
+        metrics.observe('upload_duration_seconds', time.time() - started, kind='assinado')
         
         # Update contract
         contrato.update_record(
@@ -160,163 +234,140 @@ def upload_contrato_assinado(contrato_id=None):
         )
         db.commit()
         
-        logger.info(f'Contract updated - Signed File: {nome_arquivo_assinado}, Status: assinado')
+        logger.info('Contract updated - Signed File: %s, Status: assinado', nome_arquivo_assinado)
         
         response.headers['Content-Type'] = 'application/json'
         return json.dumps(dict(success=True, message=MESSAGES['CONTRACT_SIGNED_SUCCESS']))
         
     except Exception as e:
-        logger.error(f'Error processing file: {str(e)}')
-        import traceback
-        logger.error(f'Complete traceback: {traceback.format_exc()}')
+        logger.exception('Error processing file: %s', e)
         response.headers['Content-Type'] = 'application/json'
         return json.dumps(dict(success=False, message=f'{MESSAGES["FILE_PROCESSING_ERROR"]}: {str(e)}'))
 
 
-# Helper functions
-def _prepare_contract_data(funcionario):
-    """Prepare contract data from employee information"""
-    return {
-        'nome_empresa': EMPRESA_CONFIG['nome'],
-        'cnpj': EMPRESA_CONFIG['cnpj'],      
-        'endereco_empresa': EMPRESA_CONFIG['endereco'], 
-        'nome_funcionario': funcionario.nome,
-        'data_nascimento': format_date(funcionario.data_nascimento, DATE_FORMATS['DISPLAY']),
-        'sexo': funcionario.sexo,
-        'rg': funcionario.rg,
-        'ctps': funcionario.ctps if hasattr(funcionario, 'ctps') else DEFAULT_VALUES['CTPS'],
-        'cargo': funcionario.cargo,
-        'carga_horaria': DEFAULT_VALUES['CARGA_HORARIA'],  
-        'dias_semana': DEFAULT_VALUES['DIAS_SEMANA'],  
-        'salario': format_currency(funcionario.salario),
-        'data_inicio': format_date(funcionario.data_entrada, DATE_FORMATS['DISPLAY']),
-        'cidade': funcionario.cidade,
-        'data': format_date(datetime.now(), DATE_FORMATS['DISPLAY']),
-        'cpf': funcionario.cpf,
-        'estado_civil': funcionario.estado_civil,
-        'endereco': build_address(funcionario.rua, funcionario.bairro, funcionario.cidade, funcionario.estado, funcionario.cep),
-        'idade': funcionario.idade
-    }
-
-
-def _get_template_path(tipo_contrato):
-    """Get template file path"""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(current_dir, '..', 'templates', 'contrato', f'{tipo_contrato}.html')
-
-
-def _generate_pdf_from_template(template_path, dados):
-    """Generate PDF from template with data"""
-    # Read template
-    with open(template_path, 'r', encoding='utf-8') as f:
-        template_content = f.read()
-    
-    # Inline CSS to replace external references
-    css_inline = _get_inline_css()
-    
-    # Replace external CSS reference with inline CSS
-    template_content = template_content.replace(
-        '<link rel="stylesheet" href="/myapp/static/css/contratos.css">',
-        css_inline
-    )
-    
-    # Replace variables in template
-    for key, value in dados.items():
-        template_content = template_content.replace(f'[{key}]', str(value))
-    
-    # Create temporary file with processed content
-    with tempfile.NamedTemporaryFile(suffix='.html', delete=False, mode='w', encoding='utf-8') as temp_file:
-        temp_file.write(template_content)
-        temp_file_path = temp_file.name
-    
+@action('importar_contratos_assinados', method=['POST'])
+@action.uses(db, auth.user)
+def importar_contratos_assinados():
+    """
+    Bulk upload of signed contracts, returns a per-file report
+
+    Takes a ZIP file (field arquivo) or the name of a folder inside
+    INGEST_CONFIG['import_folder'] (field diretorio).
+    """
+    response.headers['Content-Type'] = 'application/json'
+    arquivo = request.files.get('arquivo')
+    diretorio = request.forms.get('diretorio')
+    tmp_path = None
     try:
-        # Configure wkhtmltopdf using centralized configurations
-        config = pdfkit.configuration(wkhtmltopdf=PDF_CONFIG['wkhtmltopdf_path'])
-        
-        # PDF options
-        options = {
-            'page-size': PDF_CONFIG['page_size'],
-            'orientation': PDF_CONFIG['orientation'],
-            'margin-top': PDF_CONFIG['margin_top'],
-            'margin-right': PDF_CONFIG['margin_right'],
-            'margin-bottom': PDF_CONFIG['margin_bottom'],
-            'margin-left': PDF_CONFIG['margin_left'],
-            'encoding': 'UTF-8',
-            'no-outline': None,
-            'disable-smart-shrinking': None,
-            'print-media-type': None,
-            'no-images': None,
-            'disable-external-links': None,
-            'disable-internal-links': None
-        }
-        
-        # Generate PDF
-        pdf = pdfkit.from_file(temp_file_path, False, configuration=config, options=options)
-        return pdf
-        
+        if arquivo and arquivo.filename:
+            if not validate_file_extension(arquivo.filename, ['.zip']):
+                return json.dumps(dict(success=False, message='Arquivo deve ser ZIP'))
+            fd, tmp_path = tempfile.mkstemp(suffix='.zip')
+            with os.fdopen(fd, 'wb') as stream:
+                arquivo.save(stream)
+            if not validate_file_size(os.path.getsize(tmp_path), INGEST_CONFIG['max_zip_size']):
+                return json.dumps(dict(success=False, message=MESSAGES['FILE_TOO_LARGE']))
+            entries = zip_entries(tmp_path)
+        elif diretorio:
+            pasta = resolve_import_folder(diretorio)
+            if pasta is None:
+                return json.dumps(dict(success=False, message='Diretório não encontrado'))
+            entries = directory_entries(pasta)
+        else:
+            return json.dumps(dict(success=False, message=MESSAGES['NO_FILE_SENT']))
+
+        logger.info('Signed ingestion requested - Source: %s, Files: %s', arquivo.filename if tmp_path else diretorio, len(entries))
+        started = time.time()
+        relatorio = ingest(entries)
+        if tmp_path:
+            metrics.inc('upload_bytes_total', os.path.getsize(tmp_path), kind='lote')
+            metrics.observe('upload_duration_seconds', time.time() - started, kind='lote')
+        return json.dumps(dict(success=True, relatorio=relatorio))
+    except (ValueError, zipfile.BadZipFile) as e:
+        logger.error('Invalid signed ingestion source: %s', e)
+        return json.dumps(dict(success=False, message=f'Arquivo inválido: {str(e)}'))
     finally:
-        # Clean up temporary file
-        if os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
-
-
-def _get_inline_css():
-    """Get inline CSS for contracts"""
-    return """
-    <style>
-    body {
-        font-family: Arial, sans-serif;
-        line-height: 1.6;
-        margin: 20px;
-        color: #333;
-    }
-    h1 {
-        text-align: center;
-        color: #2c3e50;
-        border-bottom: 2px solid #3498db;
-        padding-bottom: 10px;
-    }
-    h3 {
-        color: #2c3e50;
-        border-bottom: 1px solid #bdc3c7;
-        padding-bottom: 5px;
-    }
-    .contrato {
-        max-width: 800px;
-        margin: 0 auto;
-    }
-    .dados-pessoais {
-        background-color: #f8f9fa;
-        padding: 15px;
-        border-radius: 5px;
-        margin-bottom: 20px;
-    }
-    .dados-pessoais p {
-        margin: 5px 0;
-    }
-    .assinaturas {
-        display: flex;
-        justify-content: space-between;
-        margin-top: 40px;
-        margin-bottom: 20px;
-    }
-    .assinatura {
-        text-align: center;
-        width: 45%;
-    }
-    .assinatura strong {
-        display: block;
-        margin-top: 10px;
-    }
-    p {
-        text-align: justify;
-        margin-bottom: 15px;
-    }
-    strong {
-        color: #2c3e50;
-    }
-    </style>
+        if tmp_path:
+            os.unlink(tmp_path)
+
+
+# Helper functions
+class IdempotencyConflict(Exception):
+    """The idempotency key was already used for another employee or type"""
+
+
+def _read_contract_file(contrato):
+    with open(os.path.join(settings.UPLOAD_FOLDER, contrato.arquivo), 'rb') as f:
+        return f.read()
+
+
+def _contract_for_key(chave, funcionario, tipo_contrato, versao):
+    """(nome_arquivo, pdf) already generated with this idempotency key and render version, or None"""
+    contrato = db(db.contrato.chave_idempotencia == chave).select(limitby=(0, 1)).first()
+    if not contrato:
+        return None
+    if contrato.funcionario != funcionario.id or get_contract_type_from_filename(contrato.arquivo) != tipo_contrato:
+        raise IdempotencyConflict(chave)
+    if contrato.versao_render != versao:
+        # same page, same key, but the employee (or template) changed since:
+        # a new request, the key moves to the new contract
+        logger.info('Idempotency key reused after a data change - Key: %s, Contract ID: %s', chave, contrato.id)
+        return None
+    logger.info('Idempotent replay - Key: %s, Contract ID: %s', chave, contrato.id)
+    return contrato.arquivo, _read_contract_file(contrato)
+
+
+def _generate_contract(funcionario, tipo_contrato, template_path, dados, chave=None):
+    """
+    Render, store and register a contract, at most once per identical request
+
+    Threads of this process asking for the same render version share one
+    execution (SingleFlight); across processes a lock file per version
+    serializes them and the later ones reuse the contract created within
+    GENERATION_CONFIG['dedup_window'] seconds.
+
+    Returns:
+        (nome_arquivo, pdf)
     """
+    versao = render_version(funcionario, tipo_contrato, template_path)
+    if chave:
+        existing = _contract_for_key(chave, funcionario, tipo_contrato, versao)
+        if existing:
+            return existing
+    
+    def produce():
+        bucket = int(versao, 16) % GENERATION_CONFIG['lock_buckets']
+        lock_path = os.path.join(RENDER_CONFIG['folder'], f'generation_{bucket}.lock')
+        ensure_directory_exists(RENDER_CONFIG['folder'])
+        with portalocker.Lock(lock_path, timeout=GENERATION_CONFIG['lock_timeout']):
+            if chave:
+                # another process may have finished the same request meanwhile
+                existing = _contract_for_key(chave, funcionario, tipo_contrato, versao)
+                if existing:
+                    return existing
+            since = datetime.now() - timedelta(seconds=GENERATION_CONFIG['dedup_window'])
+            recente = db(
+                (db.contrato.versao_render == versao)
+                & (db.contrato.data_geracao >= since)
+                & (db.contrato.status == CONTRACT_STATUS['AGUARDANDO_ASSINATURA'])
+            ).select(orderby=~db.contrato.id, limitby=(0, 1)).first()
+            if recente and not chave:
+                logger.info('Reusing contract generated %s - Contract ID: %s', recente.data_geracao, recente.id)
+                return recente.arquivo, _read_contract_file(recente)
+            # at most RENDER_CONFIG['max_concurrent'] renders at a time
+            with render_slots.acquire():
+                pdf = generate_pdf_from_template(template_path, dados)
+            nome_arquivo = _save_contract_file(pdf, funcionario, tipo_contrato)
+            if chave:
+                # left on a contract of an older version (unique index)
+                db(db.contrato.chave_idempotencia == chave).update(chave_idempotencia=None)
+            _register_contract(funcionario.id, nome_arquivo, chave=chave, versao_render=versao)
+            return nome_arquivo, pdf
+    
+    (nome_arquivo, pdf), shared = generation_flight.do((versao, chave), produce)
+    if shared:
+        logger.info('Coalesced identical generation - Employee ID: %s, Type: %s', funcionario.id, tipo_contrato)
+    return nome_arquivo, pdf
 
 
 def _save_contract_file(pdf, funcionario, tipo_contrato):
@@ -334,13 +385,15 @@ def _save_contract_file(pdf, funcionario, tipo_contrato):
     return nome_arquivo
 
 
-def _register_contract(funcionario_id, nome_arquivo):
+def _register_contract(funcionario_id, nome_arquivo, chave=None, versao_render=None):
     """Register contract in database"""
     contrato_id = db.contrato.insert(
         funcionario=funcionario_id,
         arquivo=nome_arquivo,
         status=CONTRACT_STATUS['AGUARDANDO_ASSINATURA'],
-        data_geracao=datetime.now()
+        data_geracao=datetime.now(),
+        chave_idempotencia=chave,
+        versao_render=versao_render
     )
     db.commit()
     return contrato_id
@@ -350,7 +403,7 @@ def _validate_uploaded_file(arquivo):
     """Validate uploaded file"""
     # Check file extension
     if not validate_file_extension(arquivo.filename, ALLOWED_FILE_EXTENSIONS):
-        logger.error(f'Invalid file extension: {arquivo.filename}')
+        logger.error('Invalid file extension: %s', arquivo.filename)
         return False
     
     # Check file size
@@ -360,10 +413,10 @@ def _validate_uploaded_file(arquivo):
         arquivo.file.seek(0)  # Reset to beginning
         
         if not validate_file_size(file_size, UPLOAD_CONFIG['max_file_size']):
-            logger.error(f'File too large: {file_size} bytes')
+            logger.error('File too large: %s bytes', file_size)
             return False
     except Exception as e:
-        logger.error(f'Error checking file size: {e}')
+        logger.error('Error checking file size: %s', e)
         return False
     
     return True
@@ -382,27 +435,27 @@ def _save_signed_contract_file(arquivo, contrato):
     
     # Save file using most compatible method
     upload_path = os.path.join(settings.UPLOAD_FOLDER, nome_arquivo_assinado)
-    logger.info(f'Trying to save file at: {upload_path}')
+    logger.info('Trying to save file at: %s', upload_path)
     
     try:
         # Try using temporary file
         with open(upload_path, 'wb') as f:
             arquivo.file.seek(0)  # Go to beginning of file
             f.write(arquivo.file.read())
-        logger.info(f'File saved using arquivo.file.read()')
+        logger.info('File saved using arquivo.file.read()')
     except Exception as e1:
-        logger.error(f'Error with arquivo.file.read(): {e1}')
+        logger.error('Error with arquivo.file.read(): %s', e1)
         try:
             # Try using content directly
             with open(upload_path, 'wb') as f:
                 f.write(arquivo.value)
-            logger.info(f'File saved using arquivo.value')
+            logger.info('File saved using arquivo.value')
         except Exception as e2:
-            logger.error(f'Error with arquivo.value: {e2}')
+            logger.error('Error with arquivo.value: %s', e2)
             # Last attempt: copy temporary file
             import shutil
             shutil.copy2(arquivo.file.name, upload_path)
-            logger.info(f'File saved using shutil.copy2()')
+            logger.info('File saved using shutil.copy2()')
     
-    logger.info(f'File saved successfully: {nome_arquivo_assinado}')
+    logger.info('File saved successfully: %s', nome_arquivo_assinado)
     return nome_arquivo_assinado
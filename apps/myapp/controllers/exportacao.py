@@ -0,0 +1,74 @@
+"""
+Controllers for employee and contract exports
+"""
+
+import json
+import os
+import tempfile
+from py4web import action, request, response
+
+from ..common import auth, db, logger, scheduler
+from ..config import EXPORT_CONFIG
+from ..exports import (
+    export_filename, iter_csv_chunks, iter_file_chunks, stream_with_connection,
+    write_xlsx, xlsx_available
+)
+from ..queries import parse_funcionario_filters
+from .. import settings
+
+
+@action('exportar/funcionarios')
+@action.uses(db, auth.user)
+def exportar_funcionarios():
+    """Stream employees with their latest contract status as CSV or XLSX"""
+    formato = request.query.get('formato', 'csv').lower()
+    filters = parse_funcionario_filters(request.query)
+
+    if formato not in EXPORT_CONFIG['formats']:
+        response.status = 400
+        return json.dumps(dict(success=False, message=f'Formato inválido: {formato}'))
+
+    logger.info(f'Starting {formato} export with filters: {filters}')
+
+    if formato == 'xlsx':
+        if not xlsx_available():
+            response.status = 501
+            return json.dumps(dict(success=False, message='Exportação XLSX requer o pacote openpyxl'))
+        # XLSX is a zip container, so it is built in a temporary file
+        # (write-only mode keeps memory constant) and streamed from disk
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            write_xlsx(filters, path)
+        except Exception:
+            os.unlink(path)
+            raise
+        response.headers['Content-Disposition'] = f'attachment; filename={export_filename(formato)}'
+        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return iter_file_chunks(path, remove=True)
+
+    response.headers['Content-Disposition'] = f'attachment; filename={export_filename(formato)}'
+    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
+    return stream_with_connection(iter_csv_chunks(filters))
+
+
+@action('exportar/funcionarios/agendar', method=['POST'])
+@action.uses(db, auth.user)
+def agendar_exportacao_funcionarios():
+    """Enqueue a large export as a scheduler job"""
+    response.headers['Content-Type'] = 'application/json'
+    if not settings.USE_SCHEDULER:
+        return json.dumps(dict(success=False, message='Agendador desabilitado (USE_SCHEDULER)'))
+
+    formato = request.forms.get('formato', 'csv').lower()
+    if formato not in EXPORT_CONFIG['formats']:
+        return json.dumps(dict(success=False, message=f'Formato inválido: {formato}'))
+
+    filters = parse_funcionario_filters(request.forms)
+    scheduler.enqueue_run(
+        'exportar_funcionarios',
+        inputs=dict(filters=filters, formato=formato),
+        timeout=EXPORT_CONFIG['job_timeout']
+    )
+    logger.info(f'Export job enqueued - Format: {formato}, Filters: {filters}')
+    return json.dumps(dict(success=True, message='Exportação agendada'))
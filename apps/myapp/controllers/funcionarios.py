@@ -3,31 +3,40 @@ Controllers for employee management
 """
 
 import json
+import logging
 from datetime import datetime
 from py4web import URL, action, redirect, request, response
 from py4web.utils.form import Form, FormStyleBootstrap4
 
-from ..common import T, auth, authenticated, cache, db, flash, logger, session
-from ..config import SEARCH_CONFIG
+from ..common import T, assets, auth, authenticated, cache, cached_page, db, flash, funcionario_responses, identity_map, session
+from ..common import logger as app_logger
+from ..bulk_import import import_rows, parse_rows
+from ..config import IMPORT_CONFIG, SEARCH_CONFIG
 from ..constants import DATE_FORMATS
+from ..queries import build_funcionario_query, parse_funcionario_filters
+from ..summaries import get_summary
+from ..utils import validate_file_extension, validate_file_size
+
+# sampled/filtered apart from the other controllers (settings.LOG_SAMPLING)
+logger = app_logger.getChild('funcionarios')
 
 
 @action('index', method=['GET', 'POST'])
-@action.uses('index.html', auth.user)
+@action.uses(cached_page('index.html'), 'index.html', auth.user, assets)
 def index():
     """Main application index page"""
     return dict()
 
 
 @action('buscar_funcionario')
-@action.uses(db)
+@action.uses(db, funcionario_responses)
 def buscar_funcionario():
     """Search employees via AJAX"""
     query = request.query.get('q', '').strip()
     if not query or len(query) < SEARCH_CONFIG['min_query_length']:
         return json.dumps([])
     
-    logger.info(f'Searching employees with query: {query}')
+    logger.info('Searching employees with query: %s', query)
     
     try:
         # Use more efficient Pydal query
@@ -50,32 +59,65 @@ def buscar_funcionario():
                 limitby=(0, SEARCH_CONFIG['max_results'])
             )
         
-        logger.info(f'Found {len(funcionarios)} employees')
+        logger.info('Found %d employees', len(funcionarios))
         
         return json.dumps([{
             'id': f.id,
             'nome': f.nome
         } for f in funcionarios])
     except Exception as e:
-        logger.error(f'Error searching employees: {str(e)}')
+        logger.error('Error searching employees: %s', e)
         return json.dumps([])
 
 
 @action("cadastrar_funcionario")
-@action.uses(db, auth, "cadastrar_funcionario.html")
+@action.uses(db, auth, assets, "cadastrar_funcionario.html")
 def cadastrar_funcionario():
     """Employee registration form"""
     form = Form(db.funcionario)
     return dict(form=form)
 
 
+@action('importar_funcionarios', method=['POST'])
+@action.uses(db, auth.user)
+def importar_funcionarios():
+    """Bulk import employees from a CSV or JSON file, returns a per-row report"""
+    response.headers['Content-Type'] = 'application/json'
+    arquivo = request.files.get('arquivo')
+    if not arquivo or not arquivo.filename:
+        return json.dumps(dict(success=False, message='Nenhum arquivo foi enviado'))
+    
+    if not validate_file_extension(arquivo.filename, IMPORT_CONFIG['allowed_extensions']):
+        return json.dumps(dict(success=False, message='Arquivo deve ser CSV ou JSON'))
+    
+    content = arquivo.file.read()
+    if not validate_file_size(len(content), IMPORT_CONFIG['max_file_size']):
+        return json.dumps(dict(success=False, message='Arquivo muito grande'))
+    
+    formato = 'json' if arquivo.filename.lower().endswith('.json') else 'csv'
+    dry_run = request.forms.get('dry_run') in ('1', 'true', 'on')
+    logger.info('Bulk import requested - File: %s, Dry run: %s', arquivo.filename, dry_run)
+    
+    try:
+        rows = parse_rows(content, formato)
+    except Exception as e:
+        logger.error('Error parsing import file: %s', e)
+        return json.dumps(dict(success=False, message=f'Arquivo inválido: {str(e)}'))
+    
+    if len(rows) > IMPORT_CONFIG['max_rows']:
+        return json.dumps(dict(success=False, message=f'Máximo de {IMPORT_CONFIG["max_rows"]} linhas por arquivo'))
+    
+    relatorio = import_rows(rows, dry_run=dry_run, first_line=1 if formato == 'json' else 2)
+    return json.dumps(dict(success=True, relatorio=relatorio))
+
+
 @action('listar_funcionarios')
-@action.uses(db, auth)
+@action.uses(db, auth, funcionario_responses)
 def listar_funcionarios():
-    """List all employees as JSON"""
+    """List employees as JSON, optionally filtered by q, cidade, estado and cargo"""
     try:
-        # Get all employees
-        funcionarios = db(db.funcionario).select()
+        filters = parse_funcionario_filters(request.query)
+        funcionarios = db(build_funcionario_query(filters)).select()
         
         # Convert to dictionary and format dates
         funcionarios_list = []
@@ -102,46 +144,79 @@ def listar_funcionarios():
         
         return json.dumps(funcionarios_list)
     except Exception as e:
-        logger.error(f'Error listing employees: {str(e)}')
+        logger.error('Error listing employees: %s', e)
         return json.dumps([])
 
 
 @action('funcionarios')
-@action.uses('listar_funcionarios.html', auth.user)
+@action.uses(cached_page('listar_funcionarios.html'), 'listar_funcionarios.html', auth.user, assets)
 def funcionarios():
     """Employee listing page"""
     return dict()
 
 
 @action('funcionario/<id:int>')
-@action.uses('funcionario_detalhe.html', db, auth.user)
+@action.uses('funcionario_detalhe.html', db, auth.user, identity_map, assets)
 def funcionario_detalhe(id=None):
     """Employee detail page"""
-    funcionario = db.funcionario(id)
+    funcionario = identity_map.get('funcionario', id)
     if not funcionario:
         redirect(URL('funcionarios'))
     
-    contratos = db(db.contrato.funcionario == id).select(orderby=~db.contrato.data_geracao)
-    return dict(funcionario=funcionario, contratos=contratos)
+    # Counts and latest dates come from funcionario_resumo (one indexed row)
+    resumo = get_summary(id)
+    return dict(funcionario=funcionario, resumo=resumo)
+
+
+@action('resumo_contratos')
+@action.uses(db, auth.user)
+def resumo_contratos():
+    """Contract overview per employee as JSON, read from funcionario_resumo"""
+    filters = parse_funcionario_filters(request.query)
+    rows = db(build_funcionario_query(filters)).select(
+        db.funcionario.id,
+        db.funcionario.nome,
+        db.funcionario_resumo.contratos_pendentes,
+        db.funcionario_resumo.contratos_assinados,
+        db.funcionario_resumo.ultima_geracao,
+        db.funcionario_resumo.ultima_assinatura,
+        left=db.funcionario_resumo.on(db.funcionario_resumo.funcionario == db.funcionario.id),
+        orderby=db.funcionario.nome
+    )
+    
+    def _fmt(value):
+        return value.strftime(DATE_FORMATS['DISPLAY']) if value else None
+    
+    return json.dumps([{
+        'id': row.funcionario.id,
+        'nome': row.funcionario.nome,
+        'contratos_pendentes': row.funcionario_resumo.contratos_pendentes or 0,
+        'contratos_assinados': row.funcionario_resumo.contratos_assinados or 0,
+        'ultima_geracao': _fmt(row.funcionario_resumo.ultima_geracao),
+        'ultima_assinatura': _fmt(row.funcionario_resumo.ultima_assinatura)
+    } for row in rows])
 
 
 @action('funcionario/<id:int>/contratos')
-@action.uses('contratos_funcionario.html', db, auth.user)
+@action.uses('contratos_funcionario.html', db, auth.user, identity_map, assets)
 def contratos_funcionario(id=None):
     """Employee contracts page"""
-    logger.info(f'Looking for contracts for employee ID: {id}')
+    logger.info('Looking for contracts for employee ID: %s', id)
     
-    funcionario = db.funcionario(id)
+    # Employee and full contract history (including archived contracts)
+    # come from a single joined query
+    funcionario, contratos = identity_map.funcionario_com_contratos(id, historico=True)
     if not funcionario:
-        logger.error(f'Employee not found with ID: {id}')
+        logger.error('Employee not found with ID: %s', id)
         redirect(URL('funcionarios'))
     
-    logger.info(f'Employee found - ID: {funcionario.id}, Name: {funcionario.nome}')
-    
-    contratos = db(db.contrato.funcionario == id).select(orderby=~db.contrato.data_geracao)
-    logger.info(f'Found {len(contratos)} contracts for the employee')
+    logger.info('Employee found - ID: %s, Name: %s, Contracts: %d', funcionario.id, funcionario.nome, len(contratos))
     
-    for contrato in contratos:
-        logger.debug(f'  Contract ID: {contrato.id}, Status: {contrato.status}, File: {contrato.arquivo}, Signed File: {contrato.arquivo_assinado}')
+    if logger.isEnabledFor(logging.DEBUG):
+        for contrato in contratos:
+            logger.debug(
+                '  Contract ID: %s, Status: %s, File: %s, Signed File: %s',
+                contrato.id, contrato.status, contrato.arquivo, contrato.arquivo_assinado
+            )
     
     return dict(funcionario=funcionario, contratos=contratos) 
\ No newline at end of file
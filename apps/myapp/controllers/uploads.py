@@ -2,66 +2,73 @@
 Controllers for file uploads and debugging
 """
 
+import hmac
 import json
+import logging
 import os
 import urllib.parse
-from py4web import action, response
+from py4web import HTTP, action, request, response
 
-from ..common import db, auth, logger
+from ..archive import find_contract_by_file
+from ..assets import asset_response
+from ..common import db, auth, cache, funcionario_cache, funcionario_responses, metrics, page_caches, render_slots
+from ..common import logger as app_logger
+from ..config import METRICS_CONFIG
+from ..maintenance import stats as maintenance_stats
+from ..reissue import status as reissue_status
 from .. import settings
 
+# sampled/filtered apart from the other controllers (settings.LOG_SAMPLING)
+logger = app_logger.getChild('uploads')
+
 
 @action('uploads/<filename>')
 def uploads(filename):
     """Serve uploaded files"""
-    logger.info(f'DEBUG: filename received: {filename}')
+    logger.debug('filename received: %s', filename)
     
     # Decode filename from URL
     filename_decoded = urllib.parse.unquote(filename)
-    logger.info(f'DEBUG: decoded filename: {filename_decoded}')
-    
-    # Check if file exists in contract.arquivo table
-    row = db(db.contrato.arquivo == filename_decoded).select().first()
-    if row:
-        logger.info(f'DEBUG: Found in contract.arquivo: {row.arquivo}')
-        logger.info(f'DEBUG: Contract ID: {row.id}')
-        logger.info(f'DEBUG: Contract status: {row.status}')
-        upload_path = os.path.join(settings.UPLOAD_FOLDER, filename_decoded)
-        logger.info(f'DEBUG: File path: {upload_path}')
-        logger.info(f'DEBUG: File exists? {os.path.exists(upload_path)}')
-        if os.path.exists(upload_path):
-            response.headers['Content-Type'] = 'application/pdf'
-            response.headers['Content-Disposition'] = f'inline; filename="{filename_decoded}"'
-            with open(upload_path, 'rb') as f:
-                return f.read()
-        return "Arquivo não encontrado no sistema de arquivos", 404
     
-    # Check if file exists in contract.arquivo_assinado table
-    row = db(db.contrato.arquivo_assinado == filename_decoded).select().first()
+    # Check contract.arquivo and contract.arquivo_assinado, then the archive
+    row, field_name = find_contract_by_file(filename_decoded)
     if row:
-        logger.info(f'DEBUG: Found in contract.arquivo_assinado: {row.arquivo_assinado}')
-        logger.info(f'DEBUG: Contract ID: {row.id}')
-        logger.info(f'DEBUG: Contract status: {row.status}')
         upload_path = os.path.join(settings.UPLOAD_FOLDER, filename_decoded)
-        logger.info(f'DEBUG: File path: {upload_path}')
-        logger.info(f'DEBUG: File exists? {os.path.exists(upload_path)}')
+        logger.debug(
+            'Found in contract.%s: %s (archived: %s) - Contract ID: %s, Status: %s, Path: %s',
+            field_name, row[field_name], bool(row.get("arquivado_em")), row.id, row.status, upload_path
+        )
         if os.path.exists(upload_path):
             response.headers['Content-Type'] = 'application/pdf'
             response.headers['Content-Disposition'] = f'inline; filename="{filename_decoded}"'
             with open(upload_path, 'rb') as f:
                 return f.read()
+        logger.warning('File of contract %s missing on disk: %s', row.id, upload_path)
         return "Arquivo não encontrado no sistema de arquivos", 404
     
-    # If not found, list all files for debug
-    logger.error('DEBUG: File not found in database')
-    logger.info('DEBUG: Listing all contracts for debug:')
-    todos_contratos = db(db.contrato).select()
-    for contrato in todos_contratos:
-        logger.info(f'  Contract ID: {contrato.id}, File: {contrato.arquivo}, Signed File: {contrato.arquivo_assinado}, Status: {contrato.status}')
+    logger.warning('File not found in database: %s', filename_decoded)
+    # listing every contract is a full table read, only when debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        for contrato in db(db.contrato).select():
+            logger.debug(
+                '  Contract ID: %s, File: %s, Signed File: %s, Status: %s',
+                contrato.id, contrato.arquivo, contrato.arquivo_assinado, contrato.status
+            )
     
     return "Arquivo não encontrado", 404
 
 
+@action('assets/<name:path>')
+def assets_file(name):
+    """Serve a fingerprinted static file, precompressed when the client accepts it"""
+    path, headers = asset_response(name, request.headers.get('Accept-Encoding', ''))
+    if path is None:
+        raise HTTP(404, 'Arquivo não encontrado')
+    response.headers.update(headers)
+    with open(path, 'rb') as stream:
+        return stream.read()
+
+
 @action('debug_contratos')
 @action.uses(db, auth.user)
 def debug_contratos():
@@ -70,23 +77,67 @@ def debug_contratos():
     
     # Check all employees
     funcionarios = db(db.funcionario).select()
-    logger.info(f"Total employees: {len(funcionarios)}")
+    logger.info("Total employees: %d", len(funcionarios))
     for f in funcionarios:
-        logger.info(f"  Employee ID: {f.id}, Name: {f.nome}")
+        logger.info("  Employee ID: %s, Name: %s", f.id, f.nome)
     
     # Check all contracts
     contratos = db(db.contrato).select()
-    logger.info(f"Total contracts: {len(contratos)}")
+    logger.info("Total contracts: %d", len(contratos))
     for c in contratos:
-        logger.info(f"  Contract ID: {c.id}, Employee: {c.funcionario}, Status: {c.status}")
-        logger.info(f"    File: {c.arquivo}")
-        logger.info(f"    Signed File: {c.arquivo_assinado}")
-        logger.info(f"    Generation Date: {c.data_geracao}")
-        logger.info(f"    Signature Date: {c.data_assinatura}")
+        logger.info("  Contract ID: %s, Employee: %s, Status: %s", c.id, c.funcionario, c.status)
+        logger.info("    File: %s", c.arquivo)
+        logger.info("    Signed File: %s", c.arquivo_assinado)
+        logger.info("    Generation Date: %s", c.data_geracao)
+        logger.info("    Signature Date: %s", c.data_assinatura)
     
     return "Debug complete. Check server logs."
 
 
+@action('debug_cache')
+@action.uses(db, auth.user)
+def debug_cache():
+    """Hit-rate metrics of the in-process caches"""
+    response.headers['Content-Type'] = 'application/json'
+    return json.dumps(dict(
+        funcionario=funcionario_cache.stats(),
+        auth_user=auth.user_cache.stats(),
+        respostas=funcionario_responses.stats(),
+        paginas=[page.stats() for page in page_caches],
+        cache=cache.stats()
+    ))
+
+
+@action('debug_render')
+@action.uses(db, auth.user)
+def debug_render():
+    """PDF render admission metrics (queue depth, waits, rejections)"""
+    response.headers['Content-Type'] = 'application/json'
+    return json.dumps(render_slots.stats())
+
+
+@action('metrics')
+def metrics_endpoint():
+    """Prometheus scrape target: metrics of all workers of this host"""
+    # request.remote_addr trusts X-Forwarded-For, the connection address does not
+    if request.environ.get('REMOTE_ADDR') not in METRICS_CONFIG['allowed_ips']:
+        raise HTTP(403)
+    token = METRICS_CONFIG['token']
+    authorization = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(authorization.encode(), ('Bearer ' + token).encode()):
+        raise HTTP(403)
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return metrics.exposition()
+
+
+@action('debug_maintenance')
+@action.uses(db, auth.user)
+def debug_maintenance():
+    """Run-time metrics of the scheduled maintenance jobs and reissue progress"""
+    response.headers['Content-Type'] = 'application/json'
+    return json.dumps(dict(maintenance_stats(), reemissao=reissue_status()))
+
+
 @action('test_json_response')
 @action.uses(db, auth.user)
 def test_json_response():
@@ -97,7 +148,7 @@ def test_json_response():
         response.headers['Content-Type'] = 'application/json'
         return json.dumps(dict(success=True, message='JSON test working!'))
     except Exception as e:
-        logger.error(f'DEBUG: JSON test error: {str(e)}')
+        logger.error('DEBUG: JSON test error: %s', e)
         import traceback
-        logger.error(f'DEBUG: Traceback: {traceback.format_exc()}')
+        logger.error('DEBUG: Traceback: %s', traceback.format_exc())
         return "JSON test error"
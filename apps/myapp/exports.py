@@ -0,0 +1,210 @@
+"""
+Streaming exports of employees and contract status (CSV and XLSX)
+"""
+
+import csv
+import io
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from .common import logger
+from .config import EXPORT_CONFIG
+from .constants import DATE_FORMATS
+from .models import db
+from .queries import build_funcionario_query, latest_contract_left_join
+from .utils import format_date
+
+
+# Columns written by every export, in order
+EXPORT_COLUMNS = [
+    'id', 'nome', 'cpf', 'rg', 'cargo', 'salario', 'data_entrada',
+    'cidade', 'estado', 'contrato_id', 'contrato_status', 'contrato_data_geracao'
+]
+
+
+def _export_fields():
+    """Fields selected by the export query"""
+    return [
+        db.funcionario.id, db.funcionario.nome, db.funcionario.cpf,
+        db.funcionario.rg, db.funcionario.cargo, db.funcionario.salario,
+        db.funcionario.data_entrada, db.funcionario.cidade, db.funcionario.estado,
+        db.contrato.id, db.contrato.status, db.contrato.data_geracao
+    ]
+
+
+def _row_to_values(row) -> List[Any]:
+    """Flatten a joined funcionario/contrato row into export values"""
+    f = row.funcionario
+    c = row.contrato
+    return [
+        f.id, f.nome, f.cpf, f.rg, f.cargo,
+        float(f.salario) if f.salario is not None else None,
+        format_date(f.data_entrada, DATE_FORMATS['DISPLAY']),
+        f.cidade, f.estado,
+        c.id, c.status,
+        format_date(c.data_geracao, DATE_FORMATS['DISPLAY']),
+    ]
+
+
+def iter_export_rows(filters: Dict[str, Any]) -> Iterator[List[Any]]:
+    """
+    Iterate export rows straight from the database cursor
+
+    Uses iterselect so only one row is materialized at a time, and joins the
+    latest contract of each employee in the same query.
+
+    Args:
+        filters: Filters as returned by parse_funcionario_filters
+
+    Yields:
+        Lists of values in EXPORT_COLUMNS order
+    """
+    rows = db(build_funcionario_query(filters)).iterselect(
+        *_export_fields(),
+        left=latest_contract_left_join(),
+        orderby=db.funcionario.id
+    )
+    for row in rows:
+        yield _row_to_values(row)
+
+
+def iter_csv_chunks(filters: Dict[str, Any]) -> Iterator[bytes]:
+    """
+    Encode the export as CSV in chunks of about EXPORT_CONFIG['chunk_size'] bytes
+
+    Args:
+        filters: Filters as returned by parse_funcionario_filters
+
+    Yields:
+        UTF-8 encoded CSV chunks (the first one starts with a BOM for Excel)
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=EXPORT_CONFIG['csv_delimiter'])
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_COLUMNS)
+    for values in iter_export_rows(filters):
+        writer.writerow(values)
+        if buffer.tell() >= EXPORT_CONFIG['chunk_size']:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def stream_with_connection(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    Wrap a chunk iterator so it owns a database connection while it runs
+
+    The response body is consumed after the action returns, when the db
+    fixture has already recycled its connection, so the generator takes its
+    own connection from the pool and gives it back when done.
+
+    Args:
+        chunks: Iterator producing the response body
+
+    Yields:
+        The same chunks
+    """
+    db.get_connection_from_pool_or_new()
+    try:
+        for chunk in chunks:
+            yield chunk
+    finally:
+        db.recycle_connection_in_pool_or_close('rollback')
+
+
+def xlsx_available() -> bool:
+    """Check if the optional openpyxl dependency is installed"""
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def write_xlsx(filters: Dict[str, Any], path: str) -> int:
+    """
+    Write the export to an XLSX file using openpyxl's write-only mode
+
+    Args:
+        filters: Filters as returned by parse_funcionario_filters
+        path: Destination file path
+
+    Returns:
+        Number of data rows written
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('funcionarios')
+    sheet.append(EXPORT_COLUMNS)
+    count = 0
+    for values in iter_export_rows(filters):
+        sheet.append(values)
+        count += 1
+    workbook.save(path)
+    return count
+
+
+def iter_file_chunks(path: str, remove: bool = False) -> Iterator[bytes]:
+    """
+    Read a file in chunks, optionally deleting it at the end
+
+    Args:
+        path: File path
+        remove: Delete the file once fully read
+
+    Yields:
+        File chunks
+    """
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(EXPORT_CONFIG['chunk_size'])
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove and os.path.exists(path):
+            os.unlink(path)
+
+
+def export_filename(formato: str) -> str:
+    """Build the download filename for an export"""
+    timestamp = datetime.now().strftime(DATE_FORMATS['FILENAME'])
+    return f"funcionarios_{timestamp}.{formato}"
+
+
+def export_to_file(filters: Dict[str, Any], formato: str = 'csv',
+                   folder: Optional[str] = None) -> str:
+    """
+    Run an export to a file, for very large extracts run by the scheduler
+
+    Args:
+        filters: Filters as returned by parse_funcionario_filters
+        formato: 'csv' or 'xlsx'
+        folder: Destination folder (defaults to EXPORT_CONFIG['folder'])
+
+    Returns:
+        Path of the written file
+    """
+    folder = folder or EXPORT_CONFIG['folder']
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, export_filename(formato))
+    temp_path = path + '.part'
+    try:
+        if formato == 'xlsx':
+            write_xlsx(filters, temp_path)
+        else:
+            with open(temp_path, 'wb') as f:
+                for chunk in iter_csv_chunks(filters):
+                    f.write(chunk)
+        os.replace(temp_path, path)
+    finally:
+        # only left behind when the export failed
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+    logger.info(f'Export written: {path}')
+    return path
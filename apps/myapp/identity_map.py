@@ -0,0 +1,125 @@
+"""
+Request-scoped identity map for funcionario and contrato rows
+
+Within one request each row is loaded at most once: loaders first look in
+the map and only query the database for rows not seen yet. The joined
+loaders fetch an employee together with their contracts (or a contract
+together with its employee) in a single query and register every row.
+"""
+
+from typing import List, Optional, Tuple
+
+from py4web.core import Fixture
+
+
+class IdentityMap(Fixture):
+    """
+    Use as @action.uses(identity_map) and load rows through it:
+
+        funcionario, contratos = identity_map.funcionario_com_contratos(id)
+        contrato = identity_map.get('contrato', contrato_id)
+
+    loaders maps a tablename to a function(id) used by get() instead of
+    db[tablename](id), e.g. a cross-request row cache.
+    """
+
+    def __init__(self, db, loaders=None):
+        self.__prerequisites__ = [db]
+        self.db = db
+        self.loaders = loaders or {}
+
+    def on_request(self, context):
+        Fixture.local_initialize(self)
+        self.local.rows = {}
+        self.local.contratos_de = {}
+
+    def _remember(self, tablename, row):
+        if row is not None:
+            self.local.rows[(tablename, row.id)] = row
+        return row
+
+    def get(self, tablename: str, id: int):
+        """
+        Return the row of tablename with this id, querying only on first use
+
+        Args:
+            tablename: 'funcionario' or 'contrato' (any table works)
+            id: Row id
+
+        Returns:
+            Row or None
+        """
+        key = (tablename, int(id))
+        if key not in self.local.rows:
+            loader = self.loaders.get(tablename, self.db[tablename])
+            self.local.rows[key] = loader(id)
+        return self.local.rows[key]
+
+    def forget(self, tablename: str, id: int) -> None:
+        """Drop a row from the map, e.g. after updating it"""
+        self.local.rows.pop((tablename, int(id)), None)
+        if tablename == 'funcionario':
+            for historico in (False, True):
+                self.local.contratos_de.pop((int(id), historico), None)
+
+    def funcionario_com_contratos(self, id: int, historico: bool = False) -> Tuple[Optional[object], List]:
+        """
+        Load an employee and all their contracts (newest first) in one query
+
+        Args:
+            id: Employee id
+            historico: Also include archived contracts (joins the
+                contrato_historico view instead of contrato)
+
+        Returns:
+            (funcionario, contratos); funcionario is None if it does not exist
+        """
+        id = int(id)
+        key = (id, historico)
+        if key in self.local.contratos_de:
+            return self.get('funcionario', id), self.local.contratos_de[key]
+        db = self.db
+        table = db.contrato_historico if historico else db.contrato
+        rows = db(db.funcionario.id == id).select(
+            db.funcionario.ALL,
+            table.ALL,
+            left=table.on(table.funcionario == db.funcionario.id),
+            orderby=~table.data_geracao
+        )
+        if not rows:
+            self.local.rows[('funcionario', id)] = None
+            return None, []
+        funcionario = self._remember('funcionario', rows.first().funcionario)
+        contratos = [
+            self._remember(table._tablename, row[table._tablename])
+            for row in rows if row[table._tablename].id
+        ]
+        self.local.contratos_de[key] = contratos
+        return funcionario, contratos
+
+    def contrato_com_funcionario(self, id: int) -> Tuple[Optional[object], Optional[object]]:
+        """
+        Load a contract and its employee in one query
+
+        Args:
+            id: Contract id
+
+        Returns:
+            (contrato, funcionario); both None if the contract does not exist
+        """
+        id = int(id)
+        if ('contrato', id) in self.local.rows:
+            contrato = self.local.rows[('contrato', id)]
+            if contrato is None:
+                return None, None
+            return contrato, self.get('funcionario', contrato.funcionario)
+        db = self.db
+        row = db(db.contrato.id == id).select(
+            db.contrato.ALL,
+            db.funcionario.ALL,
+            join=db.funcionario.on(db.funcionario.id == db.contrato.funcionario)
+        ).first()
+        if not row:
+            self.local.rows[('contrato', id)] = None
+            return None, None
+        return self._remember('contrato', row.contrato), self._remember('funcionario', row.funcionario)
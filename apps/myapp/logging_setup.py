@@ -0,0 +1,196 @@
+"""
+Application logger: queued, optionally JSON, with per-logger sampling
+
+make_logger understands the settings.LOGGERS syntax of py4web's make_logger
+("severity:filename:format") and adds:
+
+- format "json": one JSON object per line (time, level, logger, message,
+  location, exception), for log shippers
+- queue: the request thread only puts the record on a bounded queue; a
+  background thread (logging.handlers.QueueListener) formats and writes
+  it. When the writer falls behind records are dropped and counted
+  instead of blocking requests
+- sampling: {logger name: fraction} keeps only that fraction of the
+  DEBUG/INFO records of the logger and its children (warnings and errors
+  are always kept), e.g. {"py4web:myapp.uploads": 0.1}
+
+Controllers log through children of the app logger
+(logger.getChild("uploads")) so they can be sampled separately, and pass
+%-style arguments so a filtered call costs a level check and nothing else.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DEFAULT_FORMAT = "%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "location": "%s:%d" % (record.filename, record.lineno),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the records below WARNING, per logger name prefix"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # longest prefix first: "app.uploads" wins over "app"
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def rate(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are dropped when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # merge the arguments now (they may change after the call) but leave
+        # the formatting to the writer thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _handlers(loggers_info: List[str]):
+    handlers = []
+    for spec in loggers_info:
+        spec += ":stderr" if spec.count(":") == 0 else ""
+        spec += ":" if spec.count(":") == 1 else ""
+        level, filename, fmt = spec.split(":", 2)
+        if filename in ("stdout", "stderr"):
+            handler = logging.StreamHandler(getattr(sys, filename))
+        else:
+            handler = logging.FileHandler(filename)
+        if fmt == "json":
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter(fmt or DEFAULT_FORMAT))
+        handler.setLevel(getattr(logging, level.upper(), logging.DEBUG))
+        handlers.append(handler)
+    return handlers
+
+
+def make_logger(
+    name: str,
+    loggers_info: List[str],
+    use_queue: bool = True,
+    queue_size: int = 10000,
+    sampling: Optional[Dict[str, float]] = None,
+) -> logging.Logger:
+    """
+    Configure the logger name from settings.LOGGERS
+
+    Args:
+        name: Logger name ("py4web:<app>")
+        loggers_info: ["severity:filename:format"], format may be "json"
+        use_queue: Write from a background thread instead of the caller's
+        queue_size: Records waiting to be written before new ones are dropped
+        sampling: {logger name: fraction of DEBUG/INFO records kept}
+
+    Returns:
+        The logger; with a queue, logger.queue_handler.dropped counts the
+        records lost to a full queue
+    """
+    root = logging.getLogger(name)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        if isinstance(handler, DroppingQueueHandler):
+            _stop(handler.listener)
+    handlers = _handlers(loggers_info)
+    # the logger's level is the lowest handler level: filtered calls stop at
+    # logger.isEnabledFor, before any record or message is built
+    root.setLevel(min([h.level for h in handlers] or [logging.CRITICAL]))
+    root.propagate = False
+    sampler = SamplingFilter(sampling) if sampling else None
+
+    if not use_queue:
+        for handler in handlers:
+            if sampler:
+                handler.addFilter(sampler)
+            root.addHandler(handler)
+        return root
+
+    handler = DroppingQueueHandler(queue.Queue(queue_size))
+    if sampler:
+        handler.addFilter(sampler)
+    handler.listener = logging.handlers.QueueListener(handler.queue, *handlers, respect_handler_level=True)
+    handler.listener.start()
+    atexit.register(_stop, handler.listener)
+    # a forked worker (gunicorn preload, process pools) gets the queue but
+    # not the writer thread: the writer is stopped before the fork, so no
+    # stream lock is held mid-write, and started again on both sides
+    state = {}
+    os.register_at_fork(
+        before=lambda: state.update(running=_stop(handler.listener)),
+        after_in_parent=lambda: state.get('running') and handler.listener.start(),
+        after_in_child=lambda: state.get('running') and _restart(handler, queue_size),
+    )
+    root.addHandler(handler)
+    root.queue_handler = handler
+    return root
+
+
+def _stop(listener) -> bool:
+    """Write what is queued and end the writer thread; False if not running"""
+    if listener._thread is None:
+        return False
+    listener.queue.put(listener._sentinel)
+    listener._thread.join()
+    listener._thread = None
+    return True
+
+
+def _restart(handler, queue_size):
+    # the parent keeps its queue; a fresh one has a fresh lock
+    handler.queue = handler.listener.queue = queue.Queue(queue_size)
+    handler.listener.start()
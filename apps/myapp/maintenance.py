@@ -0,0 +1,255 @@
+"""
+Scheduled maintenance jobs
+
+- sweep_temp_html: HTML files left in MAINTENANCE_CONFIG['temp_folder'] by
+  renders that crashed before their cleanup ran
+- clean_orphaned_uploads: files in the upload folder referenced by no
+  contrato/contrato_arquivo row are moved to a quarantine folder, and purged
+  from there after orphan_retention_days
+- optimize_database: ANALYZE, incremental vacuum and WAL checkpoint (SQLite)
+- refresh_summaries: rebuild db.funcionario_resumo from scratch
+
+Every job runs through run_job, which holds a portalocker lock file so only
+one worker (or process) runs a given job at a time, and records run-time
+metrics in a JSON file next to the lock. tasks.py registers the jobs with
+the scheduler using MAINTENANCE_CONFIG['jobs']; run one by hand with:
+
+    py4web call apps myapp.maintenance.run_all
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict
+
+import portalocker
+
+from . import settings
+from .common import db, logger
+from .config import MAINTENANCE_CONFIG
+from .summaries import rebuild_summaries
+from .utils import ensure_directory_exists
+
+
+def _metrics_path(name: str) -> str:
+    return os.path.join(MAINTENANCE_CONFIG['lock_folder'], f'{name}.json')
+
+
+def _read_metrics(name: str) -> Dict[str, Any]:
+    try:
+        with open(_metrics_path(name)) as stream:
+            return json.load(stream)
+    except (OSError, ValueError):
+        return {'runs': 0, 'failures': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+
+
+def _write_metrics(name: str, metrics: Dict[str, Any]) -> None:
+    path = _metrics_path(name)
+    with open(path + '.tmp', 'w') as stream:
+        json.dump(metrics, stream, default=str)
+    os.replace(path + '.tmp', path)
+
+
+def run_job(name: str, function: Callable, **inputs) -> Dict[str, Any]:
+    """
+    Run a job unless another worker is running it, recording its metrics
+
+    Args:
+        name: Job name (lock and metrics file name)
+        function: The job, called with inputs
+
+    Returns:
+        The job result, or {'skipped': True} if the job was already running
+    """
+    ensure_directory_exists(MAINTENANCE_CONFIG['lock_folder'])
+    lock = portalocker.Lock(
+        os.path.join(MAINTENANCE_CONFIG['lock_folder'], f'{name}.lock'),
+        timeout=0, fail_when_locked=True
+    )
+    try:
+        lock.acquire()
+    except portalocker.exceptions.LockException:
+        logger.info(f'Maintenance job {name} already running elsewhere, skipped')
+        return {'skipped': True}
+    try:
+        metrics = _read_metrics(name)
+        started = time.time()
+        metrics['runs'] += 1
+        metrics['last_started'] = datetime.now().isoformat(timespec='seconds')
+        try:
+            result = function(**inputs)
+        except Exception as e:
+            db.rollback()
+            metrics['failures'] += 1
+            metrics['last_error'] = str(e)
+            logger.error(f'Maintenance job {name} failed: {e}')
+            raise
+        else:
+            metrics['last_result'] = result
+            metrics['last_error'] = None
+        finally:
+            elapsed = time.time() - started
+            metrics['last_seconds'] = round(elapsed, 3)
+            metrics['total_seconds'] = round(metrics['total_seconds'] + elapsed, 3)
+            metrics['max_seconds'] = round(max(metrics['max_seconds'], elapsed), 3)
+            _write_metrics(name, metrics)
+        logger.info(f'Maintenance job {name} finished in {elapsed:.2f}s: {result}')
+        return result
+    finally:
+        lock.release()
+
+
+def sweep_temp_html(max_age: int = None) -> Dict[str, int]:
+    """
+    Remove render temp files older than max_age seconds
+
+    Args:
+        max_age: Override MAINTENANCE_CONFIG['temp_max_age']
+
+    Returns:
+        {'removed': files, 'bytes': freed}
+    """
+    folder = MAINTENANCE_CONFIG['temp_folder']
+    prefix = MAINTENANCE_CONFIG['temp_prefix']
+    cutoff = time.time() - (max_age if max_age is not None else MAINTENANCE_CONFIG['temp_max_age'])
+    removed = freed = 0
+    if not os.path.isdir(folder):
+        return {'removed': 0, 'bytes': 0}
+    for entry in os.scandir(folder):
+        if not (entry.is_file() and entry.name.startswith(prefix) and entry.name.endswith('.html')):
+            continue
+        try:
+            stat = entry.stat()
+            if stat.st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+                freed += stat.st_size
+        except FileNotFoundError:
+            # finished (and cleaned up) meanwhile
+            continue
+    return {'removed': removed, 'bytes': freed}
+
+
+def _referenced_files() -> set:
+    referenced = set()
+    for table in (db.contrato, db.contrato_arquivo):
+        for row in db(table.id > 0).select(table.arquivo, table.arquivo_assinado, cacheable=True):
+            referenced.update(name for name in (row.arquivo, row.arquivo_assinado) if name)
+    return referenced
+
+
+def clean_orphaned_uploads(grace: int = None, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Quarantine uploads no contract refers to, purge old quarantined files
+
+    Files younger than the grace period are left alone: a contract file is
+    written before its row is committed.
+
+    Args:
+        grace: Override MAINTENANCE_CONFIG['orphan_grace'] (seconds)
+        dry_run: Only count
+
+    Returns:
+        {'quarantined': files, 'purged': files, 'bytes': size quarantined}
+    """
+    cutoff = time.time() - (grace if grace is not None else MAINTENANCE_CONFIG['orphan_grace'])
+    quarantine = MAINTENANCE_CONFIG['orphan_folder']
+    referenced = _referenced_files()
+    db.rollback()
+    quarantined = purged = size = 0
+    if not dry_run:
+        ensure_directory_exists(quarantine)
+    for entry in os.scandir(settings.UPLOAD_FOLDER):
+        if not entry.is_file() or entry.name in referenced:
+            continue
+        try:
+            stat = entry.stat()
+            if stat.st_mtime >= cutoff:
+                continue
+            quarantined += 1
+            size += stat.st_size
+            if not dry_run:
+                target = os.path.join(quarantine, entry.name)
+                os.replace(entry.path, target)
+                # retention counts from the quarantine date
+                os.utime(target)
+        except FileNotFoundError:
+            continue
+
+    purge_before = time.time() - MAINTENANCE_CONFIG['orphan_retention_days'] * 86400
+    if os.path.isdir(quarantine):
+        for entry in os.scandir(quarantine):
+            if entry.is_file() and entry.stat().st_mtime < purge_before:
+                purged += 1
+                if not dry_run:
+                    os.unlink(entry.path)
+    return {'quarantined': quarantined, 'purged': purged, 'bytes': size}
+
+
+def optimize_database(pages: int = None) -> Dict[str, Any]:
+    """
+    ANALYZE, incremental vacuum and WAL checkpoint of the SQLite database
+
+    Incremental vacuum only frees pages when the database was created (or
+    converted with enable_incremental_vacuum) with auto_vacuum=INCREMENTAL.
+
+    Args:
+        pages: Override MAINTENANCE_CONFIG['vacuum_pages']
+
+    Returns:
+        Free pages before/after and the auto_vacuum mode
+    """
+    if not settings.DB_URI.startswith('sqlite'):
+        return {'skipped': 'not sqlite'}
+    db.commit()
+    db.executesql('ANALYZE;')
+    auto_vacuum = db.executesql('PRAGMA auto_vacuum;')[0][0]
+    free_before = db.executesql('PRAGMA freelist_count;')[0][0]
+    if auto_vacuum == 2:
+        pages = pages or MAINTENANCE_CONFIG['vacuum_pages']
+        db.executesql(f'PRAGMA incremental_vacuum({int(pages)});')
+    free_after = db.executesql('PRAGMA freelist_count;')[0][0]
+    db.commit()
+    db.executesql('PRAGMA wal_checkpoint(TRUNCATE);')
+    return {
+        'auto_vacuum': {0: 'none', 1: 'full', 2: 'incremental'}.get(auto_vacuum, auto_vacuum),
+        'free_pages_before': free_before,
+        'free_pages_after': free_after,
+    }
+
+
+def enable_incremental_vacuum() -> None:
+    """
+    Switch the SQLite database to auto_vacuum=INCREMENTAL (one-off, runs a
+    full VACUUM that locks the database; do it in a maintenance window):
+
+        py4web call apps myapp.maintenance.enable_incremental_vacuum
+    """
+    db.commit()
+    db.executesql('PRAGMA auto_vacuum=INCREMENTAL;')
+    db.executesql('VACUUM;')
+    logger.info('SQLite auto_vacuum set to INCREMENTAL')
+
+
+def refresh_summaries() -> Dict[str, int]:
+    """Rebuild db.funcionario_resumo (repairs any drift of the incremental updates)"""
+    return {'summaries': rebuild_summaries()}
+
+
+JOBS = {
+    'limpar_html_temporario': sweep_temp_html,
+    'limpar_uploads_orfaos': clean_orphaned_uploads,
+    'otimizar_banco': optimize_database,
+    'atualizar_resumos': refresh_summaries,
+}
+
+
+def run_all() -> Dict[str, Any]:
+    """Run every job once (outside the scheduler)"""
+    return {name: run_job(name, function) for name, function in JOBS.items()}
+
+
+def stats() -> Dict[str, Any]:
+    """Metrics of every job, as recorded by the last runs of any worker"""
+    return {name: _read_metrics(name) for name in JOBS}
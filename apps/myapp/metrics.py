@@ -0,0 +1,285 @@
+"""
+Prometheus metrics aggregated across worker processes
+
+Recording is cheap and lock-free: every thread increments counters and
+histogram buckets in its own dict (a shard), the shards are only read when
+a snapshot is taken. Each process writes its snapshot to
+METRICS_CONFIG['folder']/<pid>.json at most every flush_interval seconds
+(at the end of a request); the process answering /metrics merges the files
+of all live workers, and folds the files of exited workers into
+retired.json so their counters do not go backwards.
+
+    metrics.declare('pdf_render_seconds', 'histogram', 'wkhtmltopdf render time')
+    metrics.observe('pdf_render_seconds', 1.2)
+    metrics.inc('upload_bytes_total', 52311, kind='assinado')
+
+Collectors (functions returning [(name, labels, value)] of declared
+metrics) export the stats() of caches and limiters at flush time.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+import portalocker
+from py4web import request, response
+from py4web.core import Fixture
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def route_rule() -> str:
+    """
+    Route rule of the current request ("/myapp/download/<filename>"), or
+    its path when unrouted: one label per action however many contracts
+    are downloaded
+    """
+    route = getattr(request, 'route', None)
+    return getattr(getattr(route, 'route', None), 'rule', None) or request.path
+
+
+class Metrics:
+    """Counters, gauges and histograms; see module docstring"""
+
+    def __init__(self, folder, flush_interval=5.0, namespace='contrato_rh'):
+        self.folder = folder
+        self.flush_interval = flush_interval
+        self.namespace = namespace
+        self.types = {}  # name -> (type, help, buckets)
+        self.collectors: List[Callable] = []
+        self.reset()
+        # a forked process (gunicorn preload, process pools) must not export
+        # the parent's counters again under its own pid
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        """Forget everything recorded by this process"""
+        self._local = threading.local()
+        self._shards = []
+        # only taken to register a new thread and to list the shards
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def declare(self, name, kind, help, buckets=DEFAULT_BUCKETS):
+        """Register a metric: kind is 'counter', 'gauge' or 'histogram'"""
+        self.types[name] = (kind, help, tuple(buckets) if kind == 'histogram' else None)
+
+    def _shard(self) -> Dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def inc(self, name, value=1, **labels):
+        """Add value to a counter"""
+        shard = self._shard()
+        key = (name, tuple(sorted(labels.items())))
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record value in a histogram"""
+        shard = self._shard()
+        key = (name, tuple(sorted(labels.items())))
+        buckets = self.types[name][2]
+        counts = shard.get(key)
+        if counts is None:
+            # one slot per bucket, +Inf, then sum and count
+            counts = shard[key] = [0] * (len(buckets) + 3)
+        counts[bisect.bisect_left(buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def snapshot(self) -> List[Tuple[str, dict, object]]:
+        """Samples of this process: the shards merged, then the collectors"""
+        merged = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # copying a dict is atomic under the GIL
+            for key, value in dict(shard).items():
+                if isinstance(value, list):
+                    current = merged.get(key)
+                    merged[key] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+                else:
+                    merged[key] = merged.get(key, 0) + value
+        samples = [(name, dict(labels), value) for (name, labels), value in merged.items()]
+        for collector in self.collectors:
+            try:
+                samples.extend(collector())
+            except Exception:
+                # a failing collector must not break the request or the scrape
+                continue
+        return samples
+
+    def _path(self, pid) -> str:
+        return os.path.join(self.folder, '%s.json' % pid)
+
+    def flush(self):
+        """Write this process's snapshot file"""
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(os.getpid())
+        # unique temp name: the scrape and a request may flush at once
+        tmp = '%s.%s.tmp' % (path, threading.get_ident())
+        with open(tmp, 'w') as f:
+            json.dump({'time': time.time(), 'samples': self.snapshot()}, f)
+        os.replace(tmp, path)
+        self._last_flush = time.time()
+
+    def maybe_flush(self):
+        """flush() unless done recently or another thread is doing it"""
+        if time.time() - self._last_flush < self.flush_interval:
+            return
+        if self._flush_lock.acquire(blocking=False):
+            try:
+                self.flush()
+            finally:
+                self._flush_lock.release()
+
+    def _retire(self, files):
+        """Fold the snapshots of exited processes into retired.json"""
+        retired_path = os.path.join(self.folder, 'retired.json')
+        with portalocker.Lock(os.path.join(self.folder, 'retired.lock'), timeout=10):
+            retired = self._read(retired_path) or []
+            for path in files:
+                samples = self._read(path)
+                if samples is None:
+                    continue
+                # gauges describe a process that no longer exists
+                retired.extend(s for s in samples if self.types.get(s[0], ('gauge',))[0] != 'gauge')
+                retired = self._merge(retired)
+                os.unlink(path)
+            with open(retired_path + '.tmp', 'w') as f:
+                json.dump({'time': time.time(), 'samples': retired}, f)
+            os.replace(retired_path + '.tmp', retired_path)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)['samples']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @staticmethod
+    def _alive(pid) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    @staticmethod
+    def _merge(samples) -> List:
+        merged = {}
+        for name, labels, value in samples:
+            key = (name, tuple(sorted(labels.items())))
+            current = merged.get(key)
+            if current is None:
+                merged[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = current + value
+        return [(name, dict(labels), value) for (name, labels), value in merged.items()]
+
+    def collect(self) -> List:
+        """Samples of all workers on the host (this one flushed first)"""
+        self.flush()
+        samples, dead = [], []
+        for entry in os.listdir(self.folder):
+            stem, ext = os.path.splitext(entry)
+            if ext != '.json' or not stem.isdigit():
+                continue
+            path = os.path.join(self.folder, entry)
+            if not self._alive(int(stem)):
+                dead.append(path)
+                continue
+            samples.extend(self._read(path) or [])
+        if dead:
+            self._retire(dead)
+        samples.extend(self._read(os.path.join(self.folder, 'retired.json')) or [])
+        return self._merge(samples)
+
+    def exposition(self) -> str:
+        """All workers' metrics in the Prometheus text format (version 0.0.4)"""
+        by_name = {}
+        for name, labels, value in self.collect():
+            if name in self.types:
+                by_name.setdefault(name, []).append((labels, value))
+        lines = []
+        for name in sorted(by_name):
+            kind, help, buckets = self.types[name]
+            full = '%s_%s' % (self.namespace, name)
+            lines.append('# HELP %s %s' % (full, help))
+            lines.append('# TYPE %s %s' % (full, kind))
+            for labels, value in sorted(by_name[name], key=lambda s: sorted(s[0].items())):
+                if kind == 'histogram':
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), value[:-2]):
+                        cumulative += count
+                        lines.append('%s_bucket%s %s' % (full, self._labels(labels, le=bound), cumulative))
+                    lines.append('%s_sum%s %s' % (full, self._labels(labels), value[-2]))
+                    lines.append('%s_count%s %s' % (full, self._labels(labels), value[-1]))
+                else:
+                    lines.append('%s%s %s' % (full, self._labels(labels), value))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _labels(labels, **extra) -> str:
+        items = sorted(labels.items()) + list(extra.items())
+        if not items:
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (k, _escape(v)) for k, v in items)
+
+
+class RequestMetrics(Fixture):
+    """Request count and latency per action; use globally with attach_to(db)"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        metrics.declare('http_requests_total', 'counter', 'Requests by action, method and status')
+        metrics.declare('http_request_duration_seconds', 'histogram', 'Request latency by action')
+
+    def attach_to(self, db):
+        """
+        Time every action that uses db (directly or through auth)
+
+        py4web has no hook around all actions, so this rides on db's
+        prerequisites: actions without db (uploads/<filename>,
+        assets/<name>, /metrics itself, py4web's static files) are not
+        counted.
+        """
+        db.__prerequisites__ = list(getattr(db, '__prerequisites__', ())) + [self]
+
+    def on_request(self, context):
+        Fixture.local_initialize(self)
+        self.local.started = time.time()
+
+    def on_success(self, context):
+        # context['status'] only changes when the action raised HTTP
+        # (redirects); a status set with response.status is on the response
+        status = context.get('status') or 200
+        self._record(response.status_code if status == 200 else status)
+
+    def on_error(self, context):
+        self._record(getattr(context.get('exception'), 'status_code', 500))
+
+    def _record(self, status):
+        action = route_rule()
+        elapsed = time.time() - self.local.started
+        self.metrics.inc('http_requests_total', action=action, method=request.method, status=status)
+        self.metrics.observe('http_request_duration_seconds', elapsed, action=action)
+        self.metrics.maybe_flush()
@@ -0,0 +1,103 @@
+"""
+Versioned schema steps (indexes and other raw DDL) for the RH Contract application
+
+Table definitions are migrated by pydal itself. Everything pydal does not
+manage (indexes, pragmas, raw DDL) is listed in SCHEMA_STEPS and applied
+exactly once, recording each applied version in db.schema_migration.
+
+Apply pending steps explicitly with:
+
+    py4web call apps myapp.migrations.apply_pending
+"""
+
+import os
+from datetime import datetime
+from typing import List, Tuple
+
+import portalocker
+
+from . import settings
+from .common import logger
+from .constants import ARCHIVE_SCHEMA, DATABASE_INDEXES, GENERATION_SCHEMA
+from .models import db
+from .summaries import rebuild_summaries
+
+# (version, name, statements) - append new steps, never edit applied ones.
+# A statement is either raw SQL or a callable for data backfills.
+SCHEMA_STEPS: List[Tuple[int, str, list]] = [
+    (1, 'initial_indexes', DATABASE_INDEXES),
+    (2, 'funcionario_resumo_backfill', [rebuild_summaries]),
+    (3, 'contrato_arquivo_indexes_and_view', ARCHIVE_SCHEMA),
+    (4, 'contrato_generation_dedup_indexes', GENERATION_SCHEMA),
+]
+
+LOCK_FILE = os.path.join(settings.DB_FOLDER, 'schema_migration.lock')
+
+
+def applied_versions() -> set:
+    """Return the set of schema step versions already applied"""
+    rows = db(db.schema_migration).select(db.schema_migration.version)
+    return {row.version for row in rows}
+
+
+def pending_steps() -> List[Tuple[int, str, list]]:
+    """Return the schema steps not applied yet, in version order"""
+    applied = applied_versions()
+    return [step for step in sorted(SCHEMA_STEPS, key=lambda step: step[0]) if step[0] not in applied]
+
+
+def _apply_locked() -> List[int]:
+    """Apply pending steps; caller must hold the migration lock"""
+    done = []
+    # re-read under the lock, another process may have applied them already
+    for version, name, statements in pending_steps():
+        logger.info(f'Applying schema step {version}: {name}')
+        try:
+            for statement in statements:
+                if callable(statement):
+                    statement()
+                else:
+                    db.executesql(statement)
+            db.schema_migration.insert(version=version, name=name, applied_on=datetime.now())
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f'Schema step {version} ({name}) failed: {e}')
+            raise
+        done.append(version)
+    return done
+
+
+def apply_pending(timeout: float = 60) -> List[int]:
+    """
+    Apply all pending schema steps, waiting for the migration lock
+
+    Args:
+        timeout: Seconds to wait for another process holding the lock
+
+    Returns:
+        Versions applied by this call
+    """
+    with portalocker.Lock(LOCK_FILE, timeout=timeout):
+        return _apply_locked()
+
+
+def ensure_schema() -> List[int]:
+    """
+    Startup hook: apply pending steps only if this process gets the lock
+
+    When the schema is up to date this is a single read. When steps are
+    pending, the first worker to grab the lock applies them and the others
+    continue without waiting or writing.
+
+    Returns:
+        Versions applied by this call
+    """
+    if not pending_steps():
+        return []
+    try:
+        with portalocker.Lock(LOCK_FILE, timeout=0, fail_when_locked=True):
+            return _apply_locked()
+    except portalocker.exceptions.LockException:
+        logger.info('Schema steps are being applied by another process')
+        return []
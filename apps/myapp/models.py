@@ -7,10 +7,11 @@ from datetime import datetime
 from . import settings
 from .constants import (
     BRAZILIAN_STATES, MARITAL_STATUS, GENDER_OPTIONS, VALIDATION_PATTERNS,
-    VALIDATION_RANGES, FIELD_LENGTHS, DATABASE_INDEXES, CONTRACT_STATUS
+    VALIDATION_RANGES, FIELD_LENGTHS, CONTRACT_STATUS
 )
 
-from .common import Field, db
+from .common import Field, db, funcionario_cache, table_versions
+from . import summaries
 
 ### Define your table below
 #
@@ -77,6 +78,11 @@ db.define_table(
     format='%(nome)s'
 )
 
+# Invalida o cache de linhas (caching.py) em updates/deletes de funcionário
+funcionario_cache.attach()
+# Versão de escrita usada como chave do cache de respostas (response_cache.py)
+table_versions.attach(db.funcionario)
+
 # Tabela de contratos gerados para funcionários
 db.define_table(
     'contrato',
@@ -90,6 +96,10 @@ db.define_table(
     Field('arquivo_assinado', 'upload'),  # Arquivo do contrato assinado
     Field('data_assinatura', 'datetime'),  # Data da assinatura
     
+    # Deduplicação da geração
+    Field('chave_idempotencia', 'string', length=64, writable=False),  # enviada pelo cliente
+    Field('versao_render', 'string', length=40, writable=False),  # funcionário + template + empresa
+    
     # Campos de auditoria
     Field('created_on', 'datetime', default=datetime.now, writable=False),
     Field('updated_on', 'datetime', default=datetime.now, update=datetime.now, writable=False),
@@ -105,8 +115,64 @@ db.contrato.arquivo_assinado.upload_path = settings.UPLOAD_FOLDER
 db.contrato.arquivo.download_url = lambda filename: URL('uploads/%s' % filename)
 db.contrato.arquivo_assinado.download_url = lambda filename: URL('uploads/%s' % filename)
 
-# Criar índices para melhor performance
-for index_sql in DATABASE_INDEXES:
-    db.executesql(index_sql)
+# Arquivo (partição fria) de contratos assinados antigos, mesmo formato de
+# db.contrato e mesmo id do contrato original, ver archive.py
+db.define_table(
+    'contrato_arquivo',
+    Field('funcionario', 'reference funcionario', required=True),
+    Field('arquivo', 'upload', required=True),
+    Field('status', 'string', required=True, default=CONTRACT_STATUS['ASSINADO']),
+    Field('data_geracao', 'datetime'),
+    Field('arquivo_assinado', 'upload'),
+    Field('data_assinatura', 'datetime'),
+    Field('created_on', 'datetime'),
+    Field('updated_on', 'datetime'),
+    Field('arquivado_em', 'datetime', default=datetime.now),
+    format='%(arquivo)s'
+)
+
+db.contrato_arquivo.arquivo.upload_path = settings.UPLOAD_FOLDER
+db.contrato_arquivo.arquivo_assinado.upload_path = settings.UPLOAD_FOLDER
+
+# Visão unificada (contrato UNION ALL contrato_arquivo), somente leitura;
+# a view é criada por um passo de schema em migrations.py
+db.define_table(
+    'contrato_historico',
+    Field('funcionario', 'integer'),
+    Field('arquivo', 'string'),
+    Field('status', 'string'),
+    Field('data_geracao', 'datetime'),
+    Field('arquivo_assinado', 'string'),
+    Field('data_assinatura', 'datetime'),
+    Field('created_on', 'datetime'),
+    Field('updated_on', 'datetime'),
+    Field('arquivado_em', 'datetime'),
+    migrate=False
+)
+
+# Resumo de contratos por funcionário, mantido pelos callbacks de db.contrato
+db.define_table(
+    'funcionario_resumo',
+    Field('funcionario', 'reference funcionario', required=True, unique=True),
+    Field('contratos_pendentes', 'integer', default=0),
+    Field('contratos_assinados', 'integer', default=0),
+    Field('ultima_geracao', 'datetime'),
+    Field('ultima_assinatura', 'datetime'),
+    Field('updated_on', 'datetime', default=datetime.now, update=datetime.now),
+)
+
+db.contrato._after_insert.append(summaries.on_contract_insert)
+db.contrato._before_update.append(summaries.on_contract_before_change)
+db.contrato._after_update.append(summaries.on_contract_update)
+db.contrato._before_delete.append(summaries.on_contract_before_change)
+db.contrato._after_delete.append(summaries.on_contract_delete)
+
+# Passos de schema aplicados (índices e DDL manual), ver migrations.py
+db.define_table(
+    'schema_migration',
+    Field('version', 'integer', required=True, unique=True),
+    Field('name', 'string', required=True),
+    Field('applied_on', 'datetime', default=datetime.now),
+)
 
 db.commit()
@@ -0,0 +1,113 @@
+"""
+Per-user full-page cache for pages whose HTML depends only on the user
+
+PageCache is a py4web fixture placed before the template in action.uses:
+
+    @action('index')
+    @action.uses(cached_page('index.html'), 'index.html', auth.user)
+
+It stores the rendered HTML keyed by path, user, Accept-Language, the
+modification time of the template, its layouts and other dependencies
+(e.g. the static asset manifest), a stamp of the deployed
+code and the write versions of the given tables (auth_user by default, for
+the name/email shown in the layout). Responses carry an ETag and
+Cache-Control; a matching If-None-Match gets a 304. Requests carrying a
+flash message are never cached nor served from the cache.
+"""
+
+import glob
+import hashlib
+import os
+import threading
+
+from py4web import HTTP, request, response
+from py4web.core import Fixture
+
+
+def deploy_stamp(app_folder):
+    """Latest modification time of the app's Python code, changes on deploy"""
+    paths = glob.glob(os.path.join(app_folder, '*.py'))
+    paths += glob.glob(os.path.join(app_folder, 'controllers', '*.py'))
+    return max((os.path.getmtime(path) for path in paths), default=0)
+
+
+class PageCache(Fixture):
+    """Serves a rendered page from the cache, see module docstring"""
+
+    def __init__(self, store, auth, template, template_folder, layouts=('layout.html',),
+                 table_versions=None, tablenames=('auth_user',), dependencies=(), stamp=0,
+                 expiration=None, cache_control='private, no-cache', enabled=True):
+        # login is enforced before a cached page can be served
+        self.__prerequisites__ = [auth.user]
+        self.store = store
+        self.auth = auth
+        self.paths = [os.path.join(template_folder, name) for name in (template,) + tuple(layouts)]
+        self.paths += list(dependencies)
+        self.table_versions = table_versions
+        self.tablenames = list(tablenames) if table_versions else []
+        self.stamp = stamp
+        self.expiration = expiration
+        self.cache_control = cache_control
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.not_modified = 0
+
+    def _template_mtime(self):
+        return max((os.path.getmtime(path) for path in self.paths if os.path.exists(path)), default=0)
+
+    def _key(self):
+        versions = self.table_versions.current(self.tablenames) if self.tablenames else ()
+        return (
+            'page', request.path, request.query_string, self.auth.user_id,
+            request.headers.get('Accept-Language', ''), self._template_mtime(),
+            self.stamp, versions,
+        )
+
+    def _count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _headers(self, etag):
+        return {'ETag': etag, 'Cache-Control': self.cache_control}
+
+    def on_request(self, context):
+        Fixture.local_initialize(self)
+        self.local.key = None
+        if not self.enabled or request.method != 'GET' or request.get_cookie('py4web-flash'):
+            return
+        self.local.key = self._key()
+        cached = self.store.get(self.local.key)
+        if cached is None:
+            self._count('misses')
+            return
+        body, etag = cached
+        headers = self._headers(etag)
+        if request.headers.get('If-None-Match') == etag:
+            self._count('not_modified')
+            raise HTTP(304, '', headers)
+        self._count('hits')
+        headers.update({'Content-Type': 'text/html; charset=utf-8', 'X-Cache': 'HIT'})
+        raise HTTP(200, body, headers)
+
+    def on_success(self, context):
+        if self.local.key is None:
+            return
+        output = context.get('output')
+        if not isinstance(output, str) or response.status_code != 200:
+            return
+        etag = '"%s"' % hashlib.sha1(output.encode('utf-8')).hexdigest()[:20]
+        self.store.set(self.local.key, (output, etag), self.expiration)
+        response.headers.update(self._headers(etag))
+        response.headers['X-Cache'] = 'MISS'
+
+    def stats(self):
+        """Hit/miss counters of this fixture"""
+        with self.lock:
+            lookups = self.hits + self.not_modified + self.misses
+            return {
+                'paths': self.paths[:1],
+                'hits': self.hits,
+                'not_modified': self.not_modified,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.not_modified) / lookups, 4) if lookups else None,
+            }
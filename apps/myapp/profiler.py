@@ -0,0 +1,283 @@
+"""
+On-demand profiling of individual actions
+
+The Profiler fixture is installed on every action (attach_to(db), like
+RequestMetrics) but does nothing until switched on: it reads
+PROFILER_CONFIG['folder']/switch.json (at most every check_interval
+seconds, so every worker picks a change up without a redeploy)
+
+    {"actions": ["gerar_contrato", "funcionario/*"], "percent": 5,
+     "mode": "cprofile", "until": 1760000000}
+
+and profiles the requests of the matching actions (route rule without the
+app prefix, shell-style patterns) plus percent% of all the others, until
+the given time. mode is "cprofile" (deterministic, every call, slower) or
+"sample" (the request thread's stack is sampled every sample_interval
+seconds, cheap enough for production).
+
+Each profiled request leaves a JSON report next to switch.json with a
+top-functions summary; _dashboard lists them next to the tickets and
+switches the profiler on and off through enable()/disable(), the same
+functions as the command line:
+
+    py4web call apps myapp.profiler.enable --args '{"actions": ["gerar_contrato"], "minutes": 10}'
+    py4web call apps myapp.profiler.disable
+"""
+
+import cProfile
+import fnmatch
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List
+
+from py4web import request
+from py4web.core import Fixture
+
+from .config import PROFILER_CONFIG
+from .metrics import route_rule
+
+SWITCH_FILE = 'switch.json'
+MODES = ('cprofile', 'sample')
+
+
+def _switch_path() -> str:
+    return os.path.join(PROFILER_CONFIG['folder'], SWITCH_FILE)
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = '%s.%s.tmp' % (path, uuid.uuid4().hex[:8])
+    with open(tmp, 'w') as stream:
+        json.dump(data, stream)
+    os.replace(tmp, path)
+
+
+def enable(actions: List[str] = None, percent: float = 0, mode: str = 'sample', minutes: float = 30) -> Dict[str, Any]:
+    """
+    Switch the profiler on for every worker
+
+    Args:
+        actions: Action patterns ("gerar_contrato", "funcionario/*")
+        percent: Share of all the other requests to profile (0-100)
+        mode: 'cprofile' or 'sample'
+        minutes: Switch off by itself after this long
+
+    Returns:
+        The switch as written
+    """
+    if mode not in MODES:
+        raise ValueError('mode must be one of %s' % ', '.join(MODES))
+    switch = {
+        'actions': list(actions or []),
+        'percent': float(percent),
+        'mode': mode,
+        'until': time.time() + minutes * 60,
+    }
+    _write_json(_switch_path(), switch)
+    return switch
+
+
+def disable() -> None:
+    """Switch the profiler off"""
+    try:
+        os.unlink(_switch_path())
+    except FileNotFoundError:
+        pass
+
+
+class _StackSampler(threading.Thread):
+    """Samples the stack of one thread until stopped"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def _label(function) -> str:
+    filename, line, name = function
+    return '%s:%d(%s)' % (filename, line, name)
+
+
+def _cprofile_report(profile, top):
+    stats = pstats.Stats(profile)
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    summary = [
+        {'function': _label(function), 'calls': calls, 'self': round(tottime, 6), 'total': round(cumtime, 6)}
+        for function, (_, calls, tottime, cumtime, _) in functions
+    ]
+    text = io.StringIO()
+    stats.stream = text
+    stats.sort_stats('cumulative').print_stats(top * 2)
+    return summary, text.getvalue()
+
+
+def _sample_report(sampler, top, duration):
+    # samples are taken less often than asked when the request holds the
+    # GIL: times are each function's share of the samples, of the duration
+    scale = duration / max(1, sum(sampler.stacks.values()))
+    own, inclusive = Counter(), Counter()
+    for stack, count in sampler.stacks.items():
+        own[stack[-1]] += count
+        # a recursive function counts once per sample
+        for function in set(stack):
+            inclusive[function] += count
+    summary = [
+        {
+            'function': _label(function),
+            'calls': count,  # samples with the function on top of the stack
+            'self': round(count * scale, 6),
+            'total': round(inclusive[function] * scale, 6),
+        }
+        for function, count in own.most_common(top)
+    ]
+    # collapsed stacks, the input format of flame graph tools
+    text = '\n'.join(
+        '%s %d' % (';'.join('%s (%s:%d)' % (f[2], os.path.basename(f[0]), f[1]) for f in stack), count)
+        for stack, count in sampler.stacks.most_common()
+    )
+    return summary, text
+
+
+class Profiler(Fixture):
+    """Profiles the requests selected by switch.json, see module docstring"""
+
+    def __init__(self):
+        self._switch = None
+        self._switch_mtime = None
+        self._checked = 0.0
+
+    def attach_to(self, db):
+        """Profile every action that uses db (directly or through auth)"""
+        db.__prerequisites__ = list(getattr(db, '__prerequisites__', ())) + [self]
+
+    def switch(self):
+        """The current switch, None when off (re-read every check_interval)"""
+        now = time.time()
+        if now - self._checked >= PROFILER_CONFIG['check_interval']:
+            self._checked = now
+            try:
+                mtime = os.stat(_switch_path()).st_mtime
+                if mtime != self._switch_mtime:
+                    with open(_switch_path()) as stream:
+                        self._switch = json.load(stream)
+                    self._switch_mtime = mtime
+            except (OSError, ValueError):
+                self._switch = self._switch_mtime = None
+        switch = self._switch
+        if not switch or switch.get('until', 0) < now:
+            return None
+        return switch
+
+    def _selected(self, switch, action) -> bool:
+        if any(fnmatch.fnmatchcase(action, pattern) for pattern in switch.get('actions', ())):
+            return True
+        percent = switch.get('percent', 0)
+        return percent > 0 and random.random() * 100 < percent
+
+    def on_request(self, context):
+        Fixture.local_initialize(self)
+        self.local.profile = self.local.sampler = None
+        switch = self.switch()
+        if switch is None:
+            return
+        # "/myapp/funcionario/<id:int>/contratos" -> "funcionario/<id:int>/contratos"
+        action = route_rule().lstrip('/').partition('/')[2]
+        if not self._selected(switch, action):
+            return
+        self.local.action = action
+        self.local.mode = switch.get('mode', 'sample')
+        self.local.started = time.time()
+        if self.local.mode == 'cprofile':
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # another profiler is active in this interpreter
+                return
+            self.local.profile = profile
+        else:
+            sampler = _StackSampler(threading.get_ident(), PROFILER_CONFIG['sample_interval'])
+            sampler.start()
+            self.local.sampler = sampler
+
+    def on_success(self, context):
+        self._finish(context.get('status') or 200)
+
+    def on_error(self, context):
+        self._finish(getattr(context.get('exception'), 'status_code', 500))
+
+    def _finish(self, status):
+        profile, sampler = self.local.profile, self.local.sampler
+        if profile is None and sampler is None:
+            return
+        duration = time.time() - self.local.started
+        top = PROFILER_CONFIG['top']
+        if profile is not None:
+            profile.disable()
+            summary, text = _cprofile_report(profile, top)
+        else:
+            sampler.stop()
+            summary, text = _sample_report(sampler, top, duration)
+        report_id = uuid.uuid4().hex
+        _write_json(os.path.join(PROFILER_CONFIG['folder'], report_id + '.json'), {
+            'uuid': report_id,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'action': self.local.action,
+            'method': request.method,
+            'path': request.fullpath,
+            'status': status,
+            'duration': round(duration, 6),
+            'mode': self.local.mode,
+            'top': summary,
+            'text': text,
+        })
+        _prune()
+
+
+def _prune() -> None:
+    """Keep the newest PROFILER_CONFIG['max_reports'] reports"""
+    folder = PROFILER_CONFIG['folder']
+    reports = [entry for entry in os.scandir(folder) if entry.name.endswith('.json') and entry.name != SWITCH_FILE]
+    excess = len(reports) - PROFILER_CONFIG['max_reports']
+    if excess <= 0:
+        return
+
+    def age(entry):
+        try:
+            return entry.stat().st_mtime
+        except FileNotFoundError:
+            # pruned by another worker meanwhile
+            return 0
+
+    for entry in sorted(reports, key=age)[:excess]:
+        try:
+            os.unlink(entry.path)
+        except FileNotFoundError:
+            continue
@@ -0,0 +1,78 @@
+"""
+Shared query builders for the RH Contract application
+"""
+
+from typing import Any, Dict, Mapping
+
+from .models import db
+
+
+# Filters accepted by the employee listing and by the exports
+FUNCIONARIO_FILTERS = ('q', 'cidade', 'estado', 'cargo')
+
+
+def parse_funcionario_filters(params: Mapping) -> Dict[str, str]:
+    """
+    Extract the supported employee filters from request parameters
+
+    Args:
+        params: request.query (or any mapping of strings)
+
+    Returns:
+        Dictionary with the non-empty filters
+    """
+    filters = {}
+    for name in FUNCIONARIO_FILTERS:
+        value = (params.get(name) or '').strip()
+        if value:
+            filters[name] = value
+    return filters
+
+
+def build_funcionario_query(filters: Dict[str, Any]):
+    """
+    Build the employee query for the given filters
+
+    Args:
+        filters: Filters as returned by parse_funcionario_filters
+
+    Returns:
+        Pydal query over db.funcionario
+    """
+    query = db.funcionario.id > 0
+    if filters.get('q'):
+        text = filters['q']
+        name_query = db.funcionario.nome.contains(text)
+        if text.isdigit():
+            name_query |= db.funcionario.id == int(text)
+        query &= name_query
+    if filters.get('cidade'):
+        query &= db.funcionario.cidade.contains(filters['cidade'])
+    if filters.get('estado'):
+        query &= db.funcionario.estado == filters['estado'].upper()
+    if filters.get('cargo'):
+        query &= db.funcionario.cargo.contains(filters['cargo'])
+    return query
+
+
+def latest_contract_left_join():
+    """
+    Left join db.contrato restricted to the latest contract of each employee
+
+    The latest contract is the one with the newest data_geracao (the highest
+    id breaks ties), picked in SQL by a correlated subquery, so a listing
+    joins at most one contract row per employee.
+
+    Returns:
+        Left join expression to pass as ``left=`` to select/iterselect
+    """
+    recente = db.contrato.with_alias('contrato_recente')
+    latest = db(recente.funcionario == db.funcionario.id)._select(
+        recente.id,
+        orderby=~recente.data_geracao | ~recente.id,
+        limitby=(0, 1),
+        outer_scoped=['funcionario'],
+    )
+    return db.contrato.on(
+        (db.contrato.funcionario == db.funcionario.id) & db.contrato.id.belongs(latest)
+    )
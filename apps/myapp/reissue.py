@@ -0,0 +1,225 @@
+"""
+Mass re-render of contracts still waiting for a signature
+
+When EMPRESA_CONFIG, a contract template or an employee changes, the
+render_version (see rendering.py) of their pending contracts no longer
+matches contrato.versao_render. reissue_pending_contracts finds those
+contracts, re-renders them in a process pool and swaps each file in place
+with os.replace, so links and downloads keep working and a reader never
+sees a half-written PDF.
+
+- Resumable: pending contracts are scanned in id order, in chunks, and the
+  last finished id is saved in REISSUE_CONFIG['checkpoint']. A crashed run
+  resumes from there; contracts already swapped have the new version and
+  are skipped anyway.
+- Throttled: few worker processes at a lower CPU priority, a pause between
+  renders, and every render takes a slot of the host-wide render_slots, so
+  interactive gerar_contrato requests are never starved.
+
+    py4web call apps myapp.reissue.reissue_pending_contracts
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict
+
+from . import settings
+from .common import db, logger, metrics, render_slots
+from .config import REISSUE_CONFIG
+from .constants import CONTRACT_STATUS
+from .maintenance import run_job
+from .render_limiter import RenderBusy
+from .rendering import generate_pdf_from_template, get_template_path, prepare_contract_data, render_version
+from .utils import get_contract_type_from_filename
+
+
+def _init_worker(nice):
+    if nice:
+        # inherited by the wkhtmltopdf child processes too
+        os.nice(nice)
+    # counters and collected stats are the parent's, exported by the parent
+    # (reset also runs at fork; this covers the other start methods)
+    metrics.reset()
+    metrics.collectors = []
+
+
+def _render_to_file(contrato_id, template_path, dados, pause):
+    """Worker: render one contract next to its final place, return the temp path"""
+    try:
+        while True:
+            try:
+                with render_slots.acquire():
+                    pdf = generate_pdf_from_template(template_path, dados)
+                break
+            except RenderBusy as e:
+                # interactive traffic has the slots, wait for it
+                time.sleep(e.retry_after)
+    finally:
+        # render time/failures of this worker process for /metrics; every
+        # task, the pool may end the process before another flush
+        metrics.flush()
+    tmp_path = os.path.join(settings.UPLOAD_FOLDER, f'.reissue_{contrato_id}.part')
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf)
+    if pause:
+        time.sleep(pause)
+    return tmp_path
+
+
+def _load_checkpoint(resume: bool) -> Dict[str, Any]:
+    if resume:
+        try:
+            with open(REISSUE_CONFIG['checkpoint']) as f:
+                checkpoint = json.load(f)
+            if not checkpoint.get('finished'):
+                logger.info(f'Resuming contract reissue after contract {checkpoint["last_id"]}')
+                return checkpoint
+        except (OSError, ValueError):
+            pass
+    return {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'finished': None,
+        'last_id': 0,
+        'scanned': 0,
+        'stale': 0,
+        'reissued': 0,
+        'failed': {},
+    }
+
+
+def _save_checkpoint(checkpoint: Dict[str, Any]) -> None:
+    path = REISSUE_CONFIG['checkpoint']
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+
+def _stale_contracts(after_id: int, chunk_size: int):
+    """
+    Next chunk of pending contracts after after_id
+
+    Returns:
+        (last id of the chunk or None when done, contracts read,
+        [(contrato, template_path, versao, dados)] for the contracts whose
+        render version changed)
+    """
+    rows = db(
+        (db.contrato.status == CONTRACT_STATUS['AGUARDANDO_ASSINATURA'])
+        & (db.contrato.id > after_id)
+    ).select(
+        db.contrato.ALL, db.funcionario.ALL,
+        join=db.funcionario.on(db.funcionario.id == db.contrato.funcionario),
+        orderby=db.contrato.id, limitby=(0, chunk_size)
+    )
+    if not rows:
+        return None, 0, []
+    stale = []
+    for row in rows:
+        contrato, funcionario = row.contrato, row.funcionario
+        tipo_contrato = get_contract_type_from_filename(contrato.arquivo)
+        template_path = get_template_path(tipo_contrato)
+        if not os.path.exists(template_path):
+            continue
+        versao = render_version(funcionario, tipo_contrato, template_path)
+        if contrato.versao_render != versao:
+            stale.append((contrato, template_path, versao, prepare_contract_data(funcionario)))
+    return rows.last().contrato.id, len(rows), stale
+
+
+def _swap(contrato, tmp_path: str, versao: str) -> bool:
+    """Replace the contract file and record its new version; False if signed meanwhile"""
+    still_pending = db(
+        (db.contrato.id == contrato.id)
+        & (db.contrato.status == CONTRACT_STATUS['AGUARDANDO_ASSINATURA'])
+    ).update(versao_render=versao, data_geracao=datetime.now())
+    if not still_pending:
+        db.rollback()
+        os.unlink(tmp_path)
+        return False
+    os.replace(tmp_path, os.path.join(settings.UPLOAD_FOLDER, contrato.arquivo))
+    db.commit()
+    return True
+
+
+def _reissue(workers: int = None, resume: bool = True, dry_run: bool = False) -> Dict[str, Any]:
+    workers = workers or REISSUE_CONFIG['workers']
+    chunk_size = REISSUE_CONFIG['chunk_size']
+    checkpoint = _load_checkpoint(resume and not dry_run)
+    total = db(
+        (db.contrato.status == CONTRACT_STATUS['AGUARDANDO_ASSINATURA'])
+        & (db.contrato.id > checkpoint['last_id'])
+    ).count() + checkpoint['scanned']
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(REISSUE_CONFIG['nice'],)) as pool:
+        while True:
+            last_id, scanned, stale = _stale_contracts(checkpoint['last_id'], chunk_size)
+            if last_id is None:
+                break
+            # release the read snapshot while the chunk renders
+            db.rollback()
+            checkpoint['stale'] += len(stale)
+            if not dry_run:
+                futures = {
+                    pool.submit(_render_to_file, contrato.id, template_path, dados,
+                                REISSUE_CONFIG['pause']): (contrato, versao)
+                    for contrato, template_path, versao, dados in stale
+                }
+                for future in as_completed(futures):
+                    contrato, versao = futures[future]
+                    try:
+                        if _swap(contrato, future.result(), versao):
+                            checkpoint['reissued'] += 1
+                    except Exception as e:
+                        db.rollback()
+                        logger.error(f'Reissue of contract {contrato.id} failed: {e}')
+                        checkpoint['failed'][str(contrato.id)] = str(e)
+            checkpoint['scanned'] += scanned
+            checkpoint['last_id'] = last_id
+            if not dry_run:
+                _save_checkpoint(checkpoint)
+            logger.info(
+                f'Reissue progress - scanned {checkpoint["scanned"]}/{total} pending, '
+                f'stale: {checkpoint["stale"]}, reissued: {checkpoint["reissued"]}, '
+                f'failed: {len(checkpoint["failed"])}'
+            )
+
+    checkpoint['finished'] = datetime.now().isoformat(timespec='seconds')
+    if not dry_run:
+        _save_checkpoint(checkpoint)
+    return {
+        'pending': total,
+        'stale': checkpoint['stale'],
+        'reissued': checkpoint['reissued'],
+        'failed': len(checkpoint['failed']),
+    }
+
+
+def reissue_pending_contracts(workers: int = None, resume: bool = True, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Re-render every pending contract whose render version changed
+
+    Runs under the maintenance lock 'reemitir_contratos': a second run
+    (another worker, the scheduler, the command line) is skipped.
+
+    Args:
+        workers: Override REISSUE_CONFIG['workers']
+        resume: Continue an interrupted run from its checkpoint
+        dry_run: Only count the stale contracts
+
+    Returns:
+        Totals (pending, stale, reissued, failed) or {'skipped': True}
+    """
+    return run_job('reemitir_contratos', _reissue, workers=workers, resume=resume, dry_run=dry_run)
+
+
+def status() -> Dict[str, Any]:
+    """Progress of the current (or last) run, as saved in the checkpoint"""
+    try:
+        with open(REISSUE_CONFIG['checkpoint']) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
@@ -0,0 +1,121 @@
+"""
+Admission control for PDF renders
+
+RenderSlots caps the number of wkhtmltopdf renders running at once on the
+host, across all worker processes and threads. Each slot and each place in
+the wait queue is a portalocker lock file: a render holds a slot file while
+it runs, a request waiting for a slot holds a queue file. When the queue is
+full, or a slot does not free up within max_wait seconds, RenderBusy is
+raised so the action can answer 503 with Retry-After instead of piling up
+more renders.
+
+    with render_slots.acquire():
+        pdf = generate_pdf_from_template(...)
+"""
+
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import portalocker
+
+
+class RenderBusy(Exception):
+    """No render slot available; retry_after is a hint in seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RenderSlots:
+    """Host-wide render concurrency limit with a bounded wait queue"""
+
+    def __init__(self, folder, max_concurrent=4, max_queue=16, max_wait=10.0,
+                 retry_after=5, poll_interval=0.05):
+        self.folder = folder
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        # counters of this process
+        self.running = self.waiting = 0
+        self.started = self.rejected_full = self.rejected_timeout = 0
+        self.wait_total = self.wait_max = 0.0
+
+    def _try_lock(self, prefix, count):
+        """Take any free lock file among prefix_0..prefix_{count-1}, or None"""
+        os.makedirs(self.folder, exist_ok=True)
+        for i in random.sample(range(count), count):
+            lock = portalocker.Lock(
+                os.path.join(self.folder, '%s_%d.lock' % (prefix, i)),
+                timeout=0, fail_when_locked=True
+            )
+            try:
+                lock.acquire()
+                return lock
+            except portalocker.exceptions.LockException:
+                continue
+        return None
+
+    def _wait_for_slot(self):
+        queued = self._try_lock('queue', self.max_queue) if self.max_queue else None
+        if queued is None:
+            with self.lock:
+                self.rejected_full += 1
+            raise RenderBusy('Render queue full', self.retry_after)
+        started = time.time()
+        with self.lock:
+            self.waiting += 1
+        try:
+            deadline = started + self.max_wait
+            while time.time() < deadline:
+                time.sleep(self.poll_interval)
+                slot = self._try_lock('slot', self.max_concurrent)
+                if slot is not None:
+                    return slot, time.time() - started
+        finally:
+            queued.release()
+            with self.lock:
+                self.waiting -= 1
+        with self.lock:
+            self.rejected_timeout += 1
+        raise RenderBusy('No render slot within %ss' % self.max_wait, self.retry_after)
+
+    @contextmanager
+    def acquire(self):
+        """Hold a render slot for the duration of the block, see module docstring"""
+        slot = self._try_lock('slot', self.max_concurrent)
+        waited = 0.0
+        if slot is None:
+            slot, waited = self._wait_for_slot()
+        with self.lock:
+            self.running += 1
+            self.started += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        try:
+            yield
+        finally:
+            slot.release()
+            with self.lock:
+                self.running -= 1
+
+    def stats(self):
+        """Counters of this process (queue depth and wait time included)"""
+        with self.lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'running': self.running,
+                'queue_depth': self.waiting,
+                'started': self.started,
+                'rejected_full': self.rejected_full,
+                'rejected_timeout': self.rejected_timeout,
+                'wait_seconds_total': round(self.wait_total, 3),
+                'wait_seconds_max': round(self.wait_max, 3),
+            }
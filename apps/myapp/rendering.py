@@ -0,0 +1,213 @@
+"""
+Contract rendering: template data, HTML and PDF generation
+
+Shared by the contract controllers and by reissue.py, which re-renders
+pending contracts in worker processes. render_version() fingerprints
+everything a render depends on (employee row, contract type, template
+content, EMPRESA_CONFIG); contracts store it in contrato.versao_render.
+"""
+
+import hashlib
+import html
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import pdfkit
+
+from .common import metrics
+from .config import EMPRESA_CONFIG, MAINTENANCE_CONFIG, PDF_CONFIG
+from .constants import DATE_FORMATS, DEFAULT_VALUES
+from .utils import build_address, ensure_directory_exists, format_currency, format_date
+
+# company data printed in every contract, part of the render version
+EMPRESA_VERSION = hashlib.sha1(
+    json.dumps(EMPRESA_CONFIG, sort_keys=True, default=str).encode('utf-8')
+).hexdigest()
+
+
+def prepare_contract_data(funcionario):
+    """Prepare contract data from employee information"""
+    return {
+        'nome_empresa': EMPRESA_CONFIG['nome'],
+        'cnpj': EMPRESA_CONFIG['cnpj'],      
+        'endereco_empresa': EMPRESA_CONFIG['endereco'], 
+        'nome_funcionario': funcionario.nome,
+        'data_nascimento': format_date(funcionario.data_nascimento, DATE_FORMATS['DISPLAY']),
+        'sexo': funcionario.sexo,
+        'rg': funcionario.rg,
+        'ctps': funcionario.ctps if hasattr(funcionario, 'ctps') else DEFAULT_VALUES['CTPS'],
+        'cargo': funcionario.cargo,
+        'carga_horaria': DEFAULT_VALUES['CARGA_HORARIA'],  
+        'dias_semana': DEFAULT_VALUES['DIAS_SEMANA'],  
+        'salario': format_currency(funcionario.salario),
+        'data_inicio': format_date(funcionario.data_entrada, DATE_FORMATS['DISPLAY']),
+        'cidade': funcionario.cidade,
+        'data': format_date(datetime.now(), DATE_FORMATS['DISPLAY']),
+        'cpf': funcionario.cpf,
+        'estado_civil': funcionario.estado_civil,
+        'endereco': build_address(funcionario.rua, funcionario.bairro, funcionario.cidade, funcionario.estado, funcionario.cep),
+        'idade': funcionario.idade
+    }
+
+
+def get_template_path(tipo_contrato):
+    """Get template file path"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, 'templates', 'contrato', f'{tipo_contrato}.html')
+
+
+def render_contract_html(template_path, dados):
+    """Fill a contract template with data, CSS inlined"""
+    # Read template
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template_content = f.read()
+    
+    # Inline CSS to replace external references
+    css_inline = get_inline_css()
+    
+    # Replace external CSS reference with inline CSS
+    template_content = template_content.replace(
+        '<link rel="stylesheet" href="/myapp/static/css/contratos.css">',
+        css_inline
+    )
+    
+    # Replace variables in template; values are escaped, employee fields are
+    # free text (the preview and the PDF alike: markup typed into a field is
+    # printed as text)
+    for key, value in dados.items():
+        template_content = template_content.replace(f'[{key}]', html.escape(str(value)))
+    
+    return template_content
+
+
+def generate_pdf_from_template(template_path, dados):
+    """Generate PDF from template with data"""
+    template_content = render_contract_html(template_path, dados)
+    
+    # Create temporary file with processed content (known folder/prefix, so
+    # maintenance.sweep_temp_html can remove leftovers of crashed renders)
+    ensure_directory_exists(MAINTENANCE_CONFIG['temp_folder'])
+    with tempfile.NamedTemporaryFile(suffix='.html', prefix=MAINTENANCE_CONFIG['temp_prefix'],
+                                     dir=MAINTENANCE_CONFIG['temp_folder'], delete=False,
+                                     mode='w', encoding='utf-8') as temp_file:
+        temp_file.write(template_content)
+        temp_file_path = temp_file.name
+    
+    try:
+        # Configure wkhtmltopdf using centralized configurations
+        config = pdfkit.configuration(wkhtmltopdf=PDF_CONFIG['wkhtmltopdf_path'])
+        
+        # PDF options
+        options = {
+            'page-size': PDF_CONFIG['page_size'],
+            'orientation': PDF_CONFIG['orientation'],
+            'margin-top': PDF_CONFIG['margin_top'],
+            'margin-right': PDF_CONFIG['margin_right'],
+            'margin-bottom': PDF_CONFIG['margin_bottom'],
+            'margin-left': PDF_CONFIG['margin_left'],
+            'encoding': 'UTF-8',
+            'no-outline': None,
+            'disable-smart-shrinking': None,
+            'print-media-type': None,
+            'no-images': None,
+            'disable-external-links': None,
+            'disable-internal-links': None
+        }
+        
+        # Generate PDF
+        started = time.time()
+        try:
+            pdf = pdfkit.from_file(temp_file_path, False, configuration=config, options=options)
+        except Exception:
+            metrics.inc('pdf_render_failures_total')
+            raise
+        metrics.observe('pdf_render_seconds', time.time() - started)
+        return pdf
+        
+    finally:
+        # Clean up temporary file
+        if os.path.exists(temp_file_path):
+            os.unlink(temp_file_path)
+
+
+def get_inline_css():
+    """Get inline CSS for contracts"""
+    return """
+    <style>
+    body {
+        font-family: Arial, sans-serif;
+        line-height: 1.6;
+        margin: 20px;
+        color: #333;
+    }
+    h1 {
+        text-align: center;
+        color: #2c3e50;
+        border-bottom: 2px solid #3498db;
+        padding-bottom: 10px;
+    }
+    h3 {
+        color: #2c3e50;
+        border-bottom: 1px solid #bdc3c7;
+        padding-bottom: 5px;
+    }
+    .contrato {
+        max-width: 800px;
+        margin: 0 auto;
+    }
+    .dados-pessoais {
+        background-color: #f8f9fa;
+        padding: 15px;
+        border-radius: 5px;
+        margin-bottom: 20px;
+    }
+    .dados-pessoais p {
+        margin: 5px 0;
+    }
+    .assinaturas {
+        display: flex;
+        justify-content: space-between;
+        margin-top: 40px;
+        margin-bottom: 20px;
+    }
+    .assinatura {
+        text-align: center;
+        width: 45%;
+    }
+    .assinatura strong {
+        display: block;
+        margin-top: 10px;
+    }
+    p {
+        text-align: justify;
+        margin-bottom: 15px;
+    }
+    strong {
+        color: #2c3e50;
+    }
+    </style>
+    """
+
+
+# path -> (mtime, sha1 of the template content); one entry per template file
+_template_versions = {}
+
+
+def template_version(template_path):
+    """Hash of a contract template's content (re-read only when its mtime changes)"""
+    mtime = os.path.getmtime(template_path)
+    cached = _template_versions.get(template_path)
+    if cached is None or cached[0] != mtime:
+        with open(template_path, 'rb') as f:
+            cached = _template_versions[template_path] = (mtime, hashlib.sha1(f.read()).hexdigest())
+    return cached[1]
+
+
+def render_version(funcionario, tipo_contrato, template_path):
+    """Fingerprint of everything a render depends on (employee, type, template, company)"""
+    parts = (funcionario.id, tipo_contrato, str(funcionario.updated_on),
+             template_version(template_path), EMPRESA_VERSION)
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
@@ -0,0 +1,83 @@
+"""
+Response cache for read-only JSON actions
+
+ResponseCache is a py4web fixture that stores the body of successful GET
+responses, keyed by path, query string, user and the write versions of the
+tables the action reads (see caching.TableVersions). A write to any of
+those tables changes the key, before and again after the writing request
+commits, so a response read while the write was uncommitted is not served
+after it either.
+
+    funcionario_responses = ResponseCache(cache, table_versions, ['funcionario'], auth)
+
+    @action('listar_funcionarios')
+    @action.uses(db, auth, funcionario_responses)
+"""
+
+import threading
+
+from py4web import HTTP, request, response
+from py4web.core import Fixture
+
+
+class ResponseCache(Fixture):
+    """Serves repeated GET requests from the cache, see module docstring"""
+
+    def __init__(self, store, table_versions, tablenames, auth=None,
+                 expiration=None, enabled=True):
+        self.__prerequisites__ = [auth] if auth else []
+        self.store = store
+        self.table_versions = table_versions
+        self.tablenames = list(tablenames)
+        self.auth = auth
+        self.expiration = expiration
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _key(self, versions):
+        user_id = self.auth.user_id if self.auth else None
+        query = tuple(sorted((k, str(v)) for k, v in request.query.items()))
+        return ('response', request.fullpath, query, user_id, versions)
+
+    def on_request(self, context):
+        Fixture.local_initialize(self)
+        self.local.key = None
+        if not self.enabled or request.method != 'GET':
+            return
+        self.local.versions = self.table_versions.current(self.tablenames)
+        self.local.key = self._key(self.local.versions)
+        cached = self.store.get(self.local.key)
+        with self.lock:
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if cached is not None:
+            body, content_type = cached
+            raise HTTP(200, body, {'Content-Type': content_type, 'X-Cache': 'HIT'})
+
+    def on_success(self, context):
+        if self.local.key is None:
+            return
+        output = context.get('output')
+        if not isinstance(output, str) or response.status_code != 200:
+            return
+        # a write during this request may not be reflected in output
+        if self.table_versions.current(self.tablenames) != self.local.versions:
+            return
+        content_type = response.headers.get('Content-Type') or 'application/json'
+        response.headers['Content-Type'] = content_type
+        self.store.set(self.local.key, (output, content_type), self.expiration)
+        response.headers['X-Cache'] = 'MISS'
+
+    def stats(self):
+        """Hit/miss counters of this fixture"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'tables': self.tablenames,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
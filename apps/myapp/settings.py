@@ -23,6 +23,28 @@ DB_URI = "sqlite://storage.db"
 DB_POOL_SIZE = 1
 DB_MIGRATE = True
 DB_FAKE_MIGRATE = False
+# SQLite tuning profile, applied to every new connection (ignored for other
+# engines, set to {} to keep SQLite defaults). WAL lets readers proceed while
+# a contract is being written; busy_timeout waits instead of failing with
+# "database is locked". See benchmarks/sqlite_pragmas.py
+DB_SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # safe with WAL, fsync only at checkpoints
+    "busy_timeout": 5000,  # ms
+    "cache_size": -20000,  # negative = KiB, i.e. ~20MB page cache
+    "mmap_size": 268435456,  # 256MB
+    "temp_store": "MEMORY",
+}
+
+
+def sqlite_pragma_statements(pragmas):
+    """Returns the PRAGMA statements for a DB_SQLITE_PRAGMAS dict"""
+    return ["PRAGMA %s=%s;" % (name, value) for name, value in pragmas.items()]
+
+
+# apply pending schema steps (migrations.py) when the app loads; set False
+# and run "py4web call apps myapp.migrations.apply_pending" on deploy instead
+DB_AUTO_APPLY_SCHEMA_STEPS = True
 
 # location where static files are stored:
 STATIC_FOLDER = required_folder(APP_FOLDER, "static")
@@ -64,10 +86,25 @@ SESSION_SECRET_KEY = None  # or replace with your own secret
 MEMCACHE_CLIENTS = ["127.0.0.1:11211"]
 REDIS_SERVER = "localhost:6379"
 
+# cache settings: "memory" (one cache per worker process) or "sqlite" (one
+# cache file shared by all the workers on the host, see caching.py).
+# gunicorn.conf.py sets PY4WEB_CACHE_TYPE=sqlite, it forks several workers:
+# with per-process caches a write is only invalidated in the worker
+# that made it
+CACHE_TYPE = os.environ.get("PY4WEB_CACHE_TYPE", "memory")
+CACHE_SQLITE_FILE = os.path.join(DB_FOLDER, "cache.sqlite")
+
 # logger settings
 LOGGERS = [
     "warning:stdout"
-]  # syntax "severity:filename:format" filename can be stderr or stdout
+]  # syntax "severity:filename:format" filename can be stderr or stdout, format can be "json"
+# write the log from a background thread (see logging_setup.py); records
+# beyond LOG_QUEUE_SIZE waiting to be written are dropped, never waited for
+LOG_QUEUE = True
+LOG_QUEUE_SIZE = 10000
+# fraction of the debug/info records kept per logger (warnings always kept),
+# e.g. {"py4web:myapp.uploads": 0.1, "py4web:myapp.contratos": 0.5}
+LOG_SAMPLING = {}
 
 # Disable default login when using OAuth
 DEFAULT_LOGIN_ENABLED = True
@@ -0,0 +1,250 @@
+"""
+Bulk ingestion of signed contracts from a ZIP file or a server directory
+
+Each PDF is matched to a pending contrato by name:
+
+- the generated file name, as produced by gerar_contrato and understood by
+  get_contract_type_from_filename (``sindicato_joao_silva_20240131120000``),
+  with anything after the timestamp ignored (``..._assinado.pdf``,
+  ``... (1).pdf``);
+- or an embedded contract id (``contrato_123.pdf``, ``contrato-123.pdf``,
+  ``123.pdf``).
+
+Matching is done with one query per batch of names/ids. Files are then read,
+validated (extension, size, PDF signature) and stored in parallel threads,
+and contract statuses are updated in batched transactions. The caller gets
+a per-file report.
+"""
+
+import os
+import re
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from . import settings
+from .common import db, logger
+from .config import INGEST_CONFIG, UPLOAD_CONFIG
+from .constants import CONTRACT_STATUS, CONTRACT_TYPES
+from .summaries import deferred_summaries
+from .utils import get_contract_type_from_filename, sanitize_filename, validate_file_extension
+
+GENERATED_NAME_RE = re.compile(
+    r'^((?:%s)_.+?_\d{14})' % '|'.join(sorted(CONTRACT_TYPES.values(), key=len, reverse=True))
+)
+CONTRACT_ID_RE = re.compile(r'^(?:contrato[_\- ]?)?(\d+)(?:[_\- ].*)?$', re.IGNORECASE)
+
+PDF_SIGNATURE = b'%PDF-'
+
+
+def match_name(filename: str) -> Dict[str, Any]:
+    """
+    Extract what identifies the contract from a file name
+
+    Returns:
+        {'arquivo': original generated name} or {'id': contract id} or {}
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0].strip()
+    match = GENERATED_NAME_RE.match(stem)
+    if match:
+        return {'arquivo': match.group(1) + '.pdf'}
+    match = CONTRACT_ID_RE.match(stem)
+    if match:
+        return {'id': int(match.group(1))}
+    return {}
+
+
+def _pending_contracts(keys: List[Dict[str, Any]]) -> Dict[Any, Any]:
+    """Pending contracts for the matched names/ids, looked up in chunks"""
+    names = sorted({k['arquivo'] for k in keys if 'arquivo' in k})
+    ids = sorted({k['id'] for k in keys if 'id' in k})
+    found = {}
+    chunk = INGEST_CONFIG['lookup_chunk_size']
+    pending = db.contrato.status == CONTRACT_STATUS['AGUARDANDO_ASSINATURA']
+    for start in range(0, len(names), chunk):
+        for row in db(pending & db.contrato.arquivo.belongs(names[start:start + chunk])).select():
+            found[('arquivo', row.arquivo)] = row
+    for start in range(0, len(ids), chunk):
+        for row in db(pending & db.contrato.id.belongs(ids[start:start + chunk])).select():
+            found[('id', row.id)] = row
+    return found
+
+
+def _signed_filename(contrato) -> str:
+    # contract id + random suffix: parallel stores never collide
+    tipo_contrato = get_contract_type_from_filename(contrato.arquivo)
+    return sanitize_filename(
+        f'{tipo_contrato}_assinado_{contrato.funcionario}_{contrato.id}_{uuid.uuid4().hex[:8]}'
+    ) + '.pdf'
+
+
+def _store(read, contrato) -> str:
+    """Validate one PDF and write it to the upload folder, returns the stored name"""
+    data = read()
+    if len(data) > UPLOAD_CONFIG['max_file_size']:
+        raise ValueError('arquivo muito grande')
+    if not data.startswith(PDF_SIGNATURE):
+        raise ValueError('não é um PDF válido')
+    nome = _signed_filename(contrato)
+    path = os.path.join(settings.UPLOAD_FOLDER, nome)
+    fd, tmp = tempfile.mkstemp(dir=settings.UPLOAD_FOLDER, prefix='.part_')
+    with os.fdopen(fd, 'wb') as stream:
+        stream.write(data)
+    os.replace(tmp, path)
+    return nome
+
+
+def _update_statuses(stored: List[Dict[str, Any]]) -> int:
+    """Mark contracts as signed, one transaction per batch; returns how many"""
+    updated = 0
+    batch_size = INGEST_CONFIG['batch_size']
+    for start in range(0, len(stored), batch_size):
+        batch = stored[start:start + batch_size]
+        now = datetime.now()
+        try:
+            # one summary refresh for the batch, not one per contract
+            with deferred_summaries():
+                for item in batch:
+                    # still pending: another upload may have signed it meanwhile
+                    item['ok'] = bool(db(
+                        (db.contrato.id == item['contrato'])
+                        & (db.contrato.status == CONTRACT_STATUS['AGUARDANDO_ASSINATURA'])
+                    ).update(
+                        arquivo_assinado=item['arquivo_assinado'],
+                        status=CONTRACT_STATUS['ASSINADO'],
+                        data_assinatura=now
+                    ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f'Signed ingestion batch starting at contract {batch[0]["contrato"]} failed: {e}')
+            for item in batch:
+                item['ok'] = False
+                item['erro'] = f'erro ao gravar: {e}'
+            continue
+        updated += sum(1 for item in batch if item['ok'])
+    return updated
+
+
+def ingest(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Match, store and register signed contracts
+
+    Args:
+        entries: [{'nome': file name, 'read': callable returning the bytes}],
+            the read callables must be safe to call from worker threads
+
+    Returns:
+        Report with totals and one line per file
+    """
+    report = [{'arquivo': entry['nome']} for entry in entries]
+    keys = [match_name(entry['nome']) for entry in entries]
+    contratos = _pending_contracts([k for k in keys if k])
+
+    jobs = []
+    claimed = {}
+    for line, entry, key in zip(report, entries, keys):
+        if not validate_file_extension(entry['nome'], UPLOAD_CONFIG['allowed_extensions']):
+            line['erro'] = 'extensão não permitida'
+            continue
+        if not key:
+            line['erro'] = 'nome não identifica o contrato'
+            continue
+        contrato = contratos.get(tuple(key.items())[0])
+        if contrato is None:
+            line['erro'] = 'contrato pendente não encontrado'
+            continue
+        if contrato.id in claimed:
+            line['erro'] = f'duplicado de {claimed[contrato.id]}'
+            continue
+        claimed[contrato.id] = entry['nome']
+        line['contrato'] = contrato.id
+        jobs.append((line, entry, contrato))
+
+    with ThreadPoolExecutor(max_workers=INGEST_CONFIG['workers']) as pool:
+        futures = [(line, pool.submit(_store, entry['read'], contrato)) for line, entry, contrato in jobs]
+        stored = []
+        for line, future in futures:
+            try:
+                line['arquivo_assinado'] = future.result()
+                stored.append(line)
+            except Exception as e:
+                line['erro'] = str(e)
+
+    updated = _update_statuses(stored)
+    for line in stored:
+        if not line.pop('ok'):
+            line.setdefault('erro', 'contrato já assinado')
+            _remove_quietly(line.pop('arquivo_assinado'))
+
+    logger.info(f'Signed ingestion - files: {len(report)}, matched: {len(jobs)}, signed: {updated}')
+    return {
+        'total': len(report),
+        'assinados': updated,
+        'com_erro': len(report) - updated,
+        'arquivos': report,
+    }
+
+
+def _remove_quietly(nome: str) -> None:
+    try:
+        os.unlink(os.path.join(settings.UPLOAD_FOLDER, nome))
+    except OSError:
+        pass
+
+
+def zip_entries(path: str) -> List[Dict[str, Any]]:
+    """
+    Entries of a ZIP file, each worker thread opening its own handle
+
+    Raises:
+        ValueError: Too many files or too large once uncompressed
+    """
+    with zipfile.ZipFile(path) as archive:
+        infos = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not os.path.basename(info.filename).startswith('.')
+            and '__MACOSX' not in info.filename
+        ]
+    if len(infos) > INGEST_CONFIG['max_files']:
+        raise ValueError(f'máximo de {INGEST_CONFIG["max_files"]} arquivos')
+    if sum(info.file_size for info in infos) > INGEST_CONFIG['max_uncompressed_size']:
+        raise ValueError('conteúdo descompactado muito grande')
+
+    def reader(name):
+        def read():
+            with zipfile.ZipFile(path) as archive:
+                return archive.read(name)
+        return read
+
+    return [{'nome': os.path.basename(info.filename), 'read': reader(info.filename)} for info in infos]
+
+
+def directory_entries(folder: str) -> List[Dict[str, Any]]:
+    """Entries of a directory (not recursive)"""
+    names = sorted(
+        name for name in os.listdir(folder)
+        if os.path.isfile(os.path.join(folder, name)) and not name.startswith('.')
+    )
+    if len(names) > INGEST_CONFIG['max_files']:
+        raise ValueError(f'máximo de {INGEST_CONFIG["max_files"]} arquivos')
+
+    def reader(path):
+        def read():
+            with open(path, 'rb') as stream:
+                return stream.read()
+        return read
+
+    return [{'nome': name, 'read': reader(os.path.join(folder, name))} for name in names]
+
+
+def resolve_import_folder(relative: str) -> Optional[str]:
+    """A sub-folder of INGEST_CONFIG['import_folder'], or None if outside of it"""
+    root = os.path.abspath(INGEST_CONFIG['import_folder'])
+    folder = os.path.abspath(os.path.join(root, relative))
+    if folder != root and not folder.startswith(root + os.sep):
+        return None
+    return folder if os.path.isdir(folder) else None
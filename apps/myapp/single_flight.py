@@ -0,0 +1,72 @@
+"""
+Single-flight execution of identical concurrent work
+
+SingleFlight.do(key, fn) runs fn once for all the threads of this process
+that ask for the same key at the same time: the first caller runs it and
+the others wait and receive the same result (or exception). Combine with a
+file lock and a database check to coalesce across processes, as
+gerar_contrato does.
+"""
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Per-process request coalescing, see module docstring"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.executed = self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Run fn() unless an identical call is in flight, then share its result
+
+        Args:
+            key: Hashable identity of the work
+            fn: Callable without arguments
+
+        Returns:
+            (result, shared): shared is True when the result came from
+            another caller's execution
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+
+    def stats(self):
+        """Executions and coalesced calls of this process"""
+        with self.lock:
+            return {
+                'in_flight': len(self.calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+            }
@@ -0,0 +1,110 @@
+"""
+Per-request SQL instrumentation
+
+SQLStats is a py4web fixture that records every statement executed during
+the request (through a pydal TimingHandler), exposes the count and the
+cumulative DB time as a Server-Timing header, and logs a structured line
+when the request goes over the configured query-count or latency budget.
+Statements repeated with only different literals are reported as likely
+N+1 patterns.
+
+Use it per action with @action.uses(sql_stats, ...) or for every action
+that uses db by setting SQL_STATS_CONFIG['enabled_globally'].
+"""
+
+import json
+import re
+import threading
+import time
+from collections import Counter
+
+from py4web import request, response
+from py4web.core import Fixture
+from pydal.helpers.classes import TimingHandler
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+_recording = threading.local()
+
+
+def normalize_sql(sql: str) -> str:
+    """Replace literals so statements differing only by parameters compare equal"""
+    return _LITERALS.sub('?', sql)
+
+
+class RecordingTimingHandler(TimingHandler):
+    """pydal TimingHandler that also feeds the active request recorder"""
+
+    # functions(sql, seconds) called for every statement, e.g. metrics
+    observers = []
+
+    def after_execute(self, command):
+        super().after_execute(command)
+        elapsed = time.time() - self.t
+        statements = getattr(_recording, 'statements', None)
+        if statements is not None:
+            statements.append((command, elapsed))
+        for observer in self.observers:
+            observer(command, elapsed)
+
+
+class SQLStats(Fixture):
+    """Records SQL statements, count and DB time for each request"""
+
+    def __init__(self, db, logger, max_queries=None, max_time_ms=None,
+                 repeat_threshold=None, log_statements=10):
+        self.db = db
+        self.logger = logger
+        self.max_queries = max_queries
+        self.max_time_ms = max_time_ms
+        self.repeat_threshold = repeat_threshold
+        self.log_statements = log_statements
+        adapter = db._adapter
+        adapter.execution_handlers = [
+            h for h in adapter.execution_handlers if h is not TimingHandler
+        ] + [RecordingTimingHandler]
+
+    def enable_globally(self):
+        """Attach to every action that uses db (directly or through auth)"""
+        self.db.__prerequisites__ = list(getattr(self.db, '__prerequisites__', ())) + [self]
+
+    def on_request(self, context):
+        Fixture.local_initialize(self)
+        self.local.started = time.time()
+        _recording.statements = self.local.statements = []
+
+    def on_success(self, context):
+        self._report()
+
+    def on_error(self, context):
+        self._report()
+
+    def _report(self):
+        _recording.statements = None
+        statements = self.local.statements
+        count = len(statements)
+        db_ms = sum(dt for _, dt in statements) * 1000
+        total_ms = (time.time() - self.local.started) * 1000
+        response.headers['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{count} queries", app;dur={total_ms:.1f}'
+        )
+        summary = {
+            'path': request.fullpath,
+            'method': request.method,
+            'queries': count,
+            'db_ms': round(db_ms, 1),
+            'total_ms': round(total_ms, 1),
+        }
+        if self.repeat_threshold:
+            repeated = Counter(normalize_sql(sql) for sql, _ in statements)
+            suspects = {sql: n for sql, n in repeated.items() if n >= self.repeat_threshold}
+            if suspects:
+                summary['n_plus_one'] = suspects
+        over_budget = (
+            (self.max_queries and count > self.max_queries)
+            or (self.max_time_ms and db_ms > self.max_time_ms)
+        )
+        if over_budget or 'n_plus_one' in summary:
+            slowest = sorted(statements, key=lambda s: s[1], reverse=True)[:self.log_statements]
+            summary['slowest'] = [[sql, round(dt * 1000, 2)] for sql, dt in slowest]
+            self.logger.warning('sql_stats %s' % json.dumps(summary))
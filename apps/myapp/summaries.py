@@ -0,0 +1,184 @@
+"""
+Per-employee contract summary (db.funcionario_resumo) kept current incrementally
+
+Contract insert/update/delete callbacks recompute the summary of the
+affected employees only (archived contracts in contrato_arquivo are counted
+too), so overview pages read one indexed row per employee instead of
+aggregating the whole contrato table. Batch writes run inside
+deferred_summaries() so the affected employees are recomputed once per
+batch rather than once per contract. Recompute everything with:
+
+    py4web call apps myapp.summaries.rebuild_summaries
+"""
+
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable
+
+from pydal.objects import Row
+
+from .common import db, logger
+from .constants import CONTRACT_STATUS
+
+EMPTY_SUMMARY = {
+    'contratos_pendentes': 0,
+    'contratos_assinados': 0,
+    'ultima_geracao': None,
+    'ultima_assinatura': None,
+}
+
+
+def _aggregate(funcionario_ids=None) -> Dict[int, dict]:
+    """Aggregate contract counts and dates per employee, hot and archived contracts"""
+    summaries = {}
+    for table in (db.contrato, db.contrato_arquivo):
+        if funcionario_ids is None:
+            query = table.id > 0
+        else:
+            query = table.funcionario.belongs(funcionario_ids)
+        count = table.id.count()
+        last_generated = table.data_geracao.max()
+        last_signed = table.data_assinatura.max()
+        rows = db(query).select(
+            table.funcionario, table.status, count, last_generated, last_signed,
+            groupby=table.funcionario | table.status
+        )
+        for row in rows:
+            contrato = row[table._tablename]
+            summary = summaries.setdefault(contrato.funcionario, dict(EMPTY_SUMMARY))
+            if contrato.status == CONTRACT_STATUS['ASSINADO']:
+                summary['contratos_assinados'] += row[count]
+            else:
+                summary['contratos_pendentes'] += row[count]
+            for key, value in (('ultima_geracao', row[last_generated]),
+                               ('ultima_assinatura', row[last_signed])):
+                if value and (summary[key] is None or value > summary[key]):
+                    summary[key] = value
+    return summaries
+
+
+def refresh_summaries(funcionario_ids: Iterable[int]) -> None:
+    """
+    Recompute the summary rows of the given employees
+
+    Args:
+        funcionario_ids: Employee ids whose contracts changed
+    """
+    ids = {int(i) for i in funcionario_ids if i}
+    if not ids:
+        return
+    summaries = _aggregate(ids)
+    for funcionario_id in ids:
+        values = summaries.get(funcionario_id, EMPTY_SUMMARY)
+        db.funcionario_resumo.update_or_insert(
+            db.funcionario_resumo.funcionario == funcionario_id,
+            funcionario=funcionario_id,
+            updated_on=datetime.now(),
+            **values
+        )
+
+
+# employees collected while deferred_summaries() is active in this thread
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_summaries():
+    """
+    Refresh the summaries once for a batch of contract writes
+
+    The contract callbacks inside the block only collect the affected
+    employees; their summaries are recomputed with one aggregate when the
+    block exits, before the caller commits. Nothing is recomputed if the
+    block raises (the caller rolls the batch back).
+
+        with deferred_summaries():
+            for item in batch:
+                db(db.contrato.id == item['id']).update(...)
+        db.commit()
+    """
+    if getattr(_deferred, 'ids', None) is not None:
+        # nested: the outermost block refreshes
+        yield
+        return
+    ids = _deferred.ids = set()
+    try:
+        yield
+    finally:
+        _deferred.ids = None
+    refresh_summaries(ids)
+
+
+def _refresh(funcionario_ids: Iterable[int]) -> None:
+    """Refresh now, or at the end of the enclosing deferred_summaries()"""
+    pending = getattr(_deferred, 'ids', None)
+    if pending is None:
+        refresh_summaries(funcionario_ids)
+    else:
+        pending.update(funcionario_ids)
+
+
+def get_summary(funcionario_id: int) -> Row:
+    """
+    Read the contract summary of one employee (single indexed lookup)
+
+    Args:
+        funcionario_id: Employee id
+
+    Returns:
+        Summary row, or the empty summary if the employee has no contracts
+    """
+    row = db.funcionario_resumo(funcionario=funcionario_id)
+    return row or Row(dict(EMPTY_SUMMARY, funcionario=funcionario_id))
+
+
+def rebuild_summaries(batch_size: int = 1000) -> int:
+    """
+    Recompute all summaries from scratch with a single GROUP BY
+
+    Args:
+        batch_size: Rows inserted per bulk insert
+
+    Returns:
+        Number of summary rows written
+    """
+    summaries = _aggregate()
+    db(db.funcionario_resumo).delete()
+    now = datetime.now()
+    rows = [dict(values, funcionario=funcionario_id, updated_on=now)
+            for funcionario_id, values in summaries.items()]
+    for start in range(0, len(rows), batch_size):
+        db.funcionario_resumo.bulk_insert(rows[start:start + batch_size])
+    db.commit()
+    logger.info(f'Rebuilt {len(rows)} contract summaries')
+    return len(rows)
+
+
+# #######################################################
+# db.contrato callbacks (registered in models.py)
+# #######################################################
+def _affected_ids(dbset) -> set:
+    """Employees referenced by the contracts in a Set"""
+    rows = dbset.select(db.contrato.funcionario, distinct=True)
+    return {row.funcionario for row in rows}
+
+
+def on_contract_insert(fields, id):
+    _refresh([fields.get('funcionario')])
+
+
+def on_contract_before_change(dbset, fields=None):
+    # collected before the write: after a delete (or an update of the
+    # filtered columns) the Set no longer selects the same contracts
+    dbset._summary_ids = _affected_ids(dbset)
+    return False
+
+
+def on_contract_update(dbset, fields):
+    ids = getattr(dbset, '_summary_ids', set())
+    _refresh(ids | {fields.get('funcionario')})
+
+
+def on_contract_delete(dbset):
+    _refresh(getattr(dbset, '_summary_ids', set()))
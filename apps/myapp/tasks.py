@@ -1,4 +1,9 @@
-from .common import scheduler, settings
+from .archive import archive_signed_contracts
+from .common import logger, scheduler, settings
+from .config import MAINTENANCE_CONFIG
+from .exports import export_to_file
+from .maintenance import JOBS, run_job
+from .reissue import reissue_pending_contracts
 from .models import db
 
 # #######################################################
@@ -18,14 +23,50 @@ def my_task(**inputs):
     return {}
 
 
+def exportar_funcionarios(filters=None, formato="csv", **inputs):
+    """Write a (potentially very large) employee export to EXPORT_CONFIG['folder']"""
+    try:
+        path = export_to_file(filters or {}, formato)
+    finally:
+        # the export only reads, release the connection snapshot
+        db.rollback()
+    logger.info(f"Scheduled export finished: {path}")
+    return {"path": path}
+
+
+def arquivar_contratos(**inputs):
+    """Move old signed contracts to contrato_arquivo (see archive.py)"""
+    return {"archived": archive_signed_contracts(**inputs)}
+
+
+def _maintenance_task(name):
+    """Scheduler task running a maintenance job under its lock (maintenance.py)"""
+
+    def task(**inputs):
+        return run_job(name, JOBS[name], **inputs)
+
+    return task
+
+
 if settings.USE_SCHEDULER:
     # register your tasks with the scheduler
     scheduler.register_task("my_task", my_task)
+    scheduler.register_task("exportar_funcionarios", exportar_funcionarios)
+    scheduler.register_task("arquivar_contratos", arquivar_contratos)
+    for name in JOBS:
+        scheduler.register_task(name, _maintenance_task(name))
+    # on demand (dashboard), after changing EMPRESA_CONFIG or a contract template
+    scheduler.register_task("reemitir_contratos", reissue_pending_contracts)
 
     # enqueue runs (here or in actions) for example
     if db(db.task_run).count() < 1:
         scheduler.enqueue_run("my_task", inputs={}, timeout=2, period=10)
 
+    # periodic maintenance, enqueued once (periods in MAINTENANCE_CONFIG)
+    for name, job in MAINTENANCE_CONFIG["jobs"].items():
+        if db(db.task_run.name == name).isempty():
+            scheduler.enqueue_run(name, inputs={}, timeout=job["timeout"], period=job["period"])
+
 # manage your tasks via dashboard or Grid(path, db.task_run)
 
 # #######################################################
@@ -0,0 +1,77 @@
+"""
+Production server: gunicorn with the apps preloaded in the master
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py
+
+The master imports wsgi.py once (models, pdfkit, auth, schema steps of
+migrations.py, static asset build) and forks the workers, which share that
+memory copy-on-write. Settings can be overridden with the environment
+variables below or on the command line (gunicorn -c gunicorn.conf.py -w 8).
+"""
+
+import gc
+import multiprocessing
+import os
+import sys
+
+wsgi_app = "wsgi:application"
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+# py4web fixtures keep request state in thread locals, threads are safe
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+# PDF renders (wkhtmltopdf) can take a while under load
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+# recycle workers now and then, bounded memory growth
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = max_requests // 10
+
+# import the apps in the master: startup-only work runs once, before fork
+preload_app = True
+
+# the row, auth, response and page caches (and their write invalidation)
+# must be shared by the workers, see when_ready. Set whatever "workers" is
+# here, --workers on the command line can still raise it
+os.environ.setdefault("PY4WEB_CACHE_TYPE", "sqlite")
+
+
+def _release_db_connections():
+    """Close the database connections opened while loading the apps"""
+    from pydal.connection import ConnectionPool
+
+    ConnectionPool.close_all_instances("commit")
+    for pool in ConnectionPool.POOLS.values():
+        while pool:
+            try:
+                pool.pop().close()
+            except Exception:
+                pass
+
+
+def _check_shared_cache(num_workers):
+    """Refuse to fork several workers with per-process caches"""
+    if num_workers <= 1:
+        return
+    for name, module in list(sys.modules.items()):
+        if name.startswith("apps.") and name.endswith(".settings"):
+            if getattr(module, "CACHE_TYPE", None) == "memory":
+                raise RuntimeError(
+                    "%s.CACHE_TYPE is 'memory' with %d workers: writes would only be "
+                    "invalidated in the worker that made them, set PY4WEB_CACHE_TYPE=sqlite"
+                    % (name, num_workers)
+                )
+
+
+def when_ready(server):
+    _check_shared_cache(server.num_workers)
+    # a sqlite/pg connection must never be shared between processes: the
+    # workers open their own on first use
+    _release_db_connections()
+    # keep the preloaded objects out of the collector, otherwise the first
+    # collection in every worker touches (and copies) all their pages
+    gc.collect()
+    gc.freeze()
+    server.log.info("Apps preloaded, forking %s workers", server.num_workers)
+
@@ -0,0 +1,195 @@
+"""
+Query counts of the pages that load their rows through IdentityMap
+
+    python -m pytest tests
+
+Runs against a temporary SQLite database with the funcionario/contrato
+tables and the contrato_historico view; identity_map.py and sql_stats.py
+are loaded from their files so the app (and its database) is not imported;
+the tests live outside apps/ because pytest imports the packages of the
+test files it collects. The page tests render the app's templates against
+the rows the actions read, so a template following a reference
+(contrato.funcionario.nome) shows up as an extra statement.
+"""
+
+import importlib.util
+import os
+from datetime import datetime, timedelta
+
+import pytest
+import yatl
+from py4web.core import Fixture
+from py4web.utils.form import Form, FormStyleBootstrap4
+from pydal import DAL, Field
+from pydal.validators import IS_IN_DB
+from yatl.helpers import A
+
+APP_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'apps', 'myapp')
+
+
+def _load(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(APP_FOLDER, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+identity_map_module = _load('identity_map')
+sql_stats_module = _load('sql_stats')
+
+
+def render(template, **context):
+    """Render one of the app's templates the way the Template fixture does"""
+    url = lambda *parts, **kwargs: '/myapp/' + '/'.join(str(part) for part in parts)
+    context.update(URL=url, asset_url=lambda path: '/myapp/static/' + path, A=A)
+    return yatl.render(
+        filename=os.path.join(APP_FOLDER, 'templates', template),
+        path=os.path.join(APP_FOLDER, 'templates'),
+        context=context,
+        delimiters='[[ ]]',
+    )
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DAL('sqlite://test.sqlite', folder=str(tmp_path))
+    db.define_table('funcionario', Field('nome'), Field('cidade'))
+    def contract_fields():
+        return [
+            Field('funcionario', 'reference funcionario', requires=IS_IN_DB(db, 'funcionario.id', '%(nome)s')),
+            Field('arquivo'), Field('status'),
+            Field('data_geracao', 'datetime'), Field('arquivo_assinado'), Field('data_assinatura', 'datetime'),
+        ]
+
+    db.define_table('contrato', *contract_fields())
+    db.define_table('contrato_arquivo', *contract_fields(), Field('arquivado_em', 'datetime'))
+    db.executesql(
+        'CREATE VIEW contrato_historico AS '
+        'SELECT id, funcionario, arquivo, status, data_geracao, arquivo_assinado, data_assinatura, '
+        'NULL AS arquivado_em FROM contrato UNION ALL '
+        'SELECT id, funcionario, arquivo, status, data_geracao, arquivo_assinado, data_assinatura, '
+        'arquivado_em FROM contrato_arquivo'
+    )
+    db.define_table('contrato_historico', *contract_fields(), Field('arquivado_em', 'datetime'),
+                    migrate=False)
+    # installs RecordingTimingHandler on the adapter, as in common.py
+    sql_stats_module.SQLStats(db, logger=None)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def statements():
+    """SQL statements executed while the test runs"""
+    recorded = []
+    observer = lambda sql, elapsed: recorded.append(sql)
+    sql_stats_module.RecordingTimingHandler.observers.append(observer)
+    yield recorded
+    sql_stats_module.RecordingTimingHandler.observers.remove(observer)
+
+
+def _request(identity_map):
+    """Start a request for the fixture (its thread-local row map)"""
+    identity_map.on_request({})
+    return identity_map
+
+
+@pytest.fixture
+def data(db):
+    funcionario = db.funcionario.insert(nome='Maria Souza', cidade='Recife')
+    now = datetime.now()
+    contratos = [
+        db.contrato.insert(funcionario=funcionario, arquivo='c%d.pdf' % n, status='Aguardando Assinatura',
+                           data_geracao=now - timedelta(days=n))
+        for n in range(5)
+    ]
+    db.contrato_arquivo.insert(id=1000, funcionario=funcionario, arquivo='antigo.pdf', status='Assinado',
+                               data_geracao=now - timedelta(days=900), arquivado_em=now)
+    db.commit()
+    return funcionario, contratos
+
+
+@pytest.fixture
+def identity_map(db):
+    identity_map = identity_map_module.IdentityMap(db)
+    yield identity_map
+    try:
+        Fixture.local_delete(identity_map)
+    except KeyError:
+        pass
+
+
+def test_contratos_funcionario_page_runs_one_query(identity_map, data, statements):
+    funcionario_id, contratos = data
+    im = _request(identity_map)
+
+    # what funcionario/<id>/contratos and its template read
+    funcionario, historico = im.funcionario_com_contratos(funcionario_id, historico=True)
+    assert funcionario.nome == 'Maria Souza'
+    assert [c.arquivo for c in historico][-1] == 'antigo.pdf'
+    assert len(historico) == len(contratos) + 1
+    assert all(contrato.status and contrato.arquivo for contrato in historico)
+
+    html = render('contratos_funcionario.html', funcionario=funcionario, contratos=historico)
+    assert 'Maria Souza' in html and 'antigo.pdf' in html
+
+    assert len(statements) == 1
+    # repeated lookups within the request come from the map
+    im.funcionario_com_contratos(funcionario_id, historico=True)
+    im.get('funcionario', funcionario_id)
+    assert len(statements) == 1
+
+
+def test_assinar_contrato_page_runs_one_query(db, identity_map, data, statements):
+    funcionario_id, contratos = data
+    im = _request(identity_map)
+
+    # what assinar_contrato/<id> reads before rendering the form
+    contrato, funcionario = im.contrato_com_funcionario(contratos[2])
+    assert contrato.id == contratos[2]
+    assert funcionario.id == funcionario_id
+    assert im.get('contrato', contratos[2]) is contrato
+    assert im.get('funcionario', funcionario_id) is funcionario
+
+    # the form built by the action, rendered by its template
+    form = Form([db.contrato.arquivo_assinado], record=contrato, deletable=False,
+                formstyle=FormStyleBootstrap4)
+    html = render('assinar_contrato.html', form=form, contrato=contrato, funcionario=funcionario)
+    assert 'Maria Souza' in html and 'arquivo_assinado' in html
+
+    assert len(statements) == 1
+
+
+def test_template_following_a_reference_is_counted(identity_map, data, statements):
+    funcionario_id, _ = data
+    im = _request(identity_map)
+    funcionario, contratos = im.funcionario_com_contratos(funcionario_id)
+
+    # what a regressed template would do instead of using funcionario
+    assert contratos[0].funcionario.nome == 'Maria Souza'
+    assert len(statements) == 2
+
+
+def test_missing_rows_are_remembered(identity_map, data, statements):
+    im = _request(identity_map)
+
+    assert im.contrato_com_funcionario(999) == (None, None)
+    assert im.contrato_com_funcionario(999) == (None, None)
+    assert im.funcionario_com_contratos(999) == (None, [])
+    assert im.get('funcionario', 999) is None
+
+    assert len(statements) == 2
+
+
+def test_get_uses_the_configured_loader(db, data, statements):
+    funcionario_id, _ = data
+    cached = {funcionario_id: db.funcionario(funcionario_id)}
+    del statements[:]
+    im = identity_map_module.IdentityMap(db, loaders={'funcionario': cached.get})
+    try:
+        _request(im)
+        assert im.get('funcionario', funcionario_id).nome == 'Maria Souza'
+        assert im.get('funcionario', funcionario_id) is cached[funcionario_id]
+        assert statements == []
+    finally:
+        Fixture.local_delete(im)
@@ -0,0 +1,23 @@
+"""
+WSGI entry point for preforking servers (see gunicorn.conf.py)
+
+Importing this module loads every app in apps/ (models, pdfkit, auth
+plugins, schema steps), so with preload_app the work happens once in the
+master process and the forked workers share it copy-on-write.
+"""
+
+import logging
+import os
+
+from py4web.core import wsgi
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+application = wsgi(
+    apps_folder=os.path.join(ROOT, "apps"),
+    password_file=os.environ.get("PY4WEB_PASSWORD_FILE", os.path.join(ROOT, "password.txt")),
+    # "full" lets the dashboard password edit and upload app code on the live
+    # server; turn it on explicitly (PY4WEB_DASHBOARD_MODE=readonly or full)
+    dashboard_mode=os.environ.get("PY4WEB_DASHBOARD_MODE", "none"),
+    logging_level=logging.INFO,
+)